@@ -1,13 +1,27 @@
 # acceptor.py
 #IMPORTAÇÕES
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import requests
 import os
-from prometheus_client import Counter, make_wsgi_app
+import json
+import mmap
+import asyncio
+import queue
+import sys
+import threading
+import time
+from prometheus_client import Counter, Gauge, Histogram, make_wsgi_app
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
+# pacote common/ (logger compartilhado) fica na raiz do repositório
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.logger import get_logger
+from common.server import AsyncServer, run_server
+from common import groups, paxos, wire
+
 #cria uma aplicação web do acceptor
 app = Flask(__name__) 
+logger = get_logger("ACCEPTOR")
 
 #Métricas para controle#
 #conta quantas mensagens PROMISE foram enviadas
@@ -18,6 +32,24 @@ ACCEPTS_RECEIVED = Counter('paxos_accepts_received_total', 'Total de mensagens A
 REJECTIONS_SENT = Counter('paxos_rejections_sent_total', 'Total de rejeições enviadas (NoPromise ou NoAccept)')
 #Conta quantoas vezes o Acceptor notificou o Learner
 NOTIFICATIONS_SENT = Counter('paxos_learner_notifications_total', 'Total de notificações de commit enviadas ao Learner')
+#Notificações que ficaram de fora porque a fila do Learner estava cheia
+NOTIFICATIONS_DROPPED = Counter('paxos_learner_notifications_dropped_total', 'Votos descartados com a fila do Learner cheia')
+#Requisições /learn enviadas (cada uma leva um lote de votos)
+NOTIFY_BATCHES_SENT = Counter('paxos_learner_notify_batches_total', 'Total de lotes de votos enviados aos Learners')
+#Registros gravados no WAL e quantos fsyncs foram necessários (group commit: bem menos fsyncs que registros)
+WAL_RECORDS = Counter('paxos_acceptor_wal_records_total', 'Total de registros gravados no WAL')
+WAL_FSYNCS = Counter('paxos_acceptor_wal_fsyncs_total', 'Total de fsyncs do WAL (um por grupo de registros)')
+CHECKPOINTS = Counter('paxos_acceptor_checkpoints_total', 'Total de checkpoints do estado do acceptor')
+#Compactação do log: slots já cobertos pelo snapshot de um learner saem do log (e do checkpoint)
+COMPACTIONS = Counter('paxos_acceptor_compactions_total', 'Total de compactações do log pedidas pelos learners')
+COMPACTED_SLOTS = Counter('paxos_acceptor_compacted_slots_total', 'Slots removidos do log por compactação')
+#Histogramas (segundos): tempo de cada handler, do fsync de cada grupo e do envio de cada lote aos Learners
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+HANDLER_SECONDS = Histogram('paxos_acceptor_handler_seconds', 'Tempo para responder PREPARE/ACCEPT (inclui a espera do WAL)', ['phase'], buckets=LATENCY_BUCKETS)
+LOG_ENTRIES = Gauge('paxos_acceptor_log_entries', 'Slots guardados no log do acceptor')
+LOG_ENTRIES.set_function(lambda: len(log))
+WAL_SYNC_SECONDS = Histogram('paxos_acceptor_wal_sync_seconds', 'Tempo de write + fsync de um grupo do WAL', buckets=LATENCY_BUCKETS)
+LEARNER_NOTIFY_SECONDS = Histogram('paxos_learner_notify_seconds', 'Tempo de envio de um lote de votos para um Learner', ['learner'], buckets=LATENCY_BUCKETS)
 
 #função que lê uma variável de ambiente e trasforma em lista
 def load_urls_from_env(env_var_name, default_value=""):
@@ -34,142 +66,598 @@ LEARNERS = load_urls_from_env(
 
 # --- ESTADO DO ACCEPTOR 
 
-#maior prefixo prometido
-highest_promised_prefix = 0 # A parte numérica mais alta do TID para a qual uma promessa já foi feita. Usado para rejeitar PREPAREs antigos.
 #ID completo da maior promessa
-highest_promised_id = None #O TID completo mais alto para o qual uma promessa foi feita.
+highest_promised_id = None #O TID completo mais alto para o qual uma promessa foi feita (comparado por paxos.ballot_key).
+# A promessa vale para todos os slots (como no Multi-Paxos): um único PREPARE do
+# líder cobre todas as instâncias que ele vai propor em seguida.
+
+#log replicado: slot -> (accepted_id, accepted_value)
+#cada slot é uma instância independente do Paxos com o seu próprio ballot/valor aceito.
+#só guardamos os slots que já aceitaram alguma coisa (dicionário esparso).
+log = {}
+#maior slot com valor aceito (-1 = log vazio). Vai nas respostas para o proposer não reutilizar slots ocupados
+max_slot = -1
+#slots até aqui já estão decididos e no snapshot de um learner: saíram do log (POST /compact).
+#PREPARE/ACCEPT nesses slots recebem 410 (não há mais nada a decidir neles)
+truncated_upto = -1
+#snapshot mais recente de cada learner (POST /compact). O log só é compactado até o menor deles e só
+#depois que todos os LEARNER_URLS avisaram: um learner atrasado sempre acha no log o que vem depois
+#do próprio snapshot, mesmo sem outro learner de onde copiar.
+learner_snapshots = {}
+learner_snapshots_lock = threading.Lock()
+
+# Travas do estado: nada de um lock global para tudo.
+# promise_lock protege só a promessa (que vale para todos os slots) e o max_slot: uma comparação
+# e duas atribuições. Cada slot tem o seu lock (em listras) que o PREPARE e o ACCEPT seguram
+# enquanto leem/escrevem log[slot], então instâncias em slots diferentes andam em paralelo.
+# Ordem: lock do slot e depois promise_lock.
+SLOT_LOCK_STRIPES = int(os.getenv("ACCEPTOR_SLOT_LOCK_STRIPES", "256"))
+promise_lock = threading.Lock()
+slot_locks = [threading.Lock() for _ in range(SLOT_LOCK_STRIPES)]
+
+def slot_lock(slot):
+    return slot_locks[slot % SLOT_LOCK_STRIPES]
 
-#ID aceito 
-accepted_id = None #O TID do valor que este Acceptor aceitou por último.
-#valor aceito
-accepted_value = None #O valor (transação) que este Acceptor aceitou por último.
 #Identifocador unico do Acceptor
 ACCEPTOR_ID = os.getenv("HOSTNAME", "acceptor")
 
-#extrai o numero do proposal_id (prioridade maior)
-def prefix_from_pid(pid):
-    """Extrai o prefixo numérico do proposal_id (o TID) para comparação."""
-    try:
-        # O TID tem o formato <prefixo_numérico>:<proposer_id>
-        return int(str(pid).split(":")[0])
-    except:
+# O TID tem o formato <prefixo_numérico>:<proposer_id> e é comparado inteiro: prefixo e, no
+# empate, o proposer (regras em common/paxos.py)
+ballot_key = paxos.ballot_key
+
+# --- PERSISTÊNCIA (WAL + CHECKPOINT) ---
+# Promessas e valores aceitos precisam sobreviver a um restart, senão o Paxos perde a segurança.
+# Cada mudança vira um registro no WAL (uma linha JSON). Um único thread escreve os registros
+# em grupo e faz um fsync por grupo; os handlers esperam o fsync do seu registro antes de responder.
+# De tempos em tempos o estado inteiro vai para um checkpoint e os segmentos antigos do WAL são apagados.
+# padrão: data/ ao lado deste arquivo (o VOLUME do Dockerfile), não o diretório de onde o processo foi chamado
+DATA_DIR = os.getenv("ACCEPTOR_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")) # vazio = sem persistência (só para testes)
+WAL_FSYNC = os.getenv("ACCEPTOR_WAL_FSYNC", "1") == "1"
+CHECKPOINT_EVERY = int(os.getenv("ACCEPTOR_CHECKPOINT_EVERY", "10000")) # registros entre checkpoints
+CHECKPOINT_INTERVAL = float(os.getenv("ACCEPTOR_CHECKPOINT_INTERVAL", "60")) # segundos entre checkpoints
+
+wal_lock = threading.Lock()
+wal_has_work = threading.Condition(wal_lock) # acorda o writer
+wal_flushed = threading.Condition(wal_lock) # acorda os handlers esperando o fsync
+wal_queue = [] # linhas esperando o próximo grupo
+wal_next_lsn = 0 # número do último registro enfileirado
+wal_durable_lsn = 0 # todos os registros até aqui já passaram pelo fsync
+wal_async_waiters = [] # (lsn, loop, future) dos handlers do modo async esperando o fsync
+wal_file = None
+wal_segment = 0
+checkpoint_lock = threading.Lock()
+
+def wal_segment_path(segment):
+    return os.path.join(DATA_DIR, f"wal-{segment:08d}.log")
+
+def apply_wal_record(record):
+    """Aplica um registro ao estado em memória. É idempotente (fica sempre com o maior ballot),
+    então reaplicar registros que já estão no checkpoint não muda nada."""
+    global highest_promised_id, max_slot
+    if record["t"] == "c":
+        truncate_log(record["s"])
+        return
+    proposal_id = record["id"]
+    key = ballot_key(proposal_id)
+    if key >= ballot_key(highest_promised_id):
+        highest_promised_id = proposal_id
+    if record["t"] == "a":
+        slot = record["s"]
+        if slot > max_slot:
+            max_slot = slot
+        if slot <= truncated_upto:
+            return
+        current = log.get(slot)
+        if current is None or key >= ballot_key(current[0]):
+            log[slot] = (proposal_id, record["v"])
+
+def wal_append(record):
+    """Enfileira um registro para o próximo grupo e devolve o seu LSN."""
+    global wal_next_lsn
+    if not DATA_DIR:
         return 0
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with wal_lock:
+        wal_next_lsn += 1
+        wal_queue.append(line)
+        wal_has_work.notify()
+        return wal_next_lsn
+
+def wal_wait(lsn):
+    """Bloqueia até o registro `lsn` estar em disco."""
+    if not DATA_DIR:
+        return
+    with wal_lock:
+        while wal_durable_lsn < lsn:
+            wal_flushed.wait()
+
+async def wal_wait_async(lsn):
+    """Como wal_wait, mas sem bloquear o event loop: o writer completa o future depois do fsync."""
+    if not DATA_DIR:
+        return
+    loop = asyncio.get_running_loop()
+    with wal_lock:
+        if wal_durable_lsn >= lsn:
+            return
+        future = loop.create_future()
+        wal_async_waiters.append((lsn, loop, future))
+    await future
+
+def _set_durable(future):
+    if not future.done():
+        future.set_result(None)
+
+def wal_writer_loop():
+    """Escreve os registros pendentes em grupo: um write + um fsync para todos."""
+    global wal_durable_lsn
+    since_checkpoint = 0
+    last_checkpoint = time.monotonic()
+    while True:
+        with wal_lock:
+            if not wal_queue:
+                wal_has_work.wait(CHECKPOINT_INTERVAL)
+            lines = wal_queue[:]
+            del wal_queue[:]
+            upto = wal_next_lsn
+        if lines:
+            started = time.monotonic()
+            wal_file.write("".join(lines).encode())
+            wal_file.flush()
+            if WAL_FSYNC:
+                os.fsync(wal_file.fileno())
+            WAL_SYNC_SECONDS.observe(time.monotonic() - started)
+            WAL_FSYNCS.inc()
+            WAL_RECORDS.inc(len(lines))
+            since_checkpoint += len(lines)
+            with wal_lock:
+                wal_durable_lsn = upto
+                wal_flushed.notify_all()
+                ready = [w for w in wal_async_waiters if w[0] <= upto]
+                wal_async_waiters[:] = [w for w in wal_async_waiters if w[0] > upto]
+            for _, loop, future in ready:
+                loop.call_soon_threadsafe(_set_durable, future)
+        if since_checkpoint >= CHECKPOINT_EVERY or (since_checkpoint and time.monotonic() - last_checkpoint >= CHECKPOINT_INTERVAL):
+            rotate_wal_segment()
+            threading.Thread(target=write_checkpoint, args=(wal_segment,), daemon=True).start()
+            since_checkpoint = 0
+            last_checkpoint = time.monotonic()
+
+def rotate_wal_segment():
+    """Fecha o segmento atual; os próximos registros vão para um segmento novo."""
+    global wal_file, wal_segment
+    if wal_file is not None:
+        wal_file.close()
+    wal_segment += 1
+    wal_file = open(wal_segment_path(wal_segment), "ab")
+
+def write_checkpoint(segment):
+    """Grava o estado inteiro e apaga os segmentos do WAL anteriores a `segment`.
+
+    O estado é copiado depois da rotação, então já contém tudo que foi escrito nos
+    segmentos antigos (o estado em memória é atualizado antes do registro ir para o WAL).
+    """
+    with checkpoint_lock:
+        snapshot = {
+            "segment": segment,
+            "highest_promised_id": highest_promised_id,
+            "truncated_upto": truncated_upto,
+            "log": {str(slot): list(entry) for slot, entry in log.copy().items()},
+        }
+        tmp_path = os.path.join(DATA_DIR, "checkpoint.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(DATA_DIR, "checkpoint.json"))
+        for name in os.listdir(DATA_DIR):
+            if name.startswith("wal-") and int(name[4:12]) < segment:
+                os.remove(os.path.join(DATA_DIR, name))
+        CHECKPOINTS.inc()
+
+def read_wal_segment(path):
+    """Lê os registros de um segmento via mmap. Um registro incompleto no fim (crash no meio
+    da escrita) é descartado."""
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = 0
+        while True:
+            end = mm.find(b"\n", pos)
+            if end < 0:
+                break
+            try:
+                yield json.loads(mm[pos:end])
+            except ValueError:
+                break
+            pos = end + 1
+
+def recover_state():
+    """Carrega o último checkpoint e reaplica só os segmentos do WAL gravados depois dele."""
+    global wal_segment, highest_promised_id, max_slot
+    os.makedirs(DATA_DIR, exist_ok=True)
+    first_segment = 0
+    checkpoint_path = os.path.join(DATA_DIR, "checkpoint.json")
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            snapshot = json.load(f)
+        first_segment = snapshot["segment"]
+        highest_promised_id = snapshot["highest_promised_id"]
+        for slot, (proposal_id, value) in snapshot["log"].items():
+            log[int(slot)] = (proposal_id, value)
+        truncate_log(snapshot.get("truncated_upto", -1))
+        max_slot = max(max(log, default=-1), truncated_upto)
+
+    segments = sorted(int(name[4:12]) for name in os.listdir(DATA_DIR) if name.startswith("wal-"))
+    replayed = 0
+    for segment in segments:
+        if segment < first_segment:
+            continue
+        for record in read_wal_segment(wal_segment_path(segment)):
+            apply_wal_record(record)
+            replayed += 1
+    wal_segment = max(segments + [first_segment])
+    logger.info("Recovered state: promised %s, %d slots (compacted up to %d), %d WAL records replayed",
+                highest_promised_id, len(log), truncated_upto, replayed)
+
+def truncate_log(upto):
+    """Tira do log os slots até `upto` (inclusive). Devolve quantos saíram."""
+    global truncated_upto
+    with promise_lock:
+        if upto <= truncated_upto:
+            return 0
+        truncated_upto = upto
+    # list(log) é uma cópia atômica das chaves; ACCEPTs concorrentes em slots novos não atrapalham
+    removed = 0
+    for slot in list(log):
+        if slot <= upto:
+            with slot_lock(slot):
+                if log.pop(slot, None) is not None:
+                    removed += 1
+    return removed
+
+def start_durability():
+    if not DATA_DIR:
+        logger.warning("ACCEPTOR_DATA_DIR is empty, state will not survive a restart")
+        return
+    recover_state()
+    # começa num segmento novo e já grava um checkpoint com o estado recuperado
+    rotate_wal_segment()
+    write_checkpoint(wal_segment)
+    threading.Thread(target=wal_writer_loop, name="wal-writer", daemon=True).start()
+
+def compacted_response(slot, kind):
+    """Resposta para um slot que já saiu do log: está decidido, o proposer deve seguir para outro."""
+    if kind == "not_promise":
+        return {"type": kind, "slot": slot, "tid_in_use": highest_promised_id, "accepted_id": None,
+                "accepted_value": None, "max_slot": max_slot, "truncated_upto": truncated_upto}
+    return {"response": kind, "slot": slot, "tid_in_use": highest_promised_id, "max_slot": max_slot,
+            "truncated_upto": truncated_upto}
 
 #Recebe uma mensagem PREPARE do Proposer
 # FASE 1: PREPARE/PROMISE 
-@app.post("/prepare")
-def prepare():
+def handle_prepare(data, trace_id):
+    """Fase 1. Devolve (resposta, status, lsn) — a resposta só pode sair depois do fsync do lsn."""
     #O Acceptor vai ler e atualizar seu estado interno
-    global highest_promised_prefix, highest_promised_id, accepted_id, accepted_value
-    #Extrai o ID da proposta.
-    data = request.get_json()
+    global highest_promised_id
+    #Extrai o ID da proposta e o slot (instância do log).
     proposal_id = data.get("proposal_id")
-    print(f"[ACCEPTOR] Received PREPARE: {data}", flush=True)
-    #Extrai o número da proposta.
-    req_prefix = prefix_from_pid(proposal_id)
-    
-    # Se a proposta for maior ou igual ao maior prefixo prometido
-    if req_prefix >= highest_promised_prefix:
-        highest_promised_prefix = req_prefix
-        highest_promised_id = proposal_id
-        
+    slot = int(data.get("slot", 0))
+    logger.debug("Received PREPARE: %s", data, trace=trace_id)
+    lsn = 0
+
+    with slot_lock(slot):
+        # conferido com o lock do slot: a compactação marca truncated_upto antes de apagar a entrada
+        if slot <= truncated_upto:
+            return compacted_response(slot, "not_promise"), 410, 0
+        with promise_lock:
+            # Só promete um ballot estritamente maior que o maior prometido (ballot inteiro)
+            promised = paxos.promises(proposal_id, highest_promised_id)
+            if promised:
+                highest_promised_id = proposal_id
+            tid_in_use = highest_promised_id
+            current_max_slot = max_slot
+        #o que já foi aceito neste slot (se algo); um ACCEPT deste slot não entra no meio
+        accepted_id, accepted_value = log.get(slot, (None, None))
+        if promised:
+            # a promessa só vale depois de estar em disco
+            lsn = wal_append({"t": "p", "id": proposal_id})
+
+    if promised:
         PROMISES_SENT.inc()
         # Resposta "promise" (promessa)
         response = {
             "type": "promise",
-            "tid_in_use": highest_promised_id,  #maior ID prometido
+            "slot": slot,
+            "tid_in_use": tid_in_use,  #maior ID prometido
             "accepted_id": accepted_id,
-            "accepted_value": accepted_value #se já aceitou algo antes
+            "accepted_value": accepted_value, #se já aceitou algo antes neste slot
+            "max_slot": current_max_slot #slots acima deste estão livres
         }
+        return response, 200, lsn
+    #se não a proposta é rejeitada por ser antiga!
+    REJECTIONS_SENT.inc()
+    # Resposta "not_promise" (conflito)
+    response = {
+        "type": "not_promise",
+        "slot": slot,
+        "tid_in_use": tid_in_use, #pra recalcular e tentar de novo 
+        "accepted_id": accepted_id,
+        "accepted_value": accepted_value,
+        "max_slot": current_max_slot
+    }
+    return response, 409, lsn
 
-        #se não a proposta é rejeitada por ser antiga!
-        return jsonify(response), 200 
-    else:
-        REJECTIONS_SENT.inc()
-        # Resposta "not_promise" (conflito)
-        response = {
-            "type": "not_promise",
-            "tid_in_use": highest_promised_id, #pra recalcular e tentar de novo 
-            "accepted_id": accepted_id,
-            "accepted_value": accepted_value
-        }
-        return jsonify(response), 409
+@app.post("/prepare")
+@HANDLER_SECONDS.labels("prepare").time()
+def prepare():
+    response, status, lsn = handle_prepare(request.get_json(), request.headers.get("X-Trace-Id"))
+    wal_wait(lsn)
+    return jsonify(response), status
 
 # FUNÇÃO DE NOTIFICAÇÃO 
-#envia o voto do acceptor para os Learners
-def notify_learners(proposal_id, transaction, accepted_status):
+# Os votos não são enviados dentro do /accept: cada Learner tem uma fila e uma thread que
+# junta os votos pendentes e manda todos numa única requisição, por uma conexão keep-alive.
+NOTIFY_BATCH_MAX = int(os.getenv("ACCEPTOR_NOTIFY_BATCH_MAX", "64")) # votos por requisição /learn
+NOTIFY_QUEUE_MAX = int(os.getenv("ACCEPTOR_NOTIFY_QUEUE_MAX", "10000")) # votos esperando por Learner
+
+class LearnerNotifier:
+    """Fila de votos e thread de envio de um Learner."""
+
+    def __init__(self, url):
+        self.url = url
+        self.queue = queue.Queue(maxsize=NOTIFY_QUEUE_MAX)
+        self.session = requests.Session()
+        # paxos://host:porta = protocolo binário numa conexão persistente
+        self.wire = wire.WireClient(url) if url.startswith(wire.SCHEME) else None
+        threading.Thread(target=self.run, name=f"notify-{url}", daemon=True).start()
+
+    def submit(self, vote):
+        try:
+            self.queue.put_nowait(vote)
+        except queue.Full:
+            # Learner lento ou fora do ar: o voto é perdido, como antes num timeout
+            NOTIFICATIONS_DROPPED.inc()
+
+    def run(self):
+        while True:
+            votes = [self.queue.get()]
+            while len(votes) < NOTIFY_BATCH_MAX:
+                try:
+                    votes.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with LEARNER_NOTIFY_SECONDS.labels(self.url).time():
+                    if self.wire is not None:
+                        self.wire.call(wire.VOTES, wire.encode_votes(votes), timeout=0.5)
+                    else:
+                        self.session.post(self.url, json={"votes": votes}, timeout=0.5)
+                NOTIFY_BATCHES_SENT.inc()
+            except Exception:
+                # Ignora falhas de comunicação com Learners
+                pass
+
+learner_notifiers = [LearnerNotifier(url) for url in LEARNERS]
+
+#envia o voto do acceptor para os Learners (só enfileira, o envio é em background)
+def notify_learners(slot, proposal_id, transaction, accepted_status, trace_id=None):
     notify_payload = {
         "acceptor_id": ACCEPTOR_ID,
+        "trace_id": trace_id,
+        "slot": slot,
         "proposal_id": proposal_id,
         "accepted": accepted_status, #true ou false
         "transaction": transaction
     }
     
-    for url in LEARNERS:
-        try:
-            requests.post(url, json=notify_payload, timeout=0.5)
-        except Exception:
-            # Ignora falhas de comunicação com Learners
-            pass
+    for notifier in learner_notifiers:
+        notifier.submit(notify_payload)
 
 # FASE 2: ACCEPT/ACCEPTED 
 #recebe pedido para aceitar o voto
-@app.post("/accept")
-def accept():
-    global accepted_id, accepted_value, highest_promised_id, highest_promised_prefix
-    data = request.get_json()
-    print(f"[ACCEPTOR] Received ACCEPT: {data}", flush=True)
-    #Proposta + valor a ser decidido.
+def handle_accept(data, trace_id):
+    """Fase 2. Devolve (resposta, status, lsn); com status 200 o voto só vai aos Learners
+    (finish_accept) depois do fsync do lsn."""
+    global max_slot, highest_promised_id
+    logger.debug("Received ACCEPT: %s", data, trace=trace_id)
+    #Proposta + valor a ser decidido + slot onde ele entra.
     proposal_id = data.get("proposal_id")
     transaction = data.get("transaction")
+    slot = int(data.get("slot", 0))
 
-    req_prefix = prefix_from_pid(proposal_id)
-    
-    # Regra de Aceitação: A proposta deve ter um prefixo maior ou igual ao maior prometido
-    if req_prefix >= highest_promised_prefix:
-        # 1. Atualiza o estado para o valor aceito
-        accepted_id = proposal_id
-        accepted_value = transaction
-        
-        # 2. Atualiza a promessa mais alta (garante que propostas antigas sejam rejeitadas no futuro)
-        #rejeita propostas antigas
-        highest_promised_prefix = req_prefix
-        highest_promised_id = proposal_id
+    with slot_lock(slot):
+        if slot <= truncated_upto:
+            return compacted_response(slot, "not_accepted"), 410, 0
+        with promise_lock:
+            # Regra de Aceitação: o ballot (inteiro) deve ser maior ou igual ao maior prometido
+            accepted = paxos.admits(proposal_id, highest_promised_id)
+            if accepted:
+                # Atualiza a promessa mais alta (garante que propostas antigas sejam rejeitadas no futuro)
+                #rejeita propostas antigas
+                highest_promised_id = proposal_id
+                # um PREPARE que responder daqui em diante já conta este slot como ocupado
+                if slot > max_slot:
+                    max_slot = slot
+            tid_in_use = highest_promised_id
+        if accepted:
+            # Atualiza o estado do slot para o valor aceito
+            #o valor fica no log: um PREPARE futuro neste slot precisa enxergá-lo
+            log[slot] = (proposal_id, transaction)
+            # o aceite só vale (e só é anunciado) depois de estar em disco
+            lsn = wal_append({"t": "a", "s": slot, "id": proposal_id, "v": transaction})
 
-        # 3. Notifica Learners e Proposer do aceite 
-        notify_learners(proposal_id, transaction, accepted_status=True)
+    if accepted:
+        ACCEPTS_RECEIVED.inc()
+        return {"response": "accepted", "tid": proposal_id, "slot": slot}, 200, lsn
 
-        accepted_id = None
-        accepted_value = None
+    # Notifica Learners e Proposer da rejeição 
+    #avisa o Learner: votei não 
+    notify_learners(slot, proposal_id, transaction, accepted_status=False, trace_id=trace_id)
+    REJECTIONS_SENT.inc()
+    # Envia o TID em uso para ajudar o Proposer a se corrigir
+    return {"response": "not_accepted", "tid": proposal_id, "slot": slot, "tid_in_use": tid_in_use}, 409, 0
 
-        ACCEPTS_RECEIVED.inc()
-        NOTIFICATIONS_SENT.inc()
-        
-        return jsonify({"response": "accepted", "tid": proposal_id}), 200
-    else:
-        # Notifica Learners e Proposer da rejeição 
-        #avisa o Learner: votei não 
-        notify_learners(proposal_id, transaction, accepted_status=False)
-        
-        REJECTIONS_SENT.inc()
-        # Envia o TID em uso para ajudar o Proposer a se corrigir
-  
-        return jsonify({"response": "not_accepted", "tid": proposal_id, "tid_in_use": highest_promised_id}), 409
+def finish_accept(data, trace_id):
+    """Aceite já em disco: notifica os Learners."""
+    notify_learners(int(data.get("slot", 0)), data.get("proposal_id"), data.get("transaction"),
+                    accepted_status=True, trace_id=trace_id)
+    NOTIFICATIONS_SENT.inc()
+
+@app.post("/accept")
+@HANDLER_SECONDS.labels("accept").time()
+def accept():
+    data = request.get_json()
+    trace_id = request.headers.get("X-Trace-Id")
+    response, status, lsn = handle_accept(data, trace_id)
+    if status == 200:
+        wal_wait(lsn)
+        finish_accept(data, trace_id)
+    return jsonify(response), status
 
 @app.get("/")
 def root():
     return "ACCEPTOR OK"
 
+def status_body():
+    """Maior slot aceito e a promessa atual. O learner usa o max_slot de N - Q2 + 1 acceptors como read index."""
+    with promise_lock:
+        return {"acceptor_id": ACCEPTOR_ID, "group": groups.GROUP, "max_slot": max_slot, "promised": highest_promised_id,
+                "truncated_upto": truncated_upto, "log_entries": len(log)}
+
+@app.get("/status")
+def status():
+    return jsonify(status_body()), 200
+
+def compaction_point(learner, upto):
+    """Registra o snapshot de `learner` e devolve até onde o log pode ser compactado (-1 = nada)."""
+    with learner_snapshots_lock:
+        if upto > learner_snapshots.get(learner, -1):
+            learner_snapshots[learner] = upto
+        if len(learner_snapshots) < len(LEARNERS):
+            return -1
+        return min(learner_snapshots.values())
+
+@app.post("/compact")
+def compact():
+    # um learner gravou um snapshot até `upto`: esses slots estão decididos e podem sair do log,
+    # mas só até onde todos os learners já têm snapshot
+    data = request.get_json()
+    learner = data.get("learner")
+    if not learner:
+        return jsonify({"error": "missing learner"}), 400
+    upto = int(data["upto"])
+    safe = compaction_point(learner, upto)
+    removed = truncate_log(safe)
+    if removed:
+        COMPACTIONS.inc()
+        COMPACTED_SLOTS.inc(removed)
+        # vai para o WAL para a compactação sobreviver a um restart (o próximo checkpoint já sai menor)
+        wal_wait(wal_append({"t": "c", "s": upto}))
+        logger.info("Compacted log up to slot %d (%d entries removed, %d left)", safe, removed, len(log))
+    if safe < upto:
+        # outro learner ainda não tem snapshot até `upto` (ou ainda não avisou): compactar além
+        # daqui deixaria ele sem ter de onde recuperar os slots
+        with learner_snapshots_lock:
+            acknowledged = dict(learner_snapshots)
+        return jsonify({"error": "not acknowledged by every learner", "truncated_upto": truncated_upto,
+                        "removed": removed, "acknowledged": acknowledged, "learners": len(LEARNERS)}), 409
+    return jsonify({"truncated_upto": truncated_upto, "removed": removed}), 200
+
+LOG_STREAM_CHUNK = int(os.getenv("ACCEPTOR_LOG_STREAM_CHUNK", "512")) # entradas por pedaço do /log
+
+@app.get("/log")
+def log_stream():
+    # catch-up em bloco: os valores aceitos a partir de `from`, em ordem de slot, numa resposta só
+    # (NDJSON em streaming). A primeira linha diz até onde o log foi compactado.
+    since = request.args.get("from", 0, type=int)
+    header = status_body()
+    entries = sorted((slot, entry) for slot, entry in log.copy().items() if slot >= since)
+    return Response(log_lines(header, entries), mimetype="application/x-ndjson")
+
+def log_lines(header, entries):
+    lines = [json.dumps(header, separators=(",", ":"))]
+    for slot, (proposal_id, value) in entries:
+        lines.append(json.dumps({"slot": slot, "id": proposal_id, "value": value}, separators=(",", ":")))
+        if len(lines) >= LOG_STREAM_CHUNK:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+@app.get("/debug/logs")
+def debug_logs():
+    # ring buffer do logger: últimas mensagens, inclusive as de DEBUG que não foram escritas
+    limit = request.args.get("limit", type=int)
+    return jsonify({"logs": logger.dump(limit)})
+
 app_dispatcher = DispatcherMiddleware(app, {
     '/metrics': make_wsgi_app()
 })
 
+# Modo async (padrão): /prepare e /accept rodam direto no event loop, o resto vai para o Flask
+server = AsyncServer(app_dispatcher)
+
+@server.route("POST", "/prepare")
+async def prepare_async(req):
+    started = time.monotonic()
+    response, status, lsn = handle_prepare(req.json(), req.headers.get("x-trace-id"))
+    await wal_wait_async(lsn)
+    HANDLER_SECONDS.labels("prepare").observe(time.monotonic() - started)
+    return response, status
+
+@server.route("POST", "/accept")
+async def accept_async(req):
+    started = time.monotonic()
+    data = req.json()
+    trace_id = req.headers.get("x-trace-id")
+    response, status, lsn = handle_accept(data, trace_id)
+    if status == 200:
+        await wal_wait_async(lsn)
+        finish_accept(data, trace_id)
+    HANDLER_SECONDS.labels("accept").observe(time.monotonic() - started)
+    return response, status
+
+@server.route("GET", "/status")
+async def status_async(req):
+    return status_body(), 200
+
+# Protocolo binário (common/wire.py): mesmos handlers, ligado com ACCEPTOR_WIRE_PORT
+WIRE_PORT = os.getenv("ACCEPTOR_WIRE_PORT", "")
+
+async def wire_prepare(body):
+    started = time.monotonic()
+    data = wire.decode_prepare(body)
+    response, status, lsn = handle_prepare(data, data["trace_id"])
+    await wal_wait_async(lsn)
+    HANDLER_SECONDS.labels("prepare").observe(time.monotonic() - started)
+    return wire.PROMISE, wire.encode_promise(response, status)
+
+async def wire_accept(body):
+    started = time.monotonic()
+    data = wire.decode_accept(body)
+    trace_id = data["trace_id"]
+    response, status, lsn = handle_accept(data, trace_id)
+    if status == 200:
+        await wal_wait_async(lsn)
+        finish_accept(data, trace_id)
+    HANDLER_SECONDS.labels("accept").observe(time.monotonic() - started)
+    return wire.ACCEPTED, wire.encode_accepted(response, status)
+
 if __name__ == "__main__":
-    from werkzeug.serving import run_simple
-    
-    # O Acceptor deve rodar na porta 8000 para a rede interna do Paxos
-    print("ACCEPTOR starting on port 8000. Paxos endpoints and /metrics exposed.")
+    # O Acceptor roda na porta 8000 para a rede interna do Paxos (ACCEPTOR_PORT muda, ex.: benchmark local)
+    port = int(os.getenv("ACCEPTOR_PORT", "8000"))
+    logger.info("ACCEPTOR starting on port %d. Paxos endpoints and /metrics exposed.", port)
+    # um acceptor guarda o estado de um grupo só (PAXOS_GROUP); outro grupo = outro processo e outro ACCEPTOR_DATA_DIR
+    try:
+        groups.validate()
+    except ValueError as e:
+        logger.error("Invalid group configuration: %s", e)
+        sys.exit(1)
+    # só no processo do servidor: importar o módulo (bench, testes) não abre WAL nem sobe threads
+    start_durability()
+    if WIRE_PORT:
+        wire.WireServer({wire.PREPARE: wire_prepare, wire.ACCEPT: wire_accept}).start(int(WIRE_PORT))
     
     #SERVIDOR
-    # Executa o DispatcherMiddleware na porta 8000
-    run_simple('0.0.0.0', 8000, app_dispatcher)
+    # SERVER_MODE=async (padrão) usa o event loop; SERVER_MODE=threaded volta para uma thread por requisição
+    run_server(app_dispatcher, port, server, default_mode="async")
@@ -0,0 +1,218 @@
+# acceptor_bench.py
+# Benchmark de um acceptor sozinho: vários processos/threads mandando PREPARE e ACCEPT com ballots
+# concorrentes para poucos slots, em cada modo de servidor (SERVER_MODE=threaded/async).
+# Mede requisições/s e latência, e no fim confere a segurança: para cada slot, um PREPARE com
+# ballot enorme tem que devolver o maior ballot que o acceptor respondeu como "accepted" naquele
+# slot. Se um ACCEPT mais antigo sobrescreveu um mais novo (corrida check-then-write), conta como violação.
+#
+# Exemplo:
+#   python bench/acceptor_bench.py --modes threaded,async --duration 10 --idle-connections 2000
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+def make_ballot(worker):
+    # único por worker e crescente no tempo (o acceptor só compara o prefixo numérico)
+    return f"{time.time_ns() // 100 * 64 + worker}:w{worker}"
+
+def client_worker(args):
+    """Um processo de carga: `threads` threads, cada uma com a sua conexão keep-alive."""
+    url, process_index, threads, duration, slots, payload_size, prepare_ratio = args
+    import random
+    deadline = time.monotonic() + duration
+    latencies = []
+    max_accepted = {} # slot -> maior prefixo respondido como "accepted"
+    counts = {"prepare": 0, "accept": 0, "accepted": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def run(thread_index):
+        worker = process_index * threads + thread_index
+        session = requests.Session()
+        local_latencies = []
+        local_counts = dict.fromkeys(counts, 0)
+        local_max = {}
+        n = 0
+        while time.monotonic() < deadline:
+            slot = random.randrange(slots)
+            ballot = make_ballot(worker)
+            n += 1
+            phase = "prepare" if random.random() < prepare_ratio else "accept"
+            payload = {"proposal_id": ballot, "slot": slot}
+            if phase == "accept":
+                payload["transaction"] = {"client_id": f"w{worker}", "request_id": n, "value": "x" * payload_size}
+            started = time.monotonic()
+            try:
+                r = session.post(f"{url}/{phase}", json=payload, timeout=10)
+            except requests.RequestException:
+                local_counts["errors"] += 1
+                continue
+            local_latencies.append(time.monotonic() - started)
+            local_counts[phase] += 1
+            if phase == "accept" and r.status_code == 200:
+                local_counts["accepted"] += 1
+                prefix = int(ballot.split(":")[0])
+                if prefix > local_max.get(slot, -1):
+                    local_max[slot] = prefix
+        with lock:
+            latencies.extend(local_latencies)
+            for key, value in local_counts.items():
+                counts[key] += value
+            for slot, prefix in local_max.items():
+                if prefix > max_accepted.get(slot, -1):
+                    max_accepted[slot] = prefix
+
+    pool = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return latencies, counts, max_accepted
+
+def rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def thread_count(pid):
+    try:
+        return len(os.listdir(f"/proc/{pid}/task"))
+    except OSError:
+        return 0
+
+def run_mode(mode, args):
+    work_dir = tempfile.mkdtemp(prefix="acceptor-bench-")
+    url = f"http://127.0.0.1:{args.port}"
+    env = dict(os.environ)
+    env.update({
+        "SERVER_MODE": mode,
+        "ACCEPTOR_PORT": str(args.port),
+        "ACCEPTOR_DATA_DIR": os.path.join(work_dir, "data") if args.wal else "",
+        "ACCEPTOR_WAL_FSYNC": "1" if args.fsync else "0",
+        "LEARNER_URLS": "",
+        "HOSTNAME": "bench-acceptor",
+    })
+    log = open(os.path.join(work_dir, "acceptor.log"), "w")
+    process = subprocess.Popen([sys.executable, "-u", os.path.join(ROOT, "acceptor", "acceptor.py")],
+                               env=env, stdout=log, stderr=subprocess.STDOUT, cwd=work_dir)
+    idle = []
+    try:
+        deadline = time.monotonic() + 20
+        while True:
+            try:
+                requests.get(url + "/", timeout=0.5)
+                break
+            except requests.RequestException:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    raise RuntimeError(f"acceptor did not start (see {log.name})")
+                time.sleep(0.1)
+
+        # conexões abertas e paradas (clientes ociosos) durante toda a carga
+        for _ in range(args.idle_connections):
+            sock = socket.create_connection(("127.0.0.1", args.port))
+            idle.append(sock)
+
+        started = time.monotonic()
+        jobs = [(url, i, args.threads, args.duration, args.slots, args.payload, args.prepare_ratio)
+                for i in range(args.processes)]
+        with multiprocessing.Pool(args.processes) as pool:
+            results = pool.map(client_worker, jobs)
+        elapsed = time.monotonic() - started
+
+        latencies = sorted(l for r in results for l in r[0])
+        counts = {}
+        max_accepted = {}
+        for _, c, m in results:
+            for key, value in c.items():
+                counts[key] = counts.get(key, 0) + value
+            for slot, prefix in m.items():
+                max_accepted[slot] = max(prefix, max_accepted.get(slot, -1))
+        threads = thread_count(process.pid)
+        rss = rss_bytes(process.pid)
+
+        # conferência: o valor final de cada slot tem que ser o do maior ballot aceito
+        violations = 0
+        check = requests.Session()
+        for slot, prefix in max_accepted.items():
+            body = check.post(f"{url}/prepare", json={"proposal_id": f"{10 ** 30}:check", "slot": slot}, timeout=10).json()
+            final = int(str(body.get("accepted_id") or "0:").split(":")[0])
+            if final < prefix:
+                violations += 1
+
+        return {
+            "mode": mode,
+            "requests": len(latencies),
+            "requests_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+            "counts": counts,
+            "latency_ms": {name: 1000.0 * percentile(latencies, p)
+                           for name, p in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+            "slots_checked": len(max_accepted),
+            "safety_violations": violations,
+            "idle_connections": len(idle),
+            "server_threads": threads,
+            "rss_bytes": rss,
+        }
+    finally:
+        for sock in idle:
+            sock.close()
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        log.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de um acceptor (threaded x async)")
+    parser.add_argument("--modes", default="threaded,async")
+    parser.add_argument("--processes", type=int, default=4, help="processos gerando carga")
+    parser.add_argument("--threads", type=int, default=8, help="threads (conexões) por processo")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--slots", type=int, default=16, help="poucos slots = mais disputa no mesmo slot")
+    parser.add_argument("--payload", type=int, default=0, help="bytes extras por transação")
+    parser.add_argument("--prepare-ratio", type=float, default=0.2)
+    parser.add_argument("--idle-connections", type=int, default=0, help="conexões abertas e ociosas durante a carga")
+    parser.add_argument("--no-wal", dest="wal", action="store_false", help="roda sem ACCEPTOR_DATA_DIR")
+    parser.add_argument("--fsync", action="store_true", help="liga o fsync do WAL (por padrão só write)")
+    parser.add_argument("--port", type=int, default=18500)
+    parser.add_argument("--output", default="acceptor_bench.json")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(","):
+        print(f"[BENCH] acceptor SERVER_MODE={mode}", flush=True)
+        result = run_mode(mode, args)
+        latency = result["latency_ms"]
+        print(f"  {result['requests_per_sec']:.0f} req/s  p50 {latency['p50']:.2f}ms  p99 {latency['p99']:.2f}ms  "
+              f"violations {result['safety_violations']}/{result['slots_checked']} slots  "
+              f"threads {result['server_threads']}  rss {result['rss_bytes'] // (1024 * 1024)}MiB", flush=True)
+        results.append(result)
+    with open(args.output, "w") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
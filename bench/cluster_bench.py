@@ -0,0 +1,312 @@
+# cluster_bench.py
+# Benchmark do cluster Paxos inteiro numa máquina só: sobe N acceptors, M proposers e K learners
+# como processos em portas locais (os mesmos apps Flask do docker), roda o cliente em modo carga
+# e junta throughput, latência, mensagens por commit e memória de cada cenário.
+#
+# Exemplo:
+#   python bench/cluster_bench.py --acceptors 3,5 --proposers 1,2 --payloads 0,1024 --duration 10
+#   python bench/cluster_bench.py --save-baseline bench/baseline.json
+#   python bench/cluster_bench.py --baseline bench/baseline.json   # sai com erro se houver regressão
+#   python bench/cluster_bench.py --transports http,wire   # HTTP/JSON x protocolo binário
+#   python bench/cluster_bench.py --acceptors 5 --q2 0,2     # maioria x Flexible Paxos (Q2=2, Q1=4)
+#   python bench/cluster_bench.py --proposers 1 --groups 1,2,4   # grupos de Paxos independentes (nós por grupo)
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PYTHON = sys.executable
+
+# métricas (sem labels) lidas do /metrics de cada processo no fim do cenário
+ACCEPTOR_MESSAGE_METRICS = ("paxos_promises_sent_total", "paxos_rejections_sent_total", "paxos_accepts_received_total")
+
+def parse_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+def scrape(url):
+    """Lê um /metrics do Prometheus e soma as amostras por nome (ignorando labels)."""
+    totals = {}
+    try:
+        text = requests.get(url, timeout=2).text
+    except Exception:
+        return totals
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name_part, _, value = line.rpartition(" ")
+        name = name_part.split("{", 1)[0]
+        try:
+            totals[name] = totals.get(name, 0.0) + float(value)
+        except ValueError:
+            pass
+    return totals
+
+def rss_bytes(pid):
+    """Memória residente do processo (Linux, /proc)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+class Node:
+    """Um processo do cluster (acceptor, proposer, learner ou cliente)."""
+
+    def __init__(self, role, name, port, env, log_dir, group=0):
+        self.role = role
+        self.name = name
+        self.port = port
+        self.group = group
+        self.base_url = f"http://127.0.0.1:{port}"
+        full_env = dict(os.environ)
+        full_env.update(env)
+        full_env["HOSTNAME"] = name
+        self.log = open(os.path.join(log_dir, f"{name}.log"), "w")
+        self.process = subprocess.Popen(
+            [PYTHON, "-u", os.path.join(ROOT, role, f"{role}.py")],
+            env=full_env, stdout=self.log, stderr=subprocess.STDOUT, cwd=log_dir,
+        )
+
+    def wait_ready(self, timeout=20):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited during startup (see {self.log.name})")
+            try:
+                if requests.get(self.base_url + "/", timeout=0.5).status_code == 200:
+                    return
+            except Exception:
+                time.sleep(0.1)
+        raise RuntimeError(f"{self.name} did not start on port {self.port}")
+
+    def metrics(self):
+        return scrape(self.base_url + "/metrics")
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.log.close()
+
+def run_scenario(acceptors, proposers, learners, payload, transport, q2, groups, args, base_port):
+    """Sobe um cluster (`groups` grupos de Paxos, cada um com os seus nós), roda a carga e devolve o resultado."""
+    work_dir = tempfile.mkdtemp(prefix="paxos-bench-")
+    nodes = []
+    ports = itertools.count(base_port)
+    try:
+        # portas de todos os grupos antes de subir qualquer nó: cada grupo precisa das URLs dos outros
+        layout = []
+        for group in range(groups):
+            layout.append({
+                "learner": [next(ports) for _ in range(learners)],
+                "acceptor": [next(ports) for _ in range(acceptors)],
+                "proposer": [next(ports) for _ in range(proposers)],
+                "learner_wire": [next(ports) for _ in range(learners)],
+                "acceptor_wire": [next(ports) for _ in range(acceptors)],
+            })
+        client_port = next(ports)
+        proposer_group_urls = ";".join(",".join(f"http://127.0.0.1:{p}" for p in g["proposer"]) for g in layout)
+        learner_group_urls = ";".join(",".join(f"http://127.0.0.1:{p}" for p in g["learner"]) for g in layout)
+        for group, g in enumerate(layout):
+            # nomes sem sufixo com um grupo só (igual aos cenários antigos)
+            suffix = f"-g{group}" if groups > 1 else ""
+            group_env = {"PAXOS_GROUPS": str(groups), "PAXOS_GROUP": str(group)} if groups > 1 else {}
+            learner_urls = ",".join(f"http://127.0.0.1:{p}/learn" for p in g["learner"])
+            acceptor_urls = ",".join(f"http://127.0.0.1:{p}" for p in g["acceptor"])
+            acceptor_http_urls = acceptor_urls # o read index do learner é sempre HTTP
+            if transport == "wire":
+                learner_urls = ",".join(f"paxos://127.0.0.1:{p}" for p in g["learner_wire"])
+                acceptor_urls = ",".join(f"paxos://127.0.0.1:{p}" for p in g["acceptor_wire"])
+            proposer_urls = ",".join(f"http://127.0.0.1:{p}" for p in g["proposer"])
+            # Q2 = 0: quorums de maioria; senão Q1 fica em N - Q2 + 1 (common/quorum.py)
+            quorum_env = {"PAXOS_Q2": str(q2)} if q2 else {}
+
+            for i, port in enumerate(g["learner"]):
+                nodes.append(Node("learner", f"learner{i + 1}{suffix}", port, {
+                    "LEARNER_PORT": str(port),
+                    "LEARNER_WIRE_PORT": str(g["learner_wire"][i]),
+                    "LEARNER_ACCEPTOR_URLS": acceptor_http_urls,
+                    "LEARNER_PROPOSER_URLS": proposer_urls,
+                    "LEARNER_PEERS": ",".join(f"http://127.0.0.1:{p}" for p in g["learner"] if p != port),
+                    "LEARNER_DATA_DIR": os.path.join(work_dir, f"learner{i + 1}{suffix}-data"),
+                    "LEARNER_GROUP_URLS": learner_group_urls,
+                    **quorum_env, **group_env,
+                }, work_dir, group))
+            for i, port in enumerate(g["acceptor"]):
+                data_dir = os.path.join(work_dir, f"acceptor{i + 1}{suffix}-data")
+                nodes.append(Node("acceptor", f"acceptor{i + 1}{suffix}", port, {
+                    "ACCEPTOR_PORT": str(port),
+                    "ACCEPTOR_WIRE_PORT": str(g["acceptor_wire"][i]),
+                    "ACCEPTOR_DATA_DIR": data_dir,
+                    "LEARNER_URLS": learner_urls,
+                    **group_env,
+                }, work_dir, group))
+            for i, port in enumerate(g["proposer"]):
+                nodes.append(Node("proposer", f"proposer{i + 1}{suffix}", port, {
+                    "PROPOSER_PORT": str(port),
+                    "PROPOSER_ADVERTISE_URL": f"http://127.0.0.1:{port}",
+                    "PROPOSER_PEERS": proposer_urls,
+                    "PROPOSER_GROUP_URLS": proposer_group_urls,
+                    "ACCEPTOR_URLS": acceptor_urls,
+                    "LEARNER_URLS": learner_urls,
+                    **quorum_env, **group_env,
+                }, work_dir, group))
+        for node in nodes:
+            node.wait_ready()
+
+        report_file = os.path.join(work_dir, "client-report.json")
+        client = Node("client", "bench-client", client_port, {
+            "CLIENT_MODE": "load",
+            "CLIENT_PORT": str(client_port),
+            "CLIENT_CALLBACK_URL": f"http://127.0.0.1:{client_port}/commit",
+            # o cliente manda para qualquer proposer; o de outro grupo encaminha para o grupo da chave
+            "PROPOSER_URLS": ",".join(f"http://127.0.0.1:{p}/propose" for g in layout for p in g["proposer"]),
+            "LOAD_KEYS": str(args.keys if groups > 1 else 0),
+            "LOAD_CONCURRENCY": str(args.concurrency),
+            "LOAD_RATE": str(args.rate),
+            "LOAD_DURATION": str(args.duration),
+            "LOAD_PAYLOAD_SIZE": str(payload),
+            "LOAD_REPORT_FILE": report_file,
+        }, work_dir)
+        nodes.append(client)
+        client.process.wait(timeout=args.duration + 120)
+        with open(report_file) as f:
+            load_report = json.load(f)
+
+        by_role = {}
+        for node in nodes[:-1]:
+            by_role.setdefault(node.role, []).append(node)
+        proposer_metrics = [n.metrics() for n in by_role["proposer"]]
+        acceptor_metrics = [n.metrics() for n in by_role["acceptor"]]
+
+        def total(metrics_list, name):
+            return sum(m.get(name, 0.0) for m in metrics_list)
+
+        def mean_ms(name):
+            count = total(proposer_metrics, name + "_count")
+            return 1000.0 * total(proposer_metrics, name + "_sum") / count if count else None
+
+        commits = load_report["commits"] or 1
+        acceptor_messages = sum(total(acceptor_metrics, name) for name in ACCEPTOR_MESSAGE_METRICS)
+        # commits por grupo: o primeiro learner de cada grupo
+        group_commits = [next(n for n in by_role["learner"] if n.group == group).metrics().get("paxos_commit_total", 0.0)
+                         for group in range(groups)]
+        return {
+            "scenario": {"acceptors": acceptors, "proposers": proposers, "learners": learners,
+                         "payload_size": payload, "transport": transport, "q2": q2, "groups": groups,
+                         "concurrency": args.concurrency, "rate": args.rate},
+            "commits": load_report["commits"],
+            "commits_per_sec": load_report["commits_per_sec"],
+            "errors": load_report["errors"],
+            "latency_ms": load_report["latency"],
+            "phase1_mean_ms": mean_ms("paxos_phase1_seconds"),
+            "phase2_mean_ms": mean_ms("paxos_phase2_seconds"),
+            "prepare_rounds_per_commit": total(proposer_metrics, "paxos_prepares_sent_total") / commits,
+            "acceptor_messages_per_commit": acceptor_messages / commits,
+            "learner_batches_per_commit": total(acceptor_metrics, "paxos_learner_notify_batches_total") / commits,
+            "commits_per_group": group_commits,
+            "routed_per_commit": total(proposer_metrics, "paxos_proposer_group_routed_total") / commits,
+            "rss_bytes": {role: sum(rss_bytes(n.process.pid) for n in group) for role, group in by_role.items()},
+        }
+    finally:
+        for node in nodes:
+            node.stop()
+        if args.keep_logs:
+            print(f"  logs kept in {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def scenario_key(result):
+    s = result["scenario"]
+    key = f"a{s['acceptors']}-p{s['proposers']}-l{s['learners']}-payload{s['payload_size']}"
+    # cenários gravados antes da opção de transporte eram todos HTTP
+    if s.get("transport", "http") != "http":
+        key += f"-{s['transport']}"
+    if s.get("q2"):
+        key += f"-q2_{s['q2']}"
+    if s.get("groups", 1) > 1:
+        key += f"-g{s['groups']}"
+    return key
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Lista as regressões: throughput menor ou p99 maior que o baseline além da tolerância."""
+    previous = {scenario_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        key = scenario_key(result)
+        old = previous.get(key)
+        if old is None:
+            continue
+        if result["commits_per_sec"] < old["commits_per_sec"] * (1 - tolerance):
+            regressions.append(f"{key}: commits/s {old['commits_per_sec']:.1f} -> {result['commits_per_sec']:.1f}")
+        if result["latency_ms"]["p99_ms"] > old["latency_ms"]["p99_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: p99 {old['latency_ms']['p99_ms']:.1f}ms -> {result['latency_ms']['p99_ms']:.1f}ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark local do cluster Paxos")
+    parser.add_argument("--acceptors", type=parse_list, default=[3], help="lista de tamanhos, ex.: 3,5")
+    parser.add_argument("--proposers", type=parse_list, default=[1, 2], help="lista, ex.: 1,2 (contenção)")
+    parser.add_argument("--learners", type=parse_list, default=[1])
+    parser.add_argument("--payloads", type=parse_list, default=[0, 1024], help="bytes extras por transação")
+    parser.add_argument("--transports", default="http", help="http, wire ou http,wire (protocolo binário)")
+    parser.add_argument("--q2", type=parse_list, default=[0], help="quorum da fase 2 (0 = maioria), ex.: 0,2")
+    parser.add_argument("--groups", type=parse_list, default=[1], help="grupos de Paxos independentes, ex.: 1,2,4")
+    parser.add_argument("--keys", type=int, default=1024, help="chaves distintas da carga com mais de um grupo")
+    parser.add_argument("--duration", type=float, default=10.0, help="segundos de carga por cenário")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rate", type=float, default=0.0, help="pedidos/s (0 = loop fechado)")
+    parser.add_argument("--base-port", type=int, default=18000)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="compara com este arquivo e falha se houver regressão")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="variação aceita em relação ao baseline")
+    parser.add_argument("--save-baseline", help="grava os resultados também como novo baseline")
+    parser.add_argument("--keep-logs", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    for acceptors, proposers, learners, payload, transport, q2, groups in itertools.product(
+            args.acceptors, args.proposers, args.learners, args.payloads, args.transports.split(","), args.q2,
+            args.groups):
+        print(f"[BENCH] acceptors={acceptors} proposers={proposers} learners={learners} payload={payload} "
+              f"transport={transport}" + (f" q2={q2}" if q2 else "") + (f" groups={groups}" if groups > 1 else ""),
+              flush=True)
+        result = run_scenario(acceptors, proposers, learners, payload, transport, q2, groups, args, args.base_port)
+        latency = result["latency_ms"]
+        print(f"  {result['commits_per_sec']:.1f} commits/s  p50 {latency['p50_ms']:.1f}ms  "
+              f"p99 {latency['p99_ms']:.1f}ms  acceptor msgs/commit {result['acceptor_messages_per_commit']:.2f}"
+              + (f"  commits/group {[int(c) for c in result['commits_per_group']]}" if groups > 1 else ""), flush=True)
+        results.append(result)
+
+    output = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "host": os.uname().nodename, "results": results}
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(output, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"[BENCH] REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,675 @@
+# simulator.py
+# Simulador de eventos discretos do Paxos em tempo virtual: proposers, acceptors, learners e
+# clientes num processo só, sem HTTP, sem threads e sem sleeps. A instância do proposer é a mesma
+# de produção (common/paxos.py: propose, Backoff, VoteRecord, regras do acceptor); o que muda é o
+# transporte (Network: latência sorteada, perda, duplicação) e o relógio (Clock: fila de eventos).
+# Com a mesma semente o resultado é sempre o mesmo, então dá para comparar estratégias de backoff
+# e de quorum em segundos.
+#
+# Modelo:
+#   - cada mensagem sorteia a sua latência; pode ser perdida (--loss) ou chegar duas vezes (--dup)
+#   - acceptors atendem uma mensagem por vez, com --service-ms de processamento cada
+#   - nós podem congelar (--pause-rate pausas por nó por segundo, --pause-ms cada): o que chega
+#     durante a pausa fica esperando, como num processo parado pelo GC ou pelo SO
+#   - proposers com lotes (--batch-max, --linger-ms), janela de instâncias (--window), modo líder,
+#     lease entre proposers (heartbeats pela rede) e tabela de deduplicação dos retries
+#   - learners contam os votos e avisam os clientes; o cliente repete o pedido (mesmo request_id)
+#     depois de --client-timeout sem resposta
+#   - segurança: learners não podem decidir valores diferentes no mesmo slot e, do lado dos
+#     acceptors, no máximo um valor por slot pode juntar um Q2 de accepts; o padrão roda 1 e 3
+#     proposers com e sem lease (--election on,off) e o processo sai com 1 se houver violação
+#   Não modela o WAL, snapshots/compactação nem o preenchimento de buracos pelos learners.
+#
+# Exemplo:
+#   python bench/simulator.py --proposers 1,2 --election off --backoff adaptive,fixed --duration 30
+#   python bench/simulator.py --acceptors 5 --q2 0,2 --latency lognormal:1:0.5 --loss 0,0.01
+
+import argparse
+import heapq
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import deque
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from common import paxos, quorum
+
+# --- RELÓGIO E REDE (TEMPO VIRTUAL) ---
+
+class Clock:
+    """Relógio virtual: uma fila de eventos ordenada por (tempo, ordem de criação)."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.events = []
+        self.seq = itertools.count()
+        self.processed = 0
+
+    def at(self, when, fn, *args):
+        heapq.heappush(self.events, (when, next(self.seq), fn, args))
+
+    def after(self, delay, fn, *args):
+        self.at(self.now + delay, fn, *args)
+
+    def run(self, until):
+        while self.events and self.events[0][0] <= until:
+            self.now, _, fn, args = heapq.heappop(self.events)
+            self.processed += 1
+            fn(*args)
+        self.now = until
+
+class Latency:
+    """Distribuição da latência de uma mensagem, em ms: const:X, uniform:A:B, exp:MEDIA ou
+    lognormal:MEDIANA:SIGMA."""
+
+    def __init__(self, spec):
+        kind, *params = spec.split(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        expected = {"const": 1, "uniform": 2, "exp": 1, "lognormal": 2}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"bad latency spec {spec!r} (const:X, uniform:A:B, exp:MEAN, lognormal:MEDIAN:SIGMA)")
+
+    def sample(self, rng):
+        p = self.params
+        if self.kind == "const":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(p[0], p[1])
+        elif self.kind == "exp":
+            ms = rng.expovariate(1.0 / p[0])
+        else:
+            ms = p[0] * math.exp(rng.gauss(0, p[1]))
+        return ms / 1000.0
+
+class Network:
+    """Transporte simulado: entrega cada mensagem depois da latência sorteada, com perda e duplicação."""
+
+    def __init__(self, clock, rng, latency, loss, dup):
+        self.clock = clock
+        self.rng = rng
+        self.latency = latency
+        self.loss = loss
+        self.dup = dup
+        self.nodes = {}
+        self.sent = {} # tipo -> mensagens enviadas
+        self.dropped = 0
+        self.duplicated = 0
+
+    def send(self, src, dst, kind, msg):
+        self.sent[kind] = self.sent.get(kind, 0) + 1
+        copies = 1
+        if self.rng.random() < self.dup:
+            copies = 2
+            self.duplicated += 1
+        for _ in range(copies):
+            if self.rng.random() < self.loss:
+                self.dropped += 1
+                continue
+            self.clock.after(self.latency.sample(self.rng), self.nodes[dst].deliver, kind, msg, src)
+
+class SimNode:
+    """Nó simulado: mensagens e timers passam por deliver/schedule, que respeitam as pausas."""
+
+    def __init__(self, sim, name):
+        self.sim = sim
+        self.name = name
+        self.paused_until = 0.0
+        sim.net.nodes[name] = self
+
+    def deliver(self, kind, msg, src):
+        if self.sim.clock.now < self.paused_until:
+            # processo congelado: a mensagem espera no buffer do socket
+            self.sim.clock.at(self.paused_until, self.deliver, kind, msg, src)
+            return
+        getattr(self, "on_" + kind)(msg, src)
+
+    def schedule(self, delay, fn, *args):
+        self.sim.clock.after(delay, self._fire, fn, args)
+
+    def schedule_at(self, when, fn, *args):
+        self.sim.clock.at(when, self._fire, fn, args)
+
+    def _fire(self, fn, args):
+        if self.sim.clock.now < self.paused_until:
+            self.sim.clock.at(self.paused_until, self._fire, fn, args)
+            return
+        fn(*args)
+
+    def send(self, dst, kind, msg):
+        self.sim.net.send(self.name, dst, kind, msg)
+
+# --- ACCEPTOR ---
+
+class SimAcceptor(SimNode):
+    """Mesmas regras do acceptor.py (paxos.promises e paxos.admits), atendendo uma mensagem por vez."""
+
+    def __init__(self, sim, name):
+        super().__init__(sim, name)
+        self.promised_id = None
+        self.max_slot = -1
+        self.log = {} # slot -> (proposal_id, valor)
+        self.busy_until = 0.0
+
+    def enqueue(self, handler, msg, src):
+        start = max(self.sim.clock.now, self.busy_until)
+        self.busy_until = start + self.sim.service_time
+        self.sim.clock.at(self.busy_until, handler, msg, src)
+
+    def on_prepare(self, msg, src):
+        self.enqueue(self.handle_prepare, msg, src)
+
+    def on_accept(self, msg, src):
+        self.enqueue(self.handle_accept, msg, src)
+
+    def handle_prepare(self, msg, src):
+        proposal_id, slot = msg["proposal_id"], msg["slot"]
+        promised = paxos.promises(proposal_id, self.promised_id)
+        if promised:
+            self.promised_id = proposal_id
+        accepted_id, accepted_value = self.log.get(slot, (None, None))
+        body = {"type": "promise" if promised else "not_promise", "slot": slot, "tid_in_use": self.promised_id,
+                "accepted_id": accepted_id, "accepted_value": accepted_value, "max_slot": self.max_slot}
+        self.send(src, "reply", {"rid": msg["rid"], "proposal_id": proposal_id, "status": 200 if promised else 409,
+                                 "body": body})
+
+    def handle_accept(self, msg, src):
+        proposal_id, slot, value = msg["proposal_id"], msg["slot"], msg["transaction"]
+        accepted = paxos.admits(proposal_id, self.promised_id)
+        if accepted:
+            self.promised_id = proposal_id
+            self.max_slot = max(self.max_slot, slot)
+            self.log[slot] = (proposal_id, value)
+            self.sim.accepted(self.name, slot, proposal_id, value)
+            body = {"response": "accepted", "tid": proposal_id, "slot": slot}
+        else:
+            body = {"response": "not_accepted", "tid": proposal_id, "slot": slot, "tid_in_use": self.promised_id}
+        # votos (sim ou não) para todos os learners, como o LearnerNotifier
+        for learner in self.sim.learners:
+            self.send(learner.name, "vote", {"slot": slot, "proposal_id": proposal_id, "acceptor_id": self.name,
+                                             "accepted": accepted, "transaction": value})
+        self.send(src, "reply", {"rid": msg["rid"], "proposal_id": proposal_id, "status": 200 if accepted else 409,
+                                 "body": body})
+
+# --- LEARNER ---
+
+class SimLearner(SimNode):
+    """Contagem de votos do learner.py (paxos.VoteRecord): maior ballot por slot, decide com Q2."""
+
+    def __init__(self, sim, name):
+        super().__init__(sim, name)
+        self.pending = {} # slot -> VoteRecord
+        self.decided = {} # slot -> valor
+        self.bits = {}
+
+    def on_vote(self, msg, src):
+        slot = msg["slot"]
+        if slot in self.decided:
+            return
+        record = self.pending.get(slot)
+        ballot = paxos.ballot_key(msg["proposal_id"])
+        if record is None or ballot > record.ballot:
+            record = self.pending[slot] = paxos.VoteRecord(msg["proposal_id"], msg["transaction"], self.sim.clock.now)
+        elif ballot < record.ballot:
+            return
+        bit = self.bits.setdefault(msg["acceptor_id"], 1 << len(self.bits))
+        if record.vote(bit, msg["accepted"], self.sim.q2, len(self.sim.acceptors)) == "committed":
+            del self.pending[slot]
+            self.decided[slot] = record.transaction
+            self.sim.decided(self, slot, record.transaction)
+
+# --- PROPOSER ---
+
+class FixedBackoff:
+    """Backoff sem adaptação: sorteio entre 0 e o teto máximo em toda falha."""
+
+    def __init__(self, base, maximum, rng):
+        self.maximum = maximum
+        self.rng = rng
+        self.level = 0
+
+    def failure(self):
+        return self.rng.uniform(0, self.maximum)
+
+    def success(self):
+        pass
+
+class Instance:
+    __slots__ = ("steps", "batch")
+
+    def __init__(self, steps, batch):
+        self.steps = steps
+        self.batch = batch
+
+class Broadcast:
+    __slots__ = ("instance", "kind", "oks", "fails", "needed", "replied", "failure_body")
+
+    def __init__(self, instance, kind, needed, failure_body):
+        self.instance = instance
+        self.kind = kind
+        self.oks = []
+        self.fails = []
+        self.needed = needed
+        self.replied = set()
+        self.failure_body = failure_body
+
+class SimProposer(SimNode):
+    """O `node` de paxos.propose com estado próprio (slots, líder, lease, backoff) e a rede simulada."""
+
+    def __init__(self, sim, name, rng):
+        super().__init__(sim, name)
+        self.q1 = sim.q1
+        self.q2 = sim.q2
+        self.counter = 0
+        self.next_slot = 0
+        self.leader = None # ballot do modo líder
+        self.leader_floor = 0
+        strategy = paxos.Backoff if sim.args.backoff_strategy == "adaptive" else FixedBackoff
+        self.backoff = strategy(sim.args.backoff_base_ms / 1000.0, sim.args.max_backoff, rng)
+        self.queue = deque() # (transação, chegada)
+        self.in_flight = 0
+        self.pump_at = None
+        self.broadcasts = {}
+        self.rids = itertools.count()
+        self.leases = {} # proposer -> expira em
+        self.seen = {} # (client_id, request_id) -> True depois da decisão (deduplicação dos retries)
+
+    # ambiente da instância (mesma interface do LocalNode do proposer.py)
+    def allocate_slot(self):
+        slot = self.next_slot
+        self.next_slot += 1
+        return slot
+
+    def release_slot(self, slot):
+        # os learners simulados não entregam em ordem, então um buraco não trava ninguém: só
+        # devolve o slot quando ele é o último reservado
+        if self.next_slot == slot + 1:
+            self.next_slot = slot
+
+    def observe_max_slot(self, slot):
+        self.next_slot = max(self.next_slot, slot + 1)
+
+    def leader_ballot(self, slot):
+        if self.sim.args.leader_mode and self.leader is not None and slot >= self.leader_floor:
+            return self.leader
+        return None
+
+    def leader_elsewhere(self):
+        return self.lease_holder() != self.name
+
+    def become_leader(self, proposal_id, floor_slot):
+        if not self.sim.args.leader_mode:
+            return
+        if paxos.ballot_key(proposal_id) > paxos.ballot_key(self.leader):
+            self.leader = proposal_id
+            self.leader_floor = floor_slot
+
+    def step_down(self, proposal_id):
+        if self.leader is not None and self.leader == proposal_id:
+            self.leader = None
+            self.sim.stats["step_downs"] += 1
+
+    def slot_compacted(self, slot, responses):
+        return False
+
+    def next_ballot(self, proposal_id, responses):
+        self.counter = paxos.bumped_counter(self.counter, responses)
+        return f"{self.counter}:{self.name}"
+
+    def quorum_failure(self, phase, trace_id):
+        self.sim.stats[f"phase{phase}_quorum_failures"] += 1
+        return self.backoff.failure()
+
+    def on_phase1_skipped(self):
+        self.sim.stats["phase1_skipped"] += 1
+
+    def on_adopt(self, slot, transaction, trace_id):
+        self.sim.stats["adopted"] += 1
+
+    def on_commit(self, transaction, retries):
+        self.sim.stats["retries"] += retries
+        self.backoff.success()
+
+    # lease (heartbeats pela rede simulada)
+    def lease_holder(self):
+        if not self.sim.args.election:
+            return self.name
+        now = self.sim.clock.now
+        return min([self.name] + [name for name, expires in self.leases.items() if now < expires])
+
+    def heartbeat(self):
+        for peer in self.sim.proposers:
+            if peer is not self:
+                self.send(peer.name, "heartbeat", {})
+        self.schedule(self.sim.args.lease / 3, self.heartbeat)
+
+    def on_heartbeat(self, msg, src):
+        self.leases[src] = self.sim.clock.now + self.sim.args.lease
+
+    # pedidos dos clientes
+    def on_propose(self, msg, src):
+        tx = msg["transaction"]
+        holder = self.lease_holder()
+        if holder != self.name and not msg.get("forwarded"):
+            self.send(holder, "propose", {"transaction": tx, "forwarded": True})
+            return
+        key = (tx["client_id"], tx["request_id"])
+        if key in self.seen:
+            if self.seen[key]:
+                # já decidida: responde sem outra rodada
+                self.send(tx["client_id"], "commit", {"request_id": tx["request_id"]})
+            return # em andamento: o retry espera a mesma instância
+        self.seen[key] = False
+        self.queue.append((tx, self.sim.clock.now))
+        self.pump()
+
+    def pump(self):
+        """Tira lotes da fila enquanto houver lugar na janela (como take_batch + worker_loop)."""
+        args = self.sim.args
+        now = self.sim.clock.now
+        while self.queue and self.in_flight < args.window:
+            when = self.queue[0][1] + args.linger
+            if len(self.queue) < args.batch_max and now < when:
+                if self.pump_at is None or self.pump_at > when:
+                    self.pump_at = when
+                    self.schedule_at(when, self.pump_timer)
+                return
+            batch = [self.queue.popleft()[0] for _ in range(min(args.batch_max, len(self.queue)))]
+            self.counter += 1
+            value = batch[0] if len(batch) == 1 else {"batch": batch}
+            self.in_flight += 1
+            self.sim.stats["instances"] += 1
+            self.step(Instance(paxos.propose(self, f"{self.counter}:{self.name}", value), batch), None)
+
+    def pump_timer(self):
+        self.pump_at = None
+        self.pump()
+
+    def step(self, instance, reply):
+        try:
+            step = instance.steps.send(reply)
+        except StopIteration as done:
+            self.in_flight -= 1
+            if done.value is None:
+                # outro proposer tem o lease: as transações vão para ele
+                holder = self.lease_holder()
+                for tx in instance.batch:
+                    self.seen.pop((tx["client_id"], tx["request_id"]), None)
+                    self.send(holder, "propose", {"transaction": tx, "forwarded": True})
+            else:
+                for tx in instance.batch:
+                    self.seen[(tx["client_id"], tx["request_id"])] = True
+            self.pump()
+            return
+        if step[0] == "sleep":
+            self.sim.stats["backoff_seconds"] += step[1]
+            self.schedule(step[1], self.step, instance, None)
+            return
+        kind, proposal_id, slot, value = step
+        if kind == "prepare":
+            self.sim.stats["prepare_rounds"] += 1
+            broadcast = Broadcast(instance, kind, self.q1, {"type": "not_promise", "tid_in_use": None})
+        else:
+            broadcast = Broadcast(instance, kind, self.q2, {"response": "not_accepted", "tid": proposal_id})
+        rid = next(self.rids)
+        self.broadcasts[rid] = broadcast
+        for acceptor in self.sim.acceptors:
+            self.send(acceptor.name, kind, {"rid": rid, "proposal_id": proposal_id, "slot": slot, "transaction": value})
+        self.schedule(self.sim.args.rpc_timeout, self.broadcast_timeout, rid)
+
+    def on_reply(self, msg, src):
+        broadcast = self.broadcasts.get(msg["rid"])
+        if broadcast is None or src in broadcast.replied:
+            # resposta atrasada (ou duplicada): só alimenta o contador de ballots, como _feed_late_reply
+            self.counter = paxos.bumped_counter(self.counter, [msg["body"]])
+            return
+        broadcast.replied.add(src)
+        body = msg["body"]
+        ok = msg["status"] == 200 and (body.get("type") == "promise" if broadcast.kind == "prepare"
+                                       else body.get("response") == "accepted")
+        (broadcast.oks if ok else broadcast.fails).append(body)
+        if paxos.broadcast_done(len(broadcast.oks), len(broadcast.fails), broadcast.needed, len(self.sim.acceptors)):
+            self.finish(msg["rid"])
+
+    def broadcast_timeout(self, rid):
+        if rid in self.broadcasts:
+            self.finish(rid)
+
+    def finish(self, rid):
+        broadcast = self.broadcasts.pop(rid)
+        # quem não respondeu conta como falha nesta rodada
+        missing = len(self.sim.acceptors) - len(broadcast.oks) - len(broadcast.fails)
+        fails = broadcast.fails + [dict(broadcast.failure_body) for _ in range(missing)]
+        self.step(broadcast.instance, (broadcast.oks, fails))
+
+# --- CLIENTE ---
+
+class SimClient(SimNode):
+    """Gerador de carga: loop fechado (--concurrency) ou aberto (--rate), com retry pelo mesmo request_id."""
+
+    def __init__(self, sim, name, rng):
+        super().__init__(sim, name)
+        self.rng = rng
+        self.next_id = 0
+        self.outstanding = {} # request_id -> horário do primeiro envio
+
+    def start(self):
+        if self.sim.args.rate > 0:
+            self.arrival()
+        else:
+            for _ in range(self.sim.args.concurrency):
+                self.submit()
+
+    def arrival(self):
+        self.submit()
+        self.schedule(self.rng.expovariate(self.sim.args.rate), self.arrival)
+
+    def submit(self):
+        if self.sim.clock.now >= self.sim.args.duration:
+            return
+        self.next_id += 1
+        self.outstanding[self.next_id] = self.sim.clock.now
+        self.send_request(self.next_id)
+
+    def send_request(self, request_id):
+        proposer = self.rng.choice(self.sim.proposers)
+        self.send(proposer.name, "propose", {"transaction": {"client_id": self.name, "request_id": request_id}})
+        self.schedule(self.sim.args.client_timeout, self.check_timeout, request_id)
+
+    def check_timeout(self, request_id):
+        if request_id in self.outstanding:
+            self.sim.stats["client_retries"] += 1
+            self.send_request(request_id)
+
+    def on_commit(self, msg, src):
+        started = self.outstanding.pop(msg["request_id"], None)
+        if started is None:
+            return # aviso repetido (outro learner, retry)
+        if self.sim.clock.now <= self.sim.args.duration:
+            self.sim.latencies.append(self.sim.clock.now - started)
+        if self.sim.args.rate <= 0:
+            self.submit()
+
+# --- SIMULAÇÃO ---
+
+class Simulation:
+    def __init__(self, args, acceptors, proposers, learners, q2, latency, loss, dup, backoff, election):
+        args = argparse.Namespace(**vars(args))
+        args.backoff_strategy = backoff
+        args.election = election
+        self.args = args
+        self.q1, self.q2 = quorum.sizes(acceptors, 0, q2)
+        self.scenario = {"acceptors": acceptors, "proposers": proposers, "learners": learners, "q1": self.q1,
+                         "q2": self.q2, "latency": latency.spec, "loss": loss, "dup": dup, "backoff": backoff,
+                         "leader_mode": args.leader_mode, "election": args.election, "seed": args.seed}
+        master = random.Random(args.seed)
+        self.clock = Clock()
+        self.net = Network(self.clock, random.Random(master.random()), latency, loss, dup)
+        self.service_time = args.service_ms / 1000.0
+        self.stats = dict.fromkeys(("instances", "prepare_rounds", "phase1_skipped", "phase1_quorum_failures",
+                                    "phase2_quorum_failures", "step_downs", "adopted", "retries",
+                                    "backoff_seconds", "client_retries"), 0)
+        self.stats["backoff_seconds"] = 0.0
+        self.latencies = []
+        self.chosen = {} # slot -> valor decidido pelo primeiro learner
+        self.violations = 0 # slots em que learners decidiram valores diferentes
+        self.accepts = {} # (slot, ballot, valor) -> acceptors que aceitaram
+        self.q2_chosen = {} # slot -> valor que juntou um Q2 de accepts
+        self.q2_conflicts = 0 # slots em que dois valores diferentes juntaram um Q2
+        self.committed = {} # (client_id, request_id) -> vezes decidida
+        self.acceptors = [SimAcceptor(self, f"acceptor{i + 1}") for i in range(acceptors)]
+        self.learners = [SimLearner(self, f"learner{i + 1}") for i in range(learners)]
+        self.proposers = [SimProposer(self, f"proposer{i + 1}", random.Random(master.random())) for i in range(proposers)]
+        self.clients = [SimClient(self, f"client{i + 1}", random.Random(master.random())) for i in range(args.clients)]
+        self.pause_rng = random.Random(master.random())
+
+    def accepted(self, acceptor, slot, proposal_id, value):
+        """Um acceptor aceitou: confere, do lado dos acceptors, que no máximo um valor por slot
+        junta um Q2 de accepts (não depende de os learners receberem os votos)."""
+        encoded = json.dumps(value, sort_keys=True)
+        voters = self.accepts.setdefault((slot, proposal_id, encoded), set())
+        voters.add(acceptor)
+        if len(voters) != self.q2:
+            return
+        if slot not in self.q2_chosen:
+            self.q2_chosen[slot] = encoded
+        elif self.q2_chosen[slot] != encoded:
+            self.q2_conflicts += 1
+
+    def decided(self, learner, slot, value):
+        """Um learner decidiu um slot: confere a segurança e avisa os clientes."""
+        if slot not in self.chosen:
+            self.chosen[slot] = value
+            for tx in unpack(value):
+                key = (tx["client_id"], tx["request_id"])
+                self.committed[key] = self.committed.get(key, 0) + 1
+        elif self.chosen[slot] != value:
+            self.violations += 1
+        for tx in unpack(value):
+            learner.send(tx["client_id"], "commit", {"request_id": tx["request_id"]})
+
+    def pause(self, node):
+        node.paused_until = self.clock.now + self.args.pause_ms / 1000.0
+        self.clock.after(self.pause_rng.expovariate(self.args.pause_rate), self.pause, node)
+
+    def run(self):
+        started = time.monotonic()
+        if self.args.election and len(self.proposers) > 1:
+            for proposer in self.proposers:
+                proposer.heartbeat()
+        if self.args.pause_rate > 0:
+            for node in self.acceptors + self.proposers + self.learners:
+                self.clock.after(self.pause_rng.expovariate(self.args.pause_rate), self.pause, node)
+        for client in self.clients:
+            client.start()
+        self.clock.run(self.args.duration)
+        return self.report(time.monotonic() - started)
+
+    def report(self, wall_seconds):
+        latencies = sorted(self.latencies)
+        commits = len(latencies)
+        messages = sum(self.net.sent.values())
+        per_commit = lambda value: value / commits if commits else None
+        return {
+            "scenario": self.scenario,
+            "commits": commits,
+            "commits_per_sec": commits / self.args.duration,
+            "latency_ms": {name: 1000.0 * percentile(latencies, p)
+                           for name, p in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))},
+            "messages_per_commit": per_commit(messages),
+            "messages_by_kind": dict(sorted(self.net.sent.items())),
+            "prepare_rounds_per_commit": per_commit(self.stats["prepare_rounds"]),
+            "dropped": self.net.dropped,
+            "duplicated": self.net.duplicated,
+            "stats": self.stats,
+            "safety_violations": self.violations + self.q2_conflicts,
+            "learner_disagreements": self.violations,
+            "q2_conflicts": self.q2_conflicts,
+            "duplicate_commits": sum(1 for n in self.committed.values() if n > 1),
+            "events": self.clock.processed,
+            "wall_seconds": wall_seconds,
+        }
+
+def unpack(value):
+    if isinstance(value, dict) and isinstance(value.get("batch"), list):
+        return value["batch"]
+    return [value]
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p))]
+
+def parse_list(cast):
+    return lambda value: [cast(v) for v in value.split(",") if v.strip()]
+
+def parse_switch(value):
+    if value.strip() not in ("on", "off"):
+        raise argparse.ArgumentTypeError(f"esperado on ou off: {value}")
+    return value.strip() == "on"
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador do Paxos em tempo virtual")
+    parser.add_argument("--acceptors", type=parse_list(int), default=[3], help="lista, ex.: 3,5")
+    parser.add_argument("--proposers", type=parse_list(int), default=[1, 3], help="lista, ex.: 1,2 (contenção)")
+    parser.add_argument("--learners", type=parse_list(int), default=[1])
+    parser.add_argument("--q2", type=parse_list(int), default=[0], help="quorum da fase 2 (0 = maioria), ex.: 0,2")
+    parser.add_argument("--latency", type=parse_list(Latency), default=[Latency("lognormal:0.5:0.5")],
+                        help="distribuição da latência em ms: const:X, uniform:A:B, exp:MEDIA, lognormal:MEDIANA:SIGMA")
+    parser.add_argument("--loss", type=parse_list(float), default=[0.0], help="probabilidade de perder cada mensagem")
+    parser.add_argument("--dup", type=parse_list(float), default=[0.0], help="probabilidade de duplicar cada mensagem")
+    parser.add_argument("--backoff", type=parse_list(str), default=["adaptive"], help="adaptive (proposer.py) ou fixed")
+    parser.add_argument("--backoff-base-ms", type=float, default=5.0)
+    parser.add_argument("--max-backoff", type=float, default=1.0, help="teto do backoff em segundos")
+    parser.add_argument("--pause-rate", type=float, default=0.0, help="pausas por nó por segundo virtual")
+    parser.add_argument("--pause-ms", type=float, default=200.0, help="duração de cada pausa")
+    parser.add_argument("--service-ms", type=float, default=0.1, help="processamento de cada mensagem no acceptor")
+    parser.add_argument("--window", type=int, default=8, help="instâncias em paralelo por proposer")
+    parser.add_argument("--batch-max", type=int, default=32)
+    parser.add_argument("--linger-ms", type=float, default=5.0)
+    parser.add_argument("--rpc-timeout", type=float, default=3.0, help="espera máxima de um broadcast (s)")
+    parser.add_argument("--lease", type=float, default=2.0, help="duração do lease entre proposers (s)")
+    parser.add_argument("--no-leader-mode", dest="leader_mode", action="store_false")
+    parser.add_argument("--election", type=parse_list(parse_switch), default=[True, False],
+                        help="lease entre proposers: on, off ou on,off (off = disputam sem lease)")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=16, help="pedidos em aberto por cliente (loop fechado)")
+    parser.add_argument("--rate", type=float, default=0.0, help="pedidos/s por cliente (0 = loop fechado)")
+    parser.add_argument("--client-timeout", type=float, default=15.0, help="segundos até o cliente repetir o pedido")
+    parser.add_argument("--duration", type=float, default=30.0, help="segundos virtuais de carga")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="sim_results.json")
+    args = parser.parse_args()
+    args.linger = args.linger_ms / 1000.0
+
+    results = []
+    for acceptors, proposers, learners, q2, latency, loss, dup, backoff, election in itertools.product(
+            args.acceptors, args.proposers, args.learners, args.q2, args.latency, args.loss, args.dup, args.backoff,
+            args.election):
+        if proposers == 1 and not election and True in args.election:
+            continue # com um proposer só o lease não muda nada: roda o cenário uma vez
+        sim = Simulation(args, acceptors, proposers, learners, q2, latency, loss, dup, backoff, election)
+        result = sim.run()
+        s = result["scenario"]
+        latency_ms = result["latency_ms"]
+        print(f"[SIM] acceptors={acceptors} proposers={proposers} q1/q2={s['q1']}/{s['q2']} latency={latency.spec} "
+              f"loss={loss} dup={dup} backoff={backoff} election={'on' if election else 'off'}", flush=True)
+        print(f"  {result['commits_per_sec']:.0f} commits/s  p50 {latency_ms['p50']:.2f}ms  p99 {latency_ms['p99']:.2f}ms  "
+              f"msgs/commit {result['messages_per_commit'] or 0:.2f}  prepares/commit {result['prepare_rounds_per_commit'] or 0:.3f}  "
+              f"violations {result['safety_violations']}  ({result['events']} events in {result['wall_seconds']:.1f}s)",
+              flush=True)
+        results.append(result)
+    with open(args.output, "w") as f:
+        json.dump({"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results}, f, indent=2)
+    if any(result["safety_violations"] for result in results):
+        print("[SIM] safety violations found", flush=True)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -7,43 +7,124 @@ import threading
 import time
 import os
 import random
+import json
+import itertools
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# pacote common/ (logger compartilhado) fica na raiz do repositório
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.logger import get_logger
 
 #cria servidor http para o cliente (só para receber commits)
 app = Flask(__name__)
 
 # Identificador do cliente (docker fornece HOSTNAME)
 CLIENT_ID = os.getenv("HOSTNAME", "client")
+logger = get_logger(CLIENT_ID)
 TARGET_NODE = os.getenv("TARGET", "proposer")
-PROPOSER_URLS = [
-    #temos dois proposers e o cliente escolhe aleatoriamente entre os dois
-    "http://proposer1:9000/propose",
-    "http://proposer2:9000/propose"
-]
+#temos dois proposers e o cliente escolhe aleatoriamente entre os dois (PROPOSER_URLS muda a lista)
+PROPOSER_URLS = [url.strip() for url in os.getenv(
+    "PROPOSER_URLS",
+    "http://proposer1:9000/propose,http://proposer2:9000/propose"
+).split(",") if url.strip()]
+#porta do servidor que recebe os /commit
+CLIENT_PORT = int(os.getenv("CLIENT_PORT", "5000"))
 
 #aqui ficam os resultados que o learner vai mandar
 results = {} 
+#pedidos esperando resultado: request_id -> Event (o /commit acorda quem está esperando)
+waiting = {}
+#no modo carga results só guarda pedidos em waiting: os dois mudam juntos com este lock
+results_lock = threading.Lock()
+#URL de callback que o learner deve usar (vazio = http://<CLIENT_ID>:5000/commit)
+CALLBACK_URL = os.getenv("CLIENT_CALLBACK_URL", "")
+#modo síncrono: o /propose?wait=true já devolve o resultado decidido
+SYNC_PROPOSE = os.getenv("CLIENT_SYNC_PROPOSE", "0") == "1"
+#quanto esperar o /commit de um pedido aceito antes de reenviar (nunca além do prazo do pedido)
+COMMIT_TIMEOUT = float(os.getenv("CLIENT_COMMIT_TIMEOUT", "15"))
+#prazo total de um pedido, somando as esperas pelo /commit e os retries
+REQUEST_DEADLINE = float(os.getenv("CLIENT_REQUEST_DEADLINE", "60"))
+#retries: no máximo CLIENT_RETRY_BUDGET reenvios por pedido; a espera é o Retry-After do proposer
+#(pedido recusado por sobrecarga) ou um backoff exponencial a partir de CLIENT_RETRY_BASE segundos
+RETRY_BUDGET = int(os.getenv("CLIENT_RETRY_BUDGET", "8"))
+RETRY_BASE = float(os.getenv("CLIENT_RETRY_BASE", "0.5"))
+RETRY_MAX = float(os.getenv("CLIENT_RETRY_MAX", "10"))
+#modo de execução: "interactive" (um pedido por vez, como sempre) ou "load" (gerador de carga)
+CLIENT_MODE = os.getenv("CLIENT_MODE", "interactive")
 #contador de pedidos do cliente
 next_request_id = 1
+#sessão desta execução: os request_id recomeçam em 1 a cada restart, e proposer e learner deduplicam
+#por (client_id, session, request_id) para um pedido novo não receber o resultado de um antigo
+SESSION_ID = uuid.uuid4().hex[:16]
 #cada cliente vai mandar de 10 a 50 pedidos (simular carga real do sistema)
 max_requests = random.randint(10, 50)
 
 #esse endpoint é chamado pelo laarner
+#pode vir um resultado só ou um lote {"commits": [...]}
 @app.post("/commit")
 def commit():
     data = request.json
+    for item in data.get("commits", [data]):
+        record_result(item)
+    return jsonify({"ok": True})
+
+@app.get("/debug/logs")
+def debug_logs():
+    # ring buffer do logger: últimas mensagens, inclusive as amostradas que não foram escritas
+    limit = request.args.get("limit", type=int)
+    return jsonify({"logs": logger.dump(limit)})
+
+def record_result(data):
+    #resultado de uma execução anterior deste cliente (mesmo request_id, outra sessão)
+    if data.get("session") not in (None, SESSION_ID):
+        return
     #qual o pedido
     req_id = data.get("request_id") 
     #o resultado
     result = data.get("result")
     # e quem ganhou
     proposal_id = data.get("proposal_id")
-    #o clinete salva o resultado
-    results[req_id] = {"result": result, "proposal_id": proposal_id}
+    #id de correlação do pedido (o mesmo nos logs do proposer, acceptors e learner)
+    trace_id = data.get("trace_id")
+    with results_lock:
+        event = waiting.get(req_id)
+        #modo carga: o pedido já desistiu (timeout) e ninguém vai ler o resultado
+        if event is None and CLIENT_MODE == "load":
+            return
+        #o clinete salva o resultado
+        results[req_id] = {"result": result, "proposal_id": proposal_id}
+        #acorda o main_loop se ele estiver esperando este pedido
+        if event is not None:
+            event.set()
 
-    print(f"[{CLIENT_ID}] Commit notification for request {req_id}: {result} (proposal {proposal_id})")
-    return jsonify({"ok": True})
+    #no modo carga chegam milhares por segundo: só uma amostra vai para o log
+    logger.info("Commit notification for request %s: %s (proposal %s)", req_id, result, proposal_id,
+                trace=trace_id, sample=CLIENT_MODE == "load")
+
+def retry_after(r):
+    """Segundos pedidos pelo proposer numa recusa por sobrecarga (429/503), ou None se não foi recusa."""
+    if r.status_code not in (429, 503):
+        return None
+    try:
+        return float(r.json()["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        try:
+            return float(r.headers.get("Retry-After", ""))
+        except ValueError:
+            return RETRY_BASE
+
+def retry_delay(attempt, hint=None):
+    """Espera antes do reenvio número `attempt` (1, 2, ...). Com o Retry-After do proposer, um pouco
+    acima dele; sem, backoff exponencial com jitter cheio. O jitter evita que os clientes recusados
+    juntos voltem juntos."""
+    if hint is not None:
+        return min(RETRY_MAX, hint * random.uniform(1.0, 1.5))
+    return random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** (attempt - 1)))
 
 #essa função envia um pedido ao Proposer
+#devolve (enviado, retry_after): enviado=False quando o proposer recusou ou não respondeu
 def send_transaction(request_id):
 
     #escolhe um aleatorio
@@ -54,52 +135,275 @@ def send_transaction(request_id):
     payload = {
         "transaction": {
             "client_id": CLIENT_ID,
+            "session": SESSION_ID,
             "request_id": request_id,
             "timestamp": int(time.time() * 1000),
-            "value": f"WRITE_{CLIENT_ID}_{request_id}"
+            "key": CLIENT_ID, #chave na máquina de estados do learner (GET /get?key=...)
+            "value": f"WRITE_{CLIENT_ID}_{request_id}",
+            "trace_id": f"{CLIENT_ID}-{request_id}"
         }
     }
+    if CALLBACK_URL:
+        payload["transaction"]["reply_to"] = CALLBACK_URL
     try:
         #manda o pedido pro Proposer
-        r = requests.post(PROPOSER_URL, json=payload, timeout=5)
-        print(f"[{CLIENT_ID}] Sent transaction request {request_id} to {TARGET_NODE} (http status {getattr(r,'status_code',None)})")
+        if SYNC_PROPOSE:
+            #espera a decisão na própria resposta
+            r = requests.post(PROPOSER_URL, params={"wait": "true"}, json=payload, timeout=20)
+        else:
+            r = requests.post(PROPOSER_URL, json=payload, timeout=5)
+        #200 = resultado já decidido (modo síncrono ou retry de um pedido que o proposer já decidiu)
+        if r.status_code == 200:
+            record_result(r.json())
+        logger.info("Sent transaction request %s to %s (http status %s)", request_id, TARGET_NODE, getattr(r,'status_code',None))
+        hint = retry_after(r)
+        if hint is not None:
+            #cluster sobrecarregado: o pedido não entrou, volta depois do tempo sugerido
+            return False, hint
+        return r.status_code < 400, None
     except Exception as e:
-        print(f"[{CLIENT_ID}] Error sending request {request_id}: {e}")
+        logger.warning("Error sending request %s: %s", request_id, e)
+        return False, None
 
 def main_loop():
     global next_request_id
     numreq = 0
+    attempts = 0 #reenvios do pedido atual
+    deadline = None #prazo do pedido atual (time.monotonic)
 
-    #cada cliente manda um pedido por vez
+    #cada cliente manda um pedido por vez; o retry reusa o mesmo request_id
+    #(o proposer reconhece o pedido e não abre outra rodada para ele)
     while numreq < max_requests:
         req_id = next_request_id
-        next_request_id += 1
+        if deadline is None:
+            deadline = time.monotonic() + REQUEST_DEADLINE
 
-        #manda o pedido e fica esperando 15 segundos
-        send_transaction(req_id)
-
-        waited = 0
-        timeout_ms = 15000 # 15 segundos
-        poll_interval = 0.2
-        while req_id not in results and waited < timeout_ms/1000.0:
-            time.sleep(poll_interval)
-            waited += poll_interval
+        #manda o pedido e, se ele entrou, fica esperando pelo /commit
+        #(o evento é registrado antes do envio para não perder um commit rápido)
+        event = waiting[req_id] = threading.Event()
+        sent, hint = send_transaction(req_id)
+        if sent:
+            event.wait(max(0, min(COMMIT_TIMEOUT, deadline - time.monotonic())))
+        waiting.pop(req_id, None)
 
         #caso o pedido seja aceito
         if req_id in results and results[req_id]["result"] == "COMMITTED":
             # Se for COMMIT, espera um pouco e avança para o próximo ID
             numreq += 1
+            next_request_id += 1
+            attempts = 0
+            deadline = None
             sleep_time = random.randint(1,5)
-            print(f"[{CLIENT_ID}] Request {req_id} COMMITTED. Sleeping {sleep_time}s")
+            logger.info("Request %s COMMITTED. Sleeping %ds", req_id, sleep_time)
             time.sleep(sleep_time)
 
         else:
-            # Se falhar ou der timeout, tenta novamente 
-            print(f"[{CLIENT_ID}] Request {req_id} not committed within timeout. Will retry.")
-            time.sleep(random.uniform(1, 5))
+            # Se falhar, der timeout ou for recusado, tenta novamente (até RETRY_BUDGET vezes, dentro do prazo)
+            attempts += 1
+            delay = retry_delay(attempts, hint)
+            if attempts > RETRY_BUDGET or time.monotonic() + delay > deadline:
+                logger.error("Request %s not committed after %d retries (%.0fs deadline). Giving up.",
+                             req_id, attempts - 1, REQUEST_DEADLINE)
+                numreq += 1
+                next_request_id += 1
+                attempts = 0
+                deadline = None
+                continue
+            if hint is not None:
+                logger.warning("Request %s refused by overloaded proposer. Retrying in %.2fs.", req_id, delay)
+            else:
+                logger.warning("Request %s not committed. Retrying in %.2fs.", req_id, delay)
+            time.sleep(delay)
         
 
-    print(f"[{CLIENT_ID}] Finished all {max_requests} requests")
+    logger.info("Finished all %d requests", max_requests)
+
+# --- GERADOR DE CARGA ---
+# CLIENT_MODE=load: manda pedidos em paralelo (loop fechado) ou numa taxa fixa (loop aberto)
+# e mede a latência ponta a ponta de cada um (envio -> /commit).
+LOAD_CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", "16")) # pedidos em paralelo
+LOAD_RATE = float(os.getenv("LOAD_RATE", "0")) # pedidos/s (0 = loop fechado, cada worker manda o próximo quando o anterior termina)
+LOAD_DURATION = float(os.getenv("LOAD_DURATION", "30")) # segundos
+LOAD_PAYLOAD_SIZE = int(os.getenv("LOAD_PAYLOAD_SIZE", "0")) # bytes extras no valor da transação
+LOAD_REQUEST_TIMEOUT = float(os.getenv("LOAD_REQUEST_TIMEOUT", "15")) # segundos até contar como erro
+LOAD_REPORT_FILE = os.getenv("LOAD_REPORT_FILE", "") # se definido, o relatório JSON também vai para este arquivo
+LOAD_KEYS = int(os.getenv("LOAD_KEYS", "0")) # chaves distintas escritas (0 = só a do cliente); com vários grupos espalha a carga
+
+class LatencyHistogram:
+    """Histograma no estilo HDR: buckets lineares dentro de cada potência de 2,
+    com erro relativo de no máximo 1/SUB_BUCKETS. Valores em microssegundos."""
+    SUB_BITS = 7
+    SUB_BUCKETS = 1 << SUB_BITS
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+        self.lock = threading.Lock()
+
+    def _bucket(self, value):
+        shift = max(value.bit_length() - self.SUB_BITS, 0)
+        return shift, value >> shift
+
+    def record(self, seconds):
+        value = max(int(seconds * 1_000_000), 0)
+        bucket = self._bucket(value)
+        with self.lock:
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+            self.total += 1
+            self.sum += value
+            self.max = max(self.max, value)
+            self.min = value if self.min is None else min(self.min, value)
+
+    def percentile(self, pct):
+        """Valor (em ms) abaixo do qual estão pct% das amostras."""
+        with self.lock:
+            if not self.total:
+                return 0.0
+            target = max(1, int(round(self.total * pct / 100.0)))
+            seen = 0
+            for shift, sub in sorted(self.counts):
+                seen += self.counts[(shift, sub)]
+                if seen >= target:
+                    # limite superior do bucket
+                    return min(((sub + 1) << shift) - 1, self.max) / 1000.0
+            return self.max / 1000.0
+
+    def summary(self):
+        return {
+            "count": self.total,
+            "min_ms": (self.min or 0) / 1000.0,
+            "mean_ms": (self.sum / self.total / 1000.0) if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "p999_ms": self.percentile(99.9),
+            "max_ms": self.max / 1000.0,
+        }
+
+load_session = requests.Session()
+load_request_ids = itertools.count(1)
+load_histogram = LatencyHistogram()
+load_errors = {"timeout": 0, "send": 0, "rejected": 0, "shed": 0}
+load_errors_lock = threading.Lock()
+
+def count_load_error(kind):
+    with load_errors_lock:
+        load_errors[kind] += 1
+
+def forget_request(request_id):
+    """Tira o pedido de waiting e devolve o resultado dele (None se não chegou); depois disso um
+    /commit atrasado do pedido é ignorado."""
+    with results_lock:
+        waiting.pop(request_id, None)
+        return results.pop(request_id, None)
+
+def load_request(intended_start):
+    """Manda um pedido e espera o resultado. A latência é medida a partir do horário em que
+    o pedido deveria ter saído (evita esconder a fila no loop aberto)."""
+    request_id = next(load_request_ids)
+    transaction = {
+        "client_id": CLIENT_ID,
+        "session": SESSION_ID,
+        "request_id": request_id,
+        "timestamp": int(time.time() * 1000),
+        "key": f"{CLIENT_ID}-{request_id % LOAD_KEYS}" if LOAD_KEYS else CLIENT_ID,
+        "value": f"WRITE_{CLIENT_ID}_{request_id}" + "x" * LOAD_PAYLOAD_SIZE,
+        "trace_id": f"{CLIENT_ID}-{request_id}",
+    }
+    if CALLBACK_URL:
+        transaction["reply_to"] = CALLBACK_URL
+    event = waiting[request_id] = threading.Event()
+    deadline = intended_start + LOAD_REQUEST_TIMEOUT
+    attempts = 0
+    while True:
+        try:
+            if SYNC_PROPOSE:
+                r = load_session.post(random.choice(PROPOSER_URLS), params={"wait": "true"},
+                                      json={"transaction": transaction}, timeout=LOAD_REQUEST_TIMEOUT)
+            else:
+                r = load_session.post(random.choice(PROPOSER_URLS), json={"transaction": transaction}, timeout=5)
+            if r.status_code == 200:
+                record_result(r.json())
+        except Exception:
+            forget_request(request_id)
+            count_load_error("send")
+            return
+        hint = retry_after(r)
+        if hint is None:
+            break
+        # recusado por sobrecarga: tenta de novo depois do Retry-After, dentro do orçamento e do prazo
+        attempts += 1
+        delay = retry_delay(attempts, hint)
+        if attempts > RETRY_BUDGET or time.monotonic() + delay > deadline:
+            forget_request(request_id)
+            count_load_error("shed")
+            return
+        time.sleep(delay)
+    remaining = LOAD_REQUEST_TIMEOUT - (time.monotonic() - intended_start)
+    done = event.wait(max(remaining, 0))
+    result = forget_request(request_id)
+    if not done or result is None:
+        count_load_error("timeout")
+    elif result["result"] != "COMMITTED":
+        count_load_error("rejected")
+    else:
+        load_histogram.record(time.monotonic() - intended_start)
+
+def run_load():
+    """Roda a carga por LOAD_DURATION segundos e devolve o relatório."""
+    started = time.monotonic()
+    deadline = started + LOAD_DURATION
+    if LOAD_RATE > 0:
+        # loop aberto: os pedidos saem na taxa pedida, independente das respostas
+        with ThreadPoolExecutor(max_workers=LOAD_CONCURRENCY) as pool:
+            interval = 1.0 / LOAD_RATE
+            next_start = started
+            while next_start < deadline:
+                delay = next_start - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(load_request, next_start)
+                next_start += interval
+    else:
+        # loop fechado: cada worker só manda o próximo depois do anterior terminar
+        def closed_loop_worker():
+            while time.monotonic() < deadline:
+                load_request(time.monotonic())
+        workers = [threading.Thread(target=closed_loop_worker, daemon=True) for _ in range(LOAD_CONCURRENCY)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+    elapsed = time.monotonic() - started
+
+    latency = load_histogram.summary()
+    return {
+        "client_id": CLIENT_ID,
+        "mode": "open" if LOAD_RATE > 0 else "closed",
+        "concurrency": LOAD_CONCURRENCY,
+        "target_rate": LOAD_RATE,
+        "duration_s": elapsed,
+        "payload_size": LOAD_PAYLOAD_SIZE,
+        "commits": latency["count"],
+        "commits_per_sec": latency["count"] / elapsed if elapsed else 0.0,
+        "errors": dict(load_errors),
+        "latency": latency,
+    }
+
+def print_load_report(report):
+    latency = report["latency"]
+    print(f"[{CLIENT_ID}] Load ({report['mode']} loop, concurrency {report['concurrency']}, "
+          f"{report['duration_s']:.1f}s): {report['commits']} commits, {report['commits_per_sec']:.1f} commits/s, "
+          f"errors {report['errors']}")
+    print(f"[{CLIENT_ID}] Latency ms: p50 {latency['p50_ms']:.2f}  p90 {latency['p90_ms']:.2f}  "
+          f"p99 {latency['p99_ms']:.2f}  p999 {latency['p999_ms']:.2f}  max {latency['max_ms']:.2f}")
+    print(json.dumps(report), flush=True)
+    if LOAD_REPORT_FILE:
+        with open(LOAD_REPORT_FILE, "w") as f:
+            json.dump(report, f, indent=2)
 
 def start_background_thread():
     t = threading.Thread(target=main_loop)
@@ -107,6 +411,12 @@ def start_background_thread():
     t.start()
 
 if __name__ == "__main__":
-    print(f"[{CLIENT_ID}] Starting client; will send {max_requests} transactions to {TARGET_NODE}")
-    start_background_thread()
-    app.run(host="0.0.0.0", port=5000)
+    if CLIENT_MODE == "load":
+        # o servidor só recebe os /commit; o relatório sai quando a carga termina
+        logger.info("Starting load generator for %ss against %s", LOAD_DURATION, PROPOSER_URLS)
+        threading.Thread(target=lambda: app.run(host="0.0.0.0", port=CLIENT_PORT, threaded=True), daemon=True).start()
+        print_load_report(run_load())
+    else:
+        logger.info("Starting client; will send %d transactions to %s", max_requests, TARGET_NODE)
+        start_background_thread()
+        app.run(host="0.0.0.0", port=CLIENT_PORT)
@@ -0,0 +1,62 @@
+# groups.py
+# Vários grupos de Paxos independentes, cada um com os seus proposers, acceptors e learners.
+#
+# Um grupo tem ballots, slots, acceptors e máquina de estados próprios; nada é compartilhado entre
+# grupos, então eles decidem em paralelo e a vazão soma. Cada transação pertence a um grupo só,
+# escolhido pelo hash da chave de partição (a "key" da transação, ou o client_id sem ela), e a
+# ordem só é garantida dentro do grupo.
+#
+# Configuração (variáveis de ambiente):
+#   PAXOS_GROUPS   número de grupos (igual em todos os processos). Padrão: 1 (sem particionamento).
+#   PAXOS_GROUP    grupo deste processo (0 .. PAXOS_GROUPS - 1). Padrão: 0.
+#   <PAPEL>_GROUP_URLS  URLs base de cada grupo, grupos separados por ";" e URLs do mesmo grupo
+#                  por ",", ex.: "http://p1-g0:9000,http://p2-g0:9000;http://p1-g1:9000".
+#                  O proposer encaminha para outro grupo as transações que não são dele; o learner
+#                  faz o mesmo com as leituras.
+
+import os
+import zlib
+
+from prometheus_client import Gauge
+
+COUNT = int(os.getenv("PAXOS_GROUPS", "1"))
+GROUP = int(os.getenv("PAXOS_GROUP", "0"))
+
+# header dos pedidos encaminhados para o grupo certo (nunca são reencaminhados)
+ROUTED_HEADER = "X-Paxos-Group"
+
+# métricas por grupo: cada processo serve um grupo, e este gauge dá o label para juntar as séries
+# dos processos do mesmo grupo (ex.: sum by (group) (rate(paxos_commit_total[1m]) * on(instance) group_left(group) paxos_group_info))
+GROUP_INFO = Gauge('paxos_group_info', 'Grupo de Paxos servido por este processo', ['group', 'groups'])
+GROUP_INFO.labels(str(GROUP), str(COUNT)).set(1)
+
+def validate():
+    """ValueError se PAXOS_GROUP não é um grupo válido."""
+    if COUNT < 1:
+        raise ValueError(f"PAXOS_GROUPS={COUNT} must be at least 1")
+    if not 0 <= GROUP < COUNT:
+        raise ValueError(f"PAXOS_GROUP={GROUP} must be between 0 and {COUNT - 1}")
+
+def partition_key(transaction):
+    """Chave de partição: a mesma chave que a máquina de estados do learner usa."""
+    key = transaction.get("key", transaction.get("client_id"))
+    return "" if key is None else str(key)
+
+def group_of(key):
+    """Grupo de uma chave. crc32 em vez de hash(): o resultado é o mesmo em todos os processos."""
+    if COUNT == 1:
+        return 0
+    return zlib.crc32(str(key).encode()) % COUNT
+
+def load_group_urls(env_var_name):
+    """{grupo: [urls]} de uma variável <PAPEL>_GROUP_URLS (vazia = {})."""
+    raw = os.getenv(env_var_name, "")
+    urls = {}
+    for group, part in enumerate(raw.split(";")):
+        members = [url.strip().rstrip("/") for url in part.split(",") if url.strip()]
+        if members:
+            urls[group] = members
+    return urls
+
+def describe():
+    return {"group": GROUP, "groups": COUNT}
@@ -0,0 +1,158 @@
+# logger.py
+# Log estruturado compartilhado pelos quatro papéis (proposer, acceptor, learner e cliente).
+#
+# O handler só guarda uma tupla (horário, nível, mensagem, argumentos, campos) e volta a trabalhar:
+# a formatação e a escrita no stdout acontecem numa thread em background, em lotes.
+# Mensagens do caminho quente podem ser amostradas (sample=True) e as de nível DEBUG, mesmo
+# quando não são escritas, ficam num ring buffer em memória que pode ser despejado sob demanda
+# (GET /debug/logs em cada papel).
+#
+# Configuração (variáveis de ambiente):
+#   LOG_LEVEL        nível mínimo escrito no stdout (DEBUG, INFO, WARNING, ERROR). Padrão INFO.
+#   LOG_SAMPLE_RATE  fração das mensagens com sample=True que são escritas. Padrão 0.01.
+#   LOG_BUFFER_SIZE  quantas mensagens recentes ficam no ring buffer. Padrão 2000 (0 desliga).
+#   LOG_BUFFER_LEVEL nível mínimo guardado no ring buffer. Padrão DEBUG.
+#   LOG_FORMAT       "text" (padrão) ou "json".
+#   LOG_ACCESS       "1" mantém o access log do werkzeug (uma linha por requisição). Padrão desligado.
+
+import atexit
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS_BY_NAME = {name: level for level, name in LEVEL_NAMES.items()}
+
+LOG_LEVEL = LEVELS_BY_NAME.get(os.getenv("LOG_LEVEL", "INFO").upper(), INFO)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "2000"))
+LOG_BUFFER_LEVEL = LEVELS_BY_NAME.get(os.getenv("LOG_BUFFER_LEVEL", "DEBUG").upper(), DEBUG)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# o access log do servidor de desenvolvimento escreve uma linha por requisição, no caminho quente
+if os.getenv("LOG_ACCESS", "0") != "1":
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+# máximo de registros esperando a thread de escrita; além disso os novos são descartados
+WRITER_QUEUE_MAX = 10000
+
+def format_record(record):
+    """Transforma a tupla guardada numa linha de texto (só aqui os argumentos viram string)."""
+    created, level, role, msg, args, fields = record
+    try:
+        text = msg % args if args else msg
+    except (TypeError, ValueError):
+        text = f"{msg} {args!r}"
+    if LOG_FORMAT == "json":
+        entry = {"ts": round(created, 6), "level": LEVEL_NAMES[level], "role": role, "msg": text}
+        for key, value in fields.items():
+            entry[key] = value
+        return json.dumps(entry, default=str)
+    timestamp = time.strftime("%H:%M:%S", time.localtime(created)) + f".{int(created % 1 * 1000):03d}"
+    extra = "".join(f" {key}={value}" for key, value in fields.items() if value is not None)
+    return f"{timestamp} {LEVEL_NAMES[level]} [{role}] {text}{extra}"
+
+class _Writer:
+    """Thread única que formata e escreve os registros em lote (um flush por lote)."""
+
+    def __init__(self):
+        self.queue = deque()
+        self.cond = threading.Condition()
+        self.dropped = 0
+        threading.Thread(target=self.run, name="log-writer", daemon=True).start()
+
+    def put(self, record):
+        with self.cond:
+            if len(self.queue) >= WRITER_QUEUE_MAX:
+                self.dropped += 1
+                return
+            self.queue.append(record)
+            if len(self.queue) == 1:
+                self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+            self.flush()
+
+    def flush(self):
+        """Escreve tudo que está na fila. Chamado pela thread e também na saída do processo."""
+        with self.cond:
+            records = list(self.queue)
+            self.queue.clear()
+            dropped, self.dropped = self.dropped, 0
+        if not records and not dropped:
+            return
+        lines = [format_record(r) for r in records]
+        if dropped:
+            lines.append(format_record((time.time(), WARNING, "LOG", "%d log records dropped", (dropped,), {})))
+        try:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+        except Exception:
+            pass
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _get_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = _Writer()
+                atexit.register(_writer.flush)
+    return _writer
+
+class Logger:
+    """Logger de um papel. Os campos nomeados (trace=..., slot=...) viram key=value ou chaves do JSON."""
+
+    def __init__(self, role):
+        self.role = role
+        self.ring = deque(maxlen=LOG_BUFFER_SIZE) if LOG_BUFFER_SIZE > 0 else None
+
+    def enabled(self, level):
+        """Útil para evitar montar argumentos caros quando o nível não vai ser registrado."""
+        return level >= LOG_LEVEL or (self.ring is not None and level >= LOG_BUFFER_LEVEL)
+
+    def log(self, level, msg, *args, sample=False, **fields):
+        to_ring = self.ring is not None and level >= LOG_BUFFER_LEVEL
+        to_output = level >= LOG_LEVEL and (not sample or random.random() < LOG_SAMPLE_RATE)
+        if not (to_ring or to_output):
+            return
+        record = (time.time(), level, self.role, msg, args, fields)
+        if to_ring:
+            self.ring.append(record)
+        if to_output:
+            _get_writer().put(record)
+
+    def debug(self, msg, *args, **fields):
+        self.log(DEBUG, msg, *args, **fields)
+
+    def info(self, msg, *args, **fields):
+        self.log(INFO, msg, *args, **fields)
+
+    def warning(self, msg, *args, **fields):
+        self.log(WARNING, msg, *args, **fields)
+
+    def error(self, msg, *args, **fields):
+        self.log(ERROR, msg, *args, **fields)
+
+    def dump(self, limit=None):
+        """Formata as mensagens recentes do ring buffer (a mais nova por último)."""
+        if self.ring is None:
+            return []
+        records = list(self.ring)
+        if limit:
+            records = records[-limit:]
+        return [format_record(r) for r in records]
+
+def get_logger(role):
+    return Logger(role)
@@ -0,0 +1,210 @@
+# paxos.py
+# Regras do Paxos sem rede, sem relógio e sem threads, usadas pelos papéis e pelo simulador
+# (bench/simulator.py), para que os dois rodem exatamente a mesma lógica.
+#
+# A instância do proposer (propose) é um gerador: em vez de mandar mensagens e dormir, ela devolve
+# o passo que precisa ser feito e recebe o resultado de volta:
+#   ("prepare", ballot, slot, valor) -> (promises, rejeições)
+#   ("accept", ballot, slot, valor)  -> (aceites, rejeições)
+#   ("sleep", segundos)              -> None
+# O proposer.py executa os passos com HTTP (ou o protocolo binário) e time.sleep; o simulador, com
+# uma rede e um relógio virtuais. O resto do ambiente (slots, modo líder, lease, métricas) vem do
+# objeto `node` (LocalNode no proposer.py, SimProposer no simulador).
+
+import random
+
+# --- BALLOTS ---
+
+def ballot_prefix(pid):
+    """Extrai o prefixo numérico do proposal_id ("<prefixo>:<proposer_id>") para comparação."""
+    try:
+        return int(str(pid).split(":")[0])
+    except (TypeError, ValueError):
+        return 0
+
+def ballot_key(pid):
+    """Ordem total dos ballots: prefixo numérico e, no empate, o id do proposer. Sem ballot (None)
+    fica abaixo de todos."""
+    if pid is None:
+        return (-1, "")
+    return (ballot_prefix(pid), str(pid))
+
+def promises(proposal_id, promised_id):
+    """Regra do acceptor para o PREPARE: ballot estritamente maior que o prometido. Compara o ballot
+    inteiro: com o mesmo contador, "11:A" e "11:B" não podem os dois levar um quorum de promessas."""
+    return ballot_key(proposal_id) > ballot_key(promised_id)
+
+def admits(proposal_id, promised_id):
+    """Regra do acceptor para o ACCEPT: ballot maior ou igual ao prometido (o próprio ballot prometido passa)."""
+    return ballot_key(proposal_id) >= ballot_key(promised_id)
+
+def highest_prefix(responses):
+    """Maior prefixo visto nas respostas (tid_in_use do PREPARE, tid do ACCEPT, ou o aceito no slot)."""
+    highest = 0
+    for r in responses:
+        tid = r.get("tid_in_use") or r.get("tid") or r.get("accepted_id")
+        if tid:
+            highest = max(highest, ballot_prefix(tid))
+    return highest
+
+def bumped_counter(counter, responses):
+    """Contador de ballots depois de uma rodada: pelo menos um acima do maior prefixo visto."""
+    return max(counter, highest_prefix(responses) + 1)
+
+def adopted_value(promises):
+    """Valor que a Fase 2 tem que propor: o aceito com o maior ballot entre as promessas (ou None)."""
+    highest = None
+    for p in promises:
+        accepted_id = p.get("accepted_id")
+        accepted_value = p.get("accepted_value")
+        if accepted_id and accepted_value:
+            key = ballot_key(accepted_id)
+            if highest is None or key > highest[0]:
+                highest = (key, accepted_value)
+    return None if highest is None else highest[1]
+
+def broadcast_done(oks, fails, needed, total):
+    """Já dá para parar de esperar respostas: o quorum chegou ou ficou impossível."""
+    return oks >= needed or fails > total - needed
+
+# --- BACKOFF ---
+
+class Backoff:
+    """Backoff adaptativo: o teto começa em `base` e dobra a cada falha de quorum seguida (contenção
+    observada), até `maximum`; cada commit baixa o nível de novo. O sorteio é entre 0 e o teto
+    (jitter cheio). Não é thread-safe: o proposer chama com o lock dele."""
+
+    def __init__(self, base, maximum, rng=random):
+        self.base = base
+        self.maximum = maximum
+        self.rng = rng
+        self.level = 0
+
+    def failure(self):
+        self.level = min(self.level + 1, 16)
+        return self.rng.uniform(0, min(self.maximum, self.base * (2 ** (self.level - 1))))
+
+    def success(self):
+        if self.level > 0:
+            self.level -= 1
+
+# --- VOTOS (LEARNER) ---
+
+class VoteRecord:
+    """Votos de um ballot em um slot. yes/no são bitsets com um bit por acceptor,
+    então a notificação repetida de um mesmo acceptor não conta duas vezes."""
+    __slots__ = ("proposal_id", "ballot", "yes", "no", "transaction", "notified", "created")
+
+    def __init__(self, proposal_id, transaction, created):
+        self.proposal_id = proposal_id
+        self.ballot = ballot_key(proposal_id)
+        self.yes = 0
+        self.no = 0
+        self.transaction = transaction # referência compartilhada, não uma cópia por voto
+        self.notified = False
+        self.created = created
+
+    def vote(self, bit, accepted, q2, acceptors):
+        """Conta o voto do acceptor `bit`. Devolve "committed" com Q2 sims, "rejected" (uma vez só)
+        quando os nãos tornam Q2 impossível, ou None."""
+        if accepted:
+            self.yes |= bit
+        else:
+            self.no |= bit
+        if self.yes.bit_count() >= q2:
+            return "committed"
+        if self.no.bit_count() > acceptors - q2 and not self.notified:
+            self.notified = True
+            return "rejected"
+        return None
+
+# --- INSTÂNCIA DO PROPOSER ---
+
+def propose(node, proposal_id, transaction, slot=None, trace_id=None):
+    """Loop de consenso de uma transação (ou lote), até o commit.
+
+    Termina com (slot, proposal_id) do commit, ou None se a transação deve ir para o proposer
+    líder. Com `slot` (preenchimento de buraco) roda só aquele slot e termina com o valor que for
+    decidido nele, mesmo que seja um valor adotado."""
+    current_proposal_id = proposal_id
+    retries = 0 # rodadas que falharam
+    fill = slot is not None
+    if not fill:
+        slot = node.allocate_slot()
+    value = transaction # valor proposto neste slot (pode ser um valor adotado)
+    accept_sent = False # a nossa transação já foi para algum acceptor na Fase 2
+
+    while True:
+        # buraco sempre passa pela Fase 1: o líder pode ter mandado outro valor com o mesmo ballot
+        leader_id = None if fill else node.leader_ballot(slot)
+        if leader_id is None and not accept_sent and not fill and node.leader_elsewhere():
+            # outro proposer tem o lease: em vez de rodar a Fase 1 (e derrubar o ballot dele),
+            # a transação vai para ele. Só antes do ACCEPT, para o valor não ficar em dois lugares.
+            # O slot reservado não pode ficar vazio (os learners param nele): o node o devolve ou
+            # o preenche.
+            node.release_slot(slot)
+            return None
+        if leader_id is not None:
+            # Modo líder: o ballot já foi prometido por um quorum Q1, vai direto para a Fase 2
+            current_proposal_id = leader_id
+            node.on_phase1_skipped()
+        else:
+            # FASE 1: PREPARE
+            promises, not_promises = yield ("prepare", current_proposal_id, slot, transaction)
+
+            if node.slot_compacted(slot, not_promises):
+                if fill:
+                    return slot, current_proposal_id
+                # o slot foi decidido (por outro proposer ou por uma rodada nossa sem resposta): segue em outro
+                slot = node.allocate_slot()
+                continue
+
+            if len(promises) < node.q1:
+                # Sem quorum Q1: novo ID acima do maior visto, backoff e repete
+                current_proposal_id = node.next_ballot(current_proposal_id, promises + not_promises)
+                retries += 1
+                yield ("sleep", node.quorum_failure(1, trace_id))
+                continue
+
+            # Slots acima do maior slot ocupado no quorum Q1 estão livres para o líder
+            highest_slot = max(p.get("max_slot", -1) for p in promises)
+            node.observe_max_slot(highest_slot)
+            node.become_leader(current_proposal_id, highest_slot + 1)
+
+            # Regra de adoção: se já houve um valor aceito neste slot, é ele que vai na Fase 2
+            value = transaction
+            adopted = adopted_value(promises)
+            if adopted is not None:
+                value = adopted
+                if transaction != value and not fill:
+                    node.on_adopt(slot, transaction, trace_id)
+
+        # FASE 2: ACCEPT
+        if value is transaction:
+            accept_sent = True
+        accepts, not_accepts = yield ("accept", current_proposal_id, slot, value)
+
+        if len(accepts) >= node.q2:
+            if fill:
+                return slot, current_proposal_id
+            if value != transaction:
+                # O slot foi completado com o valor adotado; a nossa transação vai para outro slot
+                slot = node.allocate_slot()
+                value = transaction
+                continue
+            node.on_commit(transaction, retries)
+            return slot, current_proposal_id
+        if node.slot_compacted(slot, not_accepts):
+            if fill:
+                return slot, current_proposal_id
+            # não dá para saber se o valor decidido foi o nosso: a transação vai de novo num slot novo.
+            # Se ela já tinha sido decidida no slot compactado, a segunda cópia não é reaplicada: a
+            # máquina de estados do learner aplica cada (client_id, session, request_id) uma vez só.
+            slot = node.allocate_slot()
+            value = transaction
+            continue
+        # Sem quorum Q2: perde a liderança, novo ID, backoff e repete
+        node.step_down(current_proposal_id)
+        current_proposal_id = node.next_ballot(current_proposal_id, accepts + not_accepts)
+        retries += 1
+        yield ("sleep", node.quorum_failure(2, trace_id))
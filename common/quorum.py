@@ -0,0 +1,44 @@
+# quorum.py
+# Tamanhos de quorum do Paxos, lidos pelo proposer e pelo learner da mesma configuração.
+#
+# Flexible Paxos: a fase 1 (PREPARE) precisa de Q1 acceptors e a fase 2 (ACCEPT) de Q2, com
+# Q1 + Q2 > N. Basta que todo quorum da fase 1 cruze com todo quorum da fase 2; os quorums da
+# mesma fase não precisam se cruzar. Com um líder estável a fase 1 quase nunca roda, então um Q2
+# pequeno (e um Q1 grande) faz o commit esperar só os acceptors mais rápidos.
+#
+# Configuração (variáveis de ambiente, iguais em todos os proposers e learners):
+#   PAXOS_Q1  acceptors que precisam prometer na fase 1. Padrão: maioria.
+#   PAXOS_Q2  acceptors que precisam aceitar na fase 2 (e votos para o learner decidir). Padrão: maioria.
+# Com só uma delas definida, a outra fica no menor valor válido (N - Q + 1).
+
+import os
+
+def sizes(n, q1=None, q2=None):
+    """Devolve (q1, q2) para N acceptors. ValueError se a configuração não garante a interseção.
+    q1/q2 None vêm de PAXOS_Q1/PAXOS_Q2 (o simulador passa os seus); 0 = não definido."""
+    if n < 1:
+        raise ValueError("no acceptors configured")
+    majority = n // 2 + 1
+    q1 = int(os.getenv("PAXOS_Q1") or 0) if q1 is None else q1
+    q2 = int(os.getenv("PAXOS_Q2") or 0) if q2 is None else q2
+    for name, q in (("PAXOS_Q1", q1), ("PAXOS_Q2", q2)):
+        if q and not 1 <= q <= n:
+            raise ValueError(f"{name}={q} must be between 1 and the number of acceptors ({n})")
+    if q1 and not q2:
+        q2 = n - q1 + 1
+    elif q2 and not q1:
+        q1 = n - q2 + 1
+    else:
+        q1 = q1 or majority
+        q2 = q2 or majority
+    if q1 + q2 <= n:
+        raise ValueError(f"PAXOS_Q1 + PAXOS_Q2 must be greater than the number of acceptors "
+                         f"({q1} + {q2} <= {n}): a phase 1 quorum could miss a chosen value")
+    return q1, q2
+
+def read_quorum(n, q2):
+    """Acceptors que uma leitura precisa consultar para cruzar com todo quorum da fase 2."""
+    return n - q2 + 1
+
+def describe(n, q1, q2):
+    return {"acceptors": n, "q1": q1, "q2": q2}
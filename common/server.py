@@ -0,0 +1,306 @@
+# server.py
+# Servidor HTTP compartilhado pelos papéis.
+#
+# SERVER_MODE=threaded: o servidor de desenvolvimento do werkzeug, uma thread por conexão (como antes).
+# SERVER_MODE=async:    servidor HTTP/1.1 em asyncio (só biblioteca padrão). Rotas registradas como
+#                       nativas (async def) rodam direto no event loop; as outras caem no app WSGI do
+#                       papel (Flask + /metrics), executado num pool de threads. Conexões keep-alive
+#                       ociosas custam só um objeto no loop, não uma thread, então o processo aguenta
+#                       milhares de conexões abertas.
+#
+# Uso:
+#   server = AsyncServer(app_dispatcher)
+#   @server.route("POST", "/prepare")
+#   async def prepare(request):
+#       return {"type": "promise"}, 200
+#   run_server(app_dispatcher, port, server, default_mode="async")
+#
+# Uma rota nativa pode devolver um async generator de bytes como corpo: a resposta sai em chunks,
+# cada pedaço esperando o drain do socket (um cliente lento segura só a própria corrotina).
+
+import asyncio
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, unquote
+
+from common.logger import get_logger
+
+logger = get_logger("HTTP")
+
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "32")) # threads para as rotas WSGI no modo async
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+KEEP_ALIVE_TIMEOUT = float(os.getenv("SERVER_KEEP_ALIVE_TIMEOUT", "75")) # segundos sem requisição até fechar
+
+class Request:
+    """Requisição entregue às rotas nativas."""
+    __slots__ = ("method", "path", "query", "headers", "body")
+
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query # dict (último valor de cada chave)
+        self.headers = headers # dict com nomes em minúsculas
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+class BadRequest(Exception):
+    pass
+
+def encode_body(body):
+    if isinstance(body, bytes):
+        return body, "application/octet-stream"
+    if isinstance(body, str):
+        return body.encode(), "text/plain; charset=utf-8"
+    return json.dumps(body, separators=(",", ":")).encode(), "application/json"
+
+def response_head(status, headers):
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ""
+    lines = [f"HTTP/1.1 {status} {reason}"]
+    lines.extend(f"{name}: {value}" for name, value in headers)
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+class AsyncServer:
+    """Servidor HTTP/1.1 em asyncio com rotas nativas e fallback para um app WSGI."""
+
+    def __init__(self, wsgi_app=None, threads=SERVER_THREADS):
+        self.wsgi_app = wsgi_app
+        self.routes = {}
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+        self.port = 0
+
+    def route(self, method, path):
+        """Registra `async def handler(request)` que devolve (corpo, status) ou (corpo, status, headers)."""
+        def register(handler):
+            self.routes[(method, path)] = handler
+            return handler
+        return register
+
+    def run(self, host, port):
+        self.port = port
+        asyncio.run(self.serve(host, port))
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port,
+                                            limit=MAX_HEADER_BYTES, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+    async def read_request(self, reader):
+        """Lê uma requisição; devolve None quando o cliente fecha a conexão."""
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise BadRequest("header too large")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise BadRequest("bad request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = await self.read_chunked(reader)
+        else:
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY_BYTES:
+                raise BadRequest("body too large")
+            body = await reader.readexactly(length) if length else b""
+        path, _, query_string = target.partition("?")
+        return method, unquote(path), query_string, version, headers, body
+
+    async def read_chunked(self, reader):
+        chunks = []
+        size = 0
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            length = int(line.split(b";", 1)[0], 16)
+            if length == 0:
+                await reader.readuntil(b"\r\n")
+                return b"".join(chunks)
+            size += length
+            if size > MAX_BODY_BYTES:
+                raise BadRequest("body too large")
+            chunks.append(await reader.readexactly(length))
+            await reader.readexactly(2)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    parsed = await self.read_request(reader)
+                except (BadRequest, ValueError, asyncio.IncompleteReadError) as e:
+                    body, content_type = encode_body({"error": f"bad request: {e}"})
+                    writer.write(response_head(400, [("Content-Type", content_type), ("Content-Length", len(body)),
+                                                     ("Connection", "close")]) + body)
+                    break
+                if parsed is None:
+                    break
+                method, path, query_string, version, headers, body = parsed
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+                handler = self.routes.get((method, path))
+                if handler is not None:
+                    await self.run_native(handler, writer, method, path, query_string, headers, body, keep_alive)
+                elif self.wsgi_app is not None:
+                    environ = self.make_environ(method, path, query_string, version, headers, body, writer)
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(self.executor, self.run_wsgi, loop, environ, writer, keep_alive)
+                else:
+                    payload, content_type = encode_body({"error": "not found"})
+                    writer.write(response_head(404, [("Content-Type", content_type), ("Content-Length", len(payload))]) + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def run_native(self, handler, writer, method, path, query_string, headers, body, keep_alive):
+        request = Request(method, path, dict(parse_qsl(query_string)), headers, body)
+        try:
+            result = await handler(request)
+        except Exception as e:
+            logger.error("Handler %s %s failed: %s", method, path, e)
+            result = ({"error": str(e)}, 500)
+        if hasattr(result[0], "__aiter__"):
+            await self.stream_native(result, writer, keep_alive)
+            return
+        payload, content_type = encode_body(result[0])
+        response_headers = [("Content-Type", content_type), ("Content-Length", len(payload))]
+        if len(result) > 2:
+            response_headers.extend(result[2].items())
+        if not keep_alive:
+            response_headers.append(("Connection", "close"))
+        writer.write(response_head(result[1], response_headers) + payload)
+
+    async def stream_native(self, result, writer, keep_alive):
+        """Resposta em chunks de uma rota nativa que devolveu um async generator."""
+        stream = result[0]
+        extra = result[2] if len(result) > 2 else {}
+        response_headers = [("Transfer-Encoding", "chunked")]
+        if not any(name.lower() == "content-type" for name in extra):
+            response_headers.append(("Content-Type", "application/octet-stream"))
+        response_headers.extend(extra.items())
+        if not keep_alive:
+            response_headers.append(("Connection", "close"))
+        writer.write(response_head(result[1], response_headers))
+        try:
+            async for data in stream:
+                if data:
+                    writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+                    await writer.drain()
+            writer.write(b"0\r\n\r\n")
+        finally:
+            # cliente foi embora no meio: o finally do generator roda aqui
+            await stream.aclose()
+
+    def make_environ(self, method, path, query_string, version, headers, body, writer):
+        peer = writer.get_extra_info("peername") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": query_string,
+            "SERVER_NAME": "0.0.0.0",
+            "SERVER_PORT": str(self.port),
+            "SERVER_PROTOCOL": version,
+            "REMOTE_ADDR": peer[0],
+            "CONTENT_TYPE": headers.get("content-type", ""),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in headers.items():
+            if name not in ("content-type", "content-length"):
+                environ["HTTP_" + name.upper().replace("-", "_")] = value
+        return environ
+
+    def run_wsgi(self, loop, environ, writer, keep_alive):
+        """Roda o app WSGI numa thread do pool e escreve a resposta pelo loop.
+
+        Sem Content-Length a resposta sai em chunks à medida que o app produz (streaming),
+        esperando o drain do socket a cada pedaço."""
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [status, headers]
+
+        def send(data):
+            async def write():
+                writer.write(data)
+                await writer.drain()
+            asyncio.run_coroutine_threadsafe(write(), loop).result()
+
+        first = b""
+        try:
+            result = self.wsgi_app(environ, start_response)
+            if not started:
+                # o app pode chamar start_response só na primeira iteração
+                result = iter(result)
+                first = next(result, b"")
+        except Exception as e:
+            logger.error("WSGI app failed on %s: %s", environ["PATH_INFO"], e)
+            result = None
+            started[:] = ["500 Internal Server Error", [("Content-Type", "text/plain")]]
+        status, headers = started[0], list(started[1])
+        names = {name.lower() for name, _ in headers}
+        chunked = "content-length" not in names
+        if chunked:
+            headers.append(("Transfer-Encoding", "chunked"))
+        if not keep_alive:
+            headers.append(("Connection", "close"))
+        head = response_head(int(status.split(" ", 1)[0]), headers)
+        try:
+            if result is None:
+                send(head + (b"0\r\n\r\n" if chunked else b""))
+                return
+            pending = head
+            if first:
+                pending += b"%x\r\n%s\r\n" % (len(first), first) if chunked else first
+            for data in result:
+                if not data:
+                    continue
+                if chunked:
+                    data = b"%x\r\n%s\r\n" % (len(data), data)
+                send(pending + data)
+                pending = b""
+            send(pending + (b"0\r\n\r\n" if chunked else b""))
+        except (ConnectionError, RuntimeError):
+            # cliente foi embora no meio de uma resposta em streaming
+            pass
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+def run_server(wsgi_app, port, server=None, default_mode="threaded", host="0.0.0.0"):
+    """Sobe o papel no modo escolhido por SERVER_MODE (threaded ou async)."""
+    mode = os.getenv("SERVER_MODE", default_mode)
+    if mode == "async":
+        server = server or AsyncServer(wsgi_app)
+        logger.info("Serving on port %d (asyncio, %d native routes)", port, len(server.routes))
+        server.run(host, port)
+    else:
+        from werkzeug.serving import run_simple
+        # uma thread por requisição
+        run_simple(host, port, wsgi_app, threaded=True)
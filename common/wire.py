@@ -0,0 +1,439 @@
+# wire.py
+# Protocolo binário opcional entre os papéis do Paxos (proposer -> acceptor e acceptor -> learner).
+#
+# Em vez de uma requisição HTTP com JSON por mensagem, cada par de processos mantém uma conexão TCP
+# aberta e troca frames com tamanho no início:
+#
+#   frame = tamanho (uint32, bytes que vêm depois) | id da requisição (uint32) | tipo (uint8) | corpo
+#
+# O id permite multiplexar: várias threads mandam pedidos pela mesma conexão e as respostas voltam
+# fora de ordem. Os campos fixos (slot, ballot, status) vão em struct; ballots viajam como
+# (contador int64, id do nó) em vez da string "<contador>:<id>". O valor proposto (transação ou lote)
+# vai como blob: msgpack se estiver instalado, senão JSON compacto (o primeiro byte diz qual).
+#
+# Os decoders devolvem os mesmos dicts que as rotas HTTP recebem e respondem, então os handlers
+# de cada papel são os mesmos nos dois transportes. HTTP/JSON continua disponível (URLs http://);
+# URLs paxos://host:porta usam este protocolo.
+
+import asyncio
+import json
+import socket
+import struct
+import threading
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from common.logger import get_logger
+
+logger = get_logger("WIRE")
+
+SCHEME = "paxos://"
+
+# tipos de mensagem
+PREPARE, PROMISE, ACCEPT, ACCEPTED, VOTES, VOTES_ACK, ERROR = range(1, 8)
+
+FRAME_HEADER = struct.Struct(">IIB") # tamanho, id, tipo
+MAX_FRAME = 64 * 1024 * 1024
+
+_I32 = struct.Struct(">i")
+_Q_SLOT = struct.Struct(">q")
+_STATUS = struct.Struct(">H")
+_BALLOT = struct.Struct(">q") # contador do ballot; -1 = sem ballot
+
+# --- CODIFICAÇÃO DOS CAMPOS ---
+
+def ballot_tuple(pid):
+    """"12:proposer1" -> (12, "proposer1"); None -> None."""
+    if pid is None:
+        return None
+    counter, _, node = str(pid).partition(":")
+    return int(counter), node
+
+def ballot_str(ballot):
+    return None if ballot is None else f"{ballot[0]}:{ballot[1]}"
+
+class _Writer:
+    __slots__ = ("parts",)
+
+    def __init__(self):
+        self.parts = []
+
+    def slot(self, value):
+        self.parts.append(_Q_SLOT.pack(value))
+
+    def status(self, value):
+        self.parts.append(_STATUS.pack(value))
+
+    def flag(self, value):
+        self.parts.append(b"\x01" if value else b"\x00")
+
+    def text(self, value):
+        if value is None:
+            self.parts.append(_I32.pack(-1))
+        else:
+            data = value.encode()
+            self.parts.append(_I32.pack(len(data)))
+            self.parts.append(data)
+
+    def ballot(self, pid):
+        ballot = ballot_tuple(pid)
+        if ballot is None:
+            self.parts.append(_BALLOT.pack(-1))
+        else:
+            self.parts.append(_BALLOT.pack(ballot[0]))
+            self.text(ballot[1])
+
+    def value(self, value):
+        if value is None:
+            self.parts.append(_I32.pack(-1))
+            return
+        if msgpack is not None:
+            data = b"M" + msgpack.packb(value, use_bin_type=True)
+        else:
+            data = b"J" + json.dumps(value, separators=(",", ":")).encode()
+        self.parts.append(_I32.pack(len(data)))
+        self.parts.append(data)
+
+    def bytes(self):
+        return b"".join(self.parts)
+
+class _Reader:
+    __slots__ = ("buf", "pos")
+
+    def __init__(self, buf):
+        self.buf = memoryview(buf)
+        self.pos = 0
+
+    def _unpack(self, fmt):
+        value = fmt.unpack_from(self.buf, self.pos)[0]
+        self.pos += fmt.size
+        return value
+
+    def slot(self):
+        return self._unpack(_Q_SLOT)
+
+    def status(self):
+        return self._unpack(_STATUS)
+
+    def flag(self):
+        value = self.buf[self.pos] == 1
+        self.pos += 1
+        return value
+
+    def _blob(self):
+        size = self._unpack(_I32)
+        if size < 0:
+            return None
+        data = self.buf[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+    def text(self):
+        data = self._blob()
+        return None if data is None else str(data, "utf-8")
+
+    def ballot(self):
+        counter = self._unpack(_BALLOT)
+        if counter < 0:
+            return None
+        return ballot_str((counter, self.text()))
+
+    def value(self):
+        data = self._blob()
+        if data is None:
+            return None
+        if data[:1] == b"M":
+            if msgpack is None:
+                raise ValueError("msgpack value received but msgpack is not installed")
+            return msgpack.unpackb(data[1:], raw=False)
+        return json.loads(bytes(data[1:]))
+
+# --- MENSAGENS DO PAXOS ---
+# Cada par encode/decode espelha o JSON da rota HTTP equivalente.
+
+def encode_prepare(data, trace_id=None):
+    w = _Writer()
+    w.slot(int(data.get("slot", 0)))
+    w.ballot(data.get("proposal_id"))
+    w.text(trace_id)
+    return w.bytes()
+
+def decode_prepare(body):
+    r = _Reader(body)
+    slot = r.slot()
+    return {"slot": slot, "proposal_id": r.ballot(), "trace_id": r.text()}
+
+def encode_accept(data, trace_id=None):
+    w = _Writer()
+    w.slot(int(data.get("slot", 0)))
+    w.ballot(data.get("proposal_id"))
+    w.text(trace_id)
+    w.value(data.get("transaction"))
+    return w.bytes()
+
+def decode_accept(body):
+    r = _Reader(body)
+    slot = r.slot()
+    proposal_id = r.ballot()
+    trace_id = r.text()
+    return {"slot": slot, "proposal_id": proposal_id, "trace_id": trace_id, "transaction": r.value()}
+
+def encode_promise(response, status):
+    w = _Writer()
+    w.status(status)
+    w.flag(response["type"] == "promise")
+    w.slot(response["slot"])
+    w.ballot(response.get("tid_in_use"))
+    w.ballot(response.get("accepted_id"))
+    w.slot(response.get("max_slot", -1))
+    w.slot(response.get("truncated_upto", -1))
+    w.value(response.get("accepted_value"))
+    return w.bytes()
+
+def decode_promise(body):
+    r = _Reader(body)
+    status = r.status()
+    promised = r.flag()
+    response = {
+        "type": "promise" if promised else "not_promise",
+        "slot": r.slot(),
+        "tid_in_use": r.ballot(),
+        "accepted_id": r.ballot(),
+        "max_slot": r.slot(),
+    }
+    truncated_upto = r.slot()
+    if status == 410:
+        # slot compactado: mesmos campos do compacted_response do acceptor
+        response["truncated_upto"] = truncated_upto
+    response["accepted_value"] = r.value()
+    return status, response
+
+def encode_accepted(response, status):
+    w = _Writer()
+    w.status(status)
+    w.flag(response["response"] == "accepted")
+    w.slot(response["slot"])
+    w.ballot(response.get("tid"))
+    w.ballot(response.get("tid_in_use"))
+    w.slot(response.get("max_slot", -1))
+    w.slot(response.get("truncated_upto", -1))
+    return w.bytes()
+
+def decode_accepted(body):
+    r = _Reader(body)
+    status = r.status()
+    accepted = r.flag()
+    response = {"response": "accepted" if accepted else "not_accepted", "slot": r.slot(), "tid": r.ballot()}
+    tid_in_use = r.ballot()
+    if tid_in_use is not None:
+        response["tid_in_use"] = tid_in_use
+    max_slot = r.slot()
+    truncated_upto = r.slot()
+    if status == 410:
+        response["max_slot"] = max_slot
+        response["truncated_upto"] = truncated_upto
+    return status, response
+
+def encode_votes(votes):
+    w = _Writer()
+    w.parts.append(_I32.pack(len(votes)))
+    for vote in votes:
+        w.text(vote.get("acceptor_id"))
+        w.text(vote.get("trace_id"))
+        w.slot(int(vote.get("slot", 0)))
+        w.ballot(vote.get("proposal_id"))
+        w.flag(vote.get("accepted"))
+        w.value(vote.get("transaction"))
+    return w.bytes()
+
+def decode_votes(body):
+    r = _Reader(body)
+    count = r._unpack(_I32)
+    votes = []
+    for _ in range(count):
+        acceptor_id = r.text()
+        trace_id = r.text()
+        slot = r.slot()
+        proposal_id = r.ballot()
+        accepted = r.flag()
+        votes.append({"acceptor_id": acceptor_id, "trace_id": trace_id, "slot": slot,
+                      "proposal_id": proposal_id, "accepted": accepted, "transaction": r.value()})
+    return votes
+
+# --- CONEXÕES ---
+
+def parse_address(url):
+    """"paxos://acceptor1:8001" -> ("acceptor1", 8001)."""
+    host, _, port = url[len(SCHEME):].strip("/").partition(":")
+    return host, int(port)
+
+def frame(request_id, msg_type, body):
+    return FRAME_HEADER.pack(FRAME_HEADER.size - 4 + len(body), request_id, msg_type) + body
+
+class WireError(Exception):
+    pass
+
+class _Pending:
+    __slots__ = ("event", "msg_type", "body", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.msg_type = None
+        self.body = None
+        self.error = None
+
+class WireClient:
+    """Conexão persistente com um servidor do protocolo binário, compartilhada por várias threads.
+
+    Cada call() manda um frame com um id novo e espera a resposta com o mesmo id; uma thread de
+    leitura por conexão entrega as respostas. Se a conexão cair, os pedidos pendentes falham e o
+    próximo call() reconecta."""
+
+    def __init__(self, url, connect_timeout=1.0):
+        self.url = url
+        self.address = parse_address(url)
+        self.connect_timeout = connect_timeout
+        self.lock = threading.Lock() # conexão, ids e pendentes
+        self.send_lock = threading.Lock()
+        self.sock = None
+        self.pending = {}
+        self.next_id = 0
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.connect_timeout)
+        sock.settimeout(None)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        threading.Thread(target=self._read_loop, args=(sock,), name=f"wire-{self.url}", daemon=True).start()
+
+    def call(self, msg_type, body, timeout):
+        """Manda um pedido e devolve (tipo, corpo) da resposta."""
+        pending = _Pending()
+        with self.lock:
+            if self.sock is None:
+                try:
+                    self._connect()
+                except OSError as e:
+                    raise WireError(f"connect {self.url}: {e}")
+            sock = self.sock
+            self.next_id = (self.next_id + 1) & 0xFFFFFFFF
+            request_id = self.next_id
+            self.pending[request_id] = pending
+        try:
+            with self.send_lock:
+                sock.sendall(frame(request_id, msg_type, body))
+        except OSError as e:
+            self._fail(sock, e)
+        if not pending.event.wait(timeout):
+            with self.lock:
+                self.pending.pop(request_id, None)
+            raise WireError(f"timeout waiting for {self.url}")
+        if pending.error is not None:
+            raise WireError(pending.error)
+        if pending.msg_type == ERROR:
+            raise WireError(bytes(pending.body).decode(errors="replace"))
+        return pending.msg_type, pending.body
+
+    def _read_loop(self, sock):
+        try:
+            reader = sock.makefile("rb")
+            while True:
+                header = reader.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    raise ConnectionError("connection closed")
+                size, request_id, msg_type = FRAME_HEADER.unpack(header)
+                body = reader.read(size - (FRAME_HEADER.size - 4))
+                with self.lock:
+                    pending = self.pending.pop(request_id, None)
+                if pending is not None:
+                    pending.msg_type = msg_type
+                    pending.body = body
+                    pending.event.set()
+        except (OSError, ValueError) as e:
+            self._fail(sock, e)
+
+    def _fail(self, sock, error):
+        """Conexão perdida: todos os pedidos pendentes nela falham."""
+        with self.lock:
+            if self.sock is not sock:
+                return
+            self.sock = None
+            failed = list(self.pending.values())
+            self.pending.clear()
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for pending in failed:
+            pending.error = f"connection to {self.url} lost: {error}"
+            pending.event.set()
+
+class WireServer:
+    """Servidor do protocolo binário. `handlers` mapeia tipo -> async def handler(corpo) -> (tipo, corpo).
+
+    Cada frame recebido vira uma task, então pedidos da mesma conexão são atendidos em paralelo
+    e respondidos na ordem em que terminam."""
+
+    def __init__(self, handlers):
+        self.handlers = handlers
+
+    def start(self, port, host="0.0.0.0"):
+        """Roda o servidor numa thread própria com o seu event loop."""
+        ready = threading.Event()
+
+        def run():
+            async def serve():
+                server = await asyncio.start_server(self.handle_connection, host, port, backlog=4096)
+                ready.set()
+                async with server:
+                    await server.serve_forever()
+            asyncio.run(serve())
+
+        threading.Thread(target=run, name=f"wire-server-{port}", daemon=True).start()
+        ready.wait(5)
+        logger.info("Binary protocol listening on port %d", port)
+
+    async def handle_connection(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        tasks = set()
+        #drain de várias tasks na mesma conexão: uma de cada vez
+        drain_lock = asyncio.Lock()
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                size, request_id, msg_type = FRAME_HEADER.unpack(header)
+                if size > MAX_FRAME:
+                    break
+                body = await reader.readexactly(size - (FRAME_HEADER.size - 4))
+                task = asyncio.ensure_future(self.dispatch(writer, drain_lock, request_id, msg_type, body))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, writer, drain_lock, request_id, msg_type, body):
+        handler = self.handlers.get(msg_type)
+        try:
+            if handler is None:
+                raise WireError(f"unknown message type {msg_type}")
+            reply_type, reply = await handler(body)
+        except Exception as e:
+            logger.error("Binary handler for type %d failed: %s", msg_type, e)
+            reply_type, reply = ERROR, str(e).encode()
+        if writer.is_closing():
+            return
+        writer.write(frame(request_id, reply_type, reply))
+        #espera o buffer de saída baixar: um cliente que não lê as respostas segura os handlers em vez
+        #de acumular respostas na memória do servidor
+        try:
+            async with drain_lock:
+                await writer.drain()
+        except ConnectionError:
+            pass
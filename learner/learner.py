@@ -1,15 +1,32 @@
 #learner.py
 #IMPORTAÇÕES
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 import requests
-from collections import defaultdict
+from requests.adapters import HTTPAdapter
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+import asyncio
+import bisect
+import json
 import os
+import random
+import queue
+import sys
+import threading
+import time
 
-from prometheus_client import Counter, make_wsgi_app
+from prometheus_client import Counter, Gauge, Histogram, make_wsgi_app
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
+# pacote common/ (logger compartilhado) fica na raiz do repositório
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.logger import get_logger
+from common.server import AsyncServer, run_server
+from common import groups, paxos, quorum, wire
+
 #cria um servidor web pro Learner (para receber as requisocoes http)
 app = Flask(__name__)
+logger = get_logger("LEARNER")
 
 #Métricas 
 #quantas propostas tiveram sucesso 
@@ -17,47 +34,1066 @@ COMMIT_TOTAL = Counter('paxos_commit_total', 'Total de propostas COMMITTED (Quor
 #conta quantas vezes o Learner avisou o cliente
 NOTIFICATION_SENT = Counter('paxos_client_notification_sent_total', 'Total de notificações enviadas ao Cliente')
 
-#cada proposal_id vai quardar: quantos fotos sim, quantos não, o valor que está sendo decidido e se o cliente já foi notificado.
-proposal_votes = defaultdict(lambda: {"yes": 0, "no": 0, "transaction": None, "notified": False})
+def load_urls_from_env(env_var_name, default_value=""):
+    """Lê uma string separada por vírgulas de uma variável de ambiente e a converte em uma lista de URLs."""
+    urls_str = os.getenv(env_var_name, default_value)
+    return [url.strip() for url in urls_str.split(',') if url.strip()]
+
+#acceptors: definem N dos quorums e são consultados pelo read index (HTTP, GET /status) e no catch-up
+ACCEPTORS = load_urls_from_env("LEARNER_ACCEPTOR_URLS", "http://acceptor1:8000,http://acceptor2:8000,http://acceptor3:8000")
+
+#quorum de decisão: Q2 votos iguais (a mesma PAXOS_Q1/PAXOS_Q2 dos proposers, common/quorum.py)
+try:
+    Q1, Q2 = quorum.sizes(len(ACCEPTORS))
+except ValueError as e:
+    logger.error("Invalid quorum configuration: %s", e)
+    sys.exit(1)
+#leituras linearizáveis consultam acceptors suficientes para cruzar com qualquer quorum Q2
+READ_QUORUM = quorum.read_quorum(len(ACCEPTORS), Q2)
+#grupo deste learner (PAXOS_GROUP): ACCEPTOR_URLS, PROPOSER_URLS e PEERS são todos do mesmo grupo
+try:
+    groups.validate()
+except ValueError as e:
+    logger.error("Invalid group configuration: %s", e)
+    sys.exit(1)
+
+# --- CONTAGEM DE VOTOS ---
+#limites da tabela de votos: quantos slots em aberto no máximo e por quanto tempo (segundos)
+MAX_PENDING_VOTES = int(os.getenv("LEARNER_MAX_PENDING_VOTES", "10000"))
+VOTE_TTL = float(os.getenv("LEARNER_VOTE_TTL", "300"))
+#quantos slots já decididos lembramos (para ignorar votos atrasados desses slots)
+MAX_DECIDED_SLOTS = int(os.getenv("LEARNER_MAX_DECIDED_SLOTS", "100000"))
+
+VoteRecord = paxos.VoteRecord # votos de um ballot em um slot (bitsets sim/não por acceptor)
+
+#slot -> VoteRecord do maior ballot visto nesse slot (ballots menores são descartados)
+pending_votes = OrderedDict()
+#slot -> proposal_id decidido (LRU limitado)
+decided_slots = OrderedDict()
+#acceptor_id -> posição do bit desse acceptor
+acceptor_bits = {}
+votes_lock = threading.Lock()
+
+VOTE_ENTRIES = Gauge('paxos_learner_vote_entries', 'Slots com votação em aberto no Learner')
+VOTE_ENTRIES.set_function(lambda: len(pending_votes))
+VOTE_MEMORY = Gauge('paxos_learner_vote_memory_bytes', 'Memória aproximada da tabela de votos (sem os valores)')
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+#do primeiro voto de um ballot até o quorum (mostra acceptors lentos para notificar)
+DECISION_SECONDS = Histogram('paxos_learner_decision_seconds', 'Tempo entre o primeiro voto e o quorum de um slot', buckets=LATENCY_BUCKETS)
+#envio de um lote de resultados para um cliente
+CLIENT_NOTIFY_SECONDS = Histogram('paxos_client_notify_seconds', 'Tempo de envio de um lote de resultados ao Cliente', buckets=LATENCY_BUCKETS)
+VOTES_EVICTED = Counter('paxos_learner_votes_evicted_total', 'Registros de voto descartados', ['reason'])
+
+#ordem total dos ballots: prefixo numérico e, no empate, o id do proposer
+ballot_key = paxos.ballot_key
 
-#precisa de pelo menos 2 votos iguais 
-QUORUM = 2  
+def acceptor_bit(acceptor_id):
+    bit = acceptor_bits.get(acceptor_id)
+    if bit is None:
+        bit = 1 << len(acceptor_bits)
+        acceptor_bits[acceptor_id] = bit
+    return bit
+
+def vote_table_memory():
+    """Estimativa em bytes: os dicionários + um VoteRecord por slot em aberto."""
+    record_size = sys.getsizeof(pending_votes[next(iter(pending_votes))]) if pending_votes else 0
+    return (sys.getsizeof(pending_votes) + sys.getsizeof(decided_slots)
+            + len(pending_votes) * record_size)
+
+def evict_votes(now):
+    """Tira da tabela os slots mais antigos que o TTL ou além do limite de tamanho."""
+    while pending_votes:
+        record = next(iter(pending_votes.values()))
+        if now - record.created > VOTE_TTL:
+            pending_votes.popitem(last=False)
+            VOTES_EVICTED.labels("ttl").inc()
+        elif len(pending_votes) > MAX_PENDING_VOTES:
+            pending_votes.popitem(last=False)
+            VOTES_EVICTED.labels("size").inc()
+        else:
+            break
+    while len(decided_slots) > MAX_DECIDED_SLOTS:
+        decided_slots.popitem(last=False)
+
+def record_vote(slot, proposal_id, acceptor_id, accepted, transaction):
+    """Conta um voto. Devolve (resultado, registro) onde resultado é "committed",
+    "rejected" quando o quorum acabou de ser atingido, ou None."""
+    if slot in decided_slots or slot <= state_machine.applied_index:
+        #já decidido (ou já aplicado e talvez fora do LRU)
+        return None, None
+    record = pending_votes.get(slot)
+    ballot = ballot_key(proposal_id)
+    if record is None or ballot > record.ballot:
+        if record is not None:
+            VOTES_EVICTED.labels("superseded").inc()
+        #ballot maior substitui o registro do slot
+        record = VoteRecord(proposal_id, transaction, time.monotonic())
+        pending_votes[slot] = record
+        pending_votes.move_to_end(slot)
+    elif ballot < record.ballot:
+        #voto de um ballot já superado
+        return None, None
+    elif transaction != record.transaction:
+        #mesmo ballot com outro valor: um ballot propõe um valor só, então não soma no quorum
+        logger.warning("Slot %d: vote from %s for %s carries a different value, ignored",
+                       slot, acceptor_id, proposal_id)
+        return None, None
+
+    outcome = record.vote(acceptor_bit(acceptor_id), accepted, Q2, len(ACCEPTORS))
+    if outcome == "committed":
+        #slot decidido: não precisa mais dos votos
+        del pending_votes[slot]
+        decided_slots[slot] = proposal_id
+        VOTES_EVICTED.labels("decided").inc()
+        DECISION_SECONDS.observe(time.monotonic() - record.created)
+
+    evict_votes(time.monotonic())
+    VOTE_MEMORY.set(vote_table_memory())
+    return outcome, record
 
 #esse endpoint é chamado pelo Acceptors 
 #é aqui que o Learner recebe os votos
+#o corpo pode ser um voto só ou um lote {"votes": [voto, ...]} (acceptor agrupa as notificações)
 @app.post("/learn")
 def learn():
-    data = request.get_json()
+    return jsonify(learn_votes(request.get_json())), 200
+
+def learn_votes(data):
+    """Um voto ou um lote {"votes": [...]} vindo de um acceptor."""
+    votes = data.get("votes") if isinstance(data.get("votes"), list) else [data]
+
+    statuses = [process_vote(vote) for vote in votes]
+    if len(votes) == 1:
+        return {"status": statuses[0]}
+    return {"statuses": statuses}
+
+def process_vote(data):
+    """Conta um voto e avisa os clientes se o slot foi decidido. Devolve o status do slot."""
     proposal_id = data.get("proposal_id")
     accepted = data.get("accepted")
     transaction = data.get("transaction")
+    slot = data.get("slot", 0)
+    trace_id = data.get("trace_id")
 
-    #busca registro dessa proposta
-    entry = proposal_votes[proposal_id]
-    entry["transaction"] = transaction
-
-    #conta os votos
-    if accepted:
-        entry["yes"] += 1
-    else:
-        entry["no"] += 1
+    #conta o voto (no modo líder o mesmo proposal_id é reutilizado em vários slots, então a chave é o slot)
+    with votes_lock:
+        outcome, record = record_vote(slot, proposal_id, data.get("acceptor_id"), accepted, transaction)
+    #o slot existe (alguém aceitou algo nele): o estado local está atrasado até ele ser aplicado
+    state_machine.observe(slot)
 
     #verifica se houve commit
-    if entry["yes"] >= QUORUM and not entry["notified"]: 
-        COMMIT_TOTAL.inc()
-        notify_client(transaction, True, proposal_id)
-        entry["notified"] = True # Marca como notificado!
-        return jsonify({"status": "committed"}), 200
+    if outcome == "committed":
+        state_machine.decide(slot, record.transaction)
+        #o valor pode ser um lote de transações (proposer com batching)
+        transactions = unpack_batch(record.transaction)
+        #um por slot decidido: amostrado para não pesar no caminho quente
+        logger.info("Slot %d decided with %s: %d transaction(s)", slot, proposal_id, len(transactions), trace=trace_id, sample=True)
+        COMMIT_TOTAL.inc(len(transactions))
+        for tx in transactions:
+            notify_client(tx, True, proposal_id)
+        return "committed"
+
+    # ballot rejeitado: não avisa o cliente, o proposer tenta de novo com as mesmas transações
+    # (um REJECTED aqui seguido do COMMITTED da rodada seguinte seria um aviso duplicado)
+    if outcome == "rejected":
+        return "rejected"
+
+    return "pending"
+
+#abre o lote: {"batch": [tx, ...]} vira a lista de transações; valor simples vira lista de um
+#(o no-op que fecha buracos do log não tem transação nenhuma)
+def unpack_batch(value):
+    if isinstance(value, dict) and isinstance(value.get("batch"), list):
+        return value["batch"]
+    if isinstance(value, dict) and value.get("noop"):
+        return []
+    return [value]
+
+# --- MÁQUINA DE ESTADOS (KV) ---
+# Os valores decididos são aplicados em ordem de slot num dicionário chave -> valor. Um slot
+# decidido fora de ordem espera os anteriores. Um buraco que não anda (proposer caiu no meio da
+# instância, votos perdidos) é fechado pedindo a um proposer um no-op naquele slot: o Paxos do
+# proposer adota o valor que já estiver aceito lá, então nada decidido se perde.
+#
+# Transação: {"op": "put" | "delete", "key": ..., "value": ...}. Sem "key" a chave é o client_id,
+# então o WRITE_{client}_{id} do cliente vira o último valor escrito por aquele cliente.
+#
+# Leituras (GET /get):
+#   mode=stale (padrão)  responde com o estado local se ele não está atrasado há mais de
+#                        max_staleness_ms (padrão LEARNER_MAX_STALENESS_MS). O atraso é medido
+#                        em relação aos slots que este learner já viu nos votos; passou do limite,
+#                        a leitura vira linearizável.
+#   mode=linearizable    pega o maior max_slot em N - Q2 + 1 acceptors (read index: toda escrita
+#                        já decidida foi aceita por Q2 deles, que cruzam com os consultados),
+#                        espera o estado local aplicar até ele e só então responde.
+
+#proposers que fecham buracos do log (POST /fill)
+PROPOSERS = load_urls_from_env("LEARNER_PROPOSER_URLS", "http://proposer1:9000,http://proposer2:9000")
+GAP_TIMEOUT = float(os.getenv("LEARNER_GAP_TIMEOUT", "2.0")) # segundos parado num buraco até pedir o no-op
+GAP_FILL_MAX = int(os.getenv("LEARNER_GAP_FILL_MAX", "256")) # slots por pedido de preenchimento
+READ_TIMEOUT = float(os.getenv("LEARNER_READ_TIMEOUT", "2.0")) # espera máxima de uma leitura linearizável
+MAX_STALENESS = float(os.getenv("LEARNER_MAX_STALENESS_MS", "1000")) / 1000.0 # limite padrão do modo stale
+SCAN_LIMIT = int(os.getenv("LEARNER_SCAN_LIMIT", "1000")) # máximo de chaves numa leitura por prefixo
+
+# --- SNAPSHOTS E CATCH-UP ---
+# A cada LEARNER_SNAPSHOT_EVERY slots aplicados o estado é copiado num snapshot: os valores que ele
+# cobre saem da memória e, com o snapshot em disco, os acceptors são avisados para compactar o log
+# até ali (POST /compact). Um learner atrasado (restart, votos perdidos) não reprocessa voto por voto:
+# pega de outro learner o snapshot + os valores seguintes (GET /catchup) e dos acceptors o que eles
+# têm depois disso (GET /log), cada um numa única resposta em streaming.
+DATA_DIR = os.getenv("LEARNER_DATA_DIR", "data") # onde fica o snapshot (vazio = só em memória, sem compactar os acceptors)
+SNAPSHOT_EVERY = int(os.getenv("LEARNER_SNAPSHOT_EVERY", "10000")) # slots aplicados entre snapshots
+COMPACT_ACCEPTORS = os.getenv("LEARNER_COMPACT_ACCEPTORS", "1") == "1"
+LEARNER_ID = os.getenv("HOSTNAME", "learner") # identifica o snapshot deste learner no /compact dos acceptors
+PEERS = load_urls_from_env("LEARNER_PEERS") # URLs base dos outros learners
+CATCHUP_CHUNK = int(os.getenv("LEARNER_CATCHUP_CHUNK", "512")) # linhas por pedaço do /catchup
+CATCHUP_TIMEOUT = float(os.getenv("LEARNER_CATCHUP_TIMEOUT", "30")) # segundos sem dados até desistir da transferência
+GROUP_URLS = groups.load_group_urls("LEARNER_GROUP_URLS") # grupo -> learners dele (leituras de chaves de outros grupos)
+
+# --- STREAM DE COMMITS (GET /subscribe) ---
+# Sistemas que precisam de todo valor decidido assinam o stream em vez de receber um /commit por
+# transação: uma resposta NDJSON em chunks com um {"slot", "value"} por slot aplicado, em ordem e sem
+# buracos (no-ops inclusive), que continua enquanto o assinante estiver conectado. ?from=N retoma do
+# slot N (sem from, começa no próximo slot aplicado).
+# Os slots aplicados recentes ficam numa janela compartilhada por todos os assinantes, cada linha
+# codificada uma vez só; cada assinante só guarda a sua posição. Um assinante lento é segurado pelo
+# TCP e nunca atrasa a aplicação: se a posição dele sair da janela, o stream termina com
+# {"error": "lagged", "next": N} e o retorno de N em diante só vem do /catchup (snapshot + valores).
+SUBSCRIBE_RETAIN = int(os.getenv("LEARNER_SUBSCRIBE_RETAIN", "10000")) # slots aplicados guardados para os assinantes
+SUBSCRIBE_CHUNK = int(os.getenv("LEARNER_SUBSCRIBE_CHUNK", "512")) # linhas por pedaço da resposta
+SUBSCRIBE_HEARTBEAT = float(os.getenv("LEARNER_SUBSCRIBE_HEARTBEAT", "5")) # segundos parado até mandar {"heartbeat": ...}
+SUBSCRIBERS_MAX = int(os.getenv("LEARNER_SUBSCRIBERS_MAX", "256"))
+
+# --- EXATAMENTE UMA VEZ ---
+# A mesma transação pode ser decidida em dois slots (retry para outro proposer, nova proposta depois de
+# um 410). A máquina de estados guarda, por (client_id, session), o maior request_id aplicado e os
+# aplicados numa janela abaixo dele: uma cópia repetida (ou mais antiga que a janela) não é aplicada de
+# novo, senão um put antigo sobrescreveria uma escrita mais nova do mesmo cliente. Vai junto no snapshot.
+APPLY_DEDUP_WINDOW = int(os.getenv("LEARNER_APPLY_DEDUP_WINDOW", "1024")) # request_ids lembrados abaixo do maior
+APPLY_DEDUP_CLIENTS = int(os.getenv("LEARNER_APPLY_DEDUP_CLIENTS", "100000")) # sessões lembradas (as mais antigas saem)
+
+READ_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+APPLIED_INDEX = Gauge('paxos_learner_applied_index', 'Último slot aplicado na máquina de estados')
+KNOWN_INDEX = Gauge('paxos_learner_known_index', 'Maior slot visto nos votos ou no read index')
+READS_TOTAL = Counter('paxos_learner_reads_total', 'Leituras servidas pelo /get', ['mode'])
+READ_SECONDS = Histogram('paxos_learner_read_seconds', 'Tempo de uma leitura no /get', ['mode'], buckets=READ_BUCKETS)
+STALE_FALLBACKS = Counter('paxos_learner_stale_read_fallbacks_total', 'Leituras stale que viraram linearizáveis por atraso')
+READ_INDEX_ROUNDS = Counter('paxos_learner_read_index_rounds_total', 'Consultas de read index feitas aos acceptors')
+READS_ROUTED = Counter('paxos_learner_reads_routed_total', 'Leituras encaminhadas a learners de outro grupo', ['group'])
+READ_FAILURES = Counter('paxos_learner_read_failures_total', 'Leituras linearizáveis que falharam', ['reason'])
+SNAPSHOT_INDEX = Gauge('paxos_learner_snapshot_index', 'Último slot coberto pelo snapshot')
+SNAPSHOTS_WRITTEN = Counter('paxos_learner_snapshots_total', 'Snapshots gravados em disco')
+SNAPSHOT_SECONDS = Histogram('paxos_learner_snapshot_seconds', 'Tempo para gravar um snapshot', buckets=LATENCY_BUCKETS)
+CATCHUP_ENTRIES = Counter('paxos_learner_catchup_entries_total', 'Slots recuperados por catch-up em bloco', ['source'])
+CATCHUP_SECONDS = Histogram('paxos_learner_catchup_seconds', 'Duração de um catch-up', buckets=LATENCY_BUCKETS)
+SUBSCRIBERS = Gauge('paxos_learner_subscribers', 'Assinantes conectados ao /subscribe')
+SUBSCRIBE_SLOTS_SENT = Counter('paxos_learner_subscribe_slots_sent_total', 'Slots enviados aos assinantes do /subscribe')
+SUBSCRIBERS_DROPPED = Counter('paxos_learner_subscribers_dropped_total', 'Assinantes desconectados ou recusados', ['reason'])
+APPLY_DUPLICATES = Counter('paxos_learner_apply_duplicates_total', 'Transações decididas de novo que não foram reaplicadas')
+GAP_FILL_REQUESTS = Counter('paxos_learner_gap_fill_slots_total', 'Slots pedidos aos proposers para fechar buracos do log')
+
+class KVStateMachine:
+    """Estado replicado: aplica os slots decididos em ordem e guarda chave -> (valor, slot)."""
+
+    def __init__(self):
+        self.data = {} # chave -> (valor, slot que escreveu)
+        self.keys = [] # chaves em ordem (índice para as leituras por prefixo)
+        self.decided = {} # slot decidido -> valor, esperando os slots anteriores
+        self.applied_index = -1 # tudo até este slot já está em data
+        self.known_index = -1 # maior slot que sabemos existir
+        now = time.monotonic()
+        self.caught_up_at = now # última vez em que applied_index alcançou known_index
+        self.progress_at = now # última vez em que applied_index andou
+        self.fill_at = 0.0 # último pedido de no-op
+        self.snapshot_index = -1 # último slot coberto pelo snapshot
+        self.snapshot_data = {} # cópia de data no snapshot (nunca mais alterada; vai inteira no /catchup)
+        self.clients = OrderedDict() # (client_id, session) -> [maior request_id aplicado, aplicados na janela]
+        self.snapshot_clients = [] # clients no snapshot: [client_id, session, maior, aplicados]
+        self.tail = [] # valores aplicados depois do snapshot: tail[i] é o slot snapshot_index + 1 + i
+        self.stream = [] # janela do /subscribe: stream[i] = [valor, linha NDJSON ou None] do slot stream_first + i
+        self.stream_first = 0
+        self.stream_waiters = set() # callbacks de assinantes async esperando o próximo slot
+        self.cond = threading.Condition()
+
+    def observe(self, slot):
+        if slot <= self.known_index:
+            return
+        with self.cond:
+            self._observe(slot)
+
+    def _observe(self, slot):
+        if slot > self.known_index:
+            if self.applied_index >= self.known_index:
+                #estava em dia até agora
+                self.caught_up_at = time.monotonic()
+            self.known_index = slot
+            KNOWN_INDEX.set(slot)
+
+    def decide(self, slot, value):
+        with self.cond:
+            if slot <= self.applied_index:
+                return
+            self.decided[slot] = value
+            self._observe(slot)
+            self._advance(self.applied_index)
+
+    def _advance(self, start):
+        """Aplica os slots decididos que já estão em sequência; `start` é o applied_index de antes."""
+        while self.applied_index + 1 in self.decided:
+            self.applied_index += 1
+            value = self.decided.pop(self.applied_index)
+            self.apply(self.applied_index, value)
+            self.tail.append(value)
+            self.stream.append([value, None])
+        if len(self.stream) > 2 * SUBSCRIBE_RETAIN:
+            # corta em bloco (não a cada slot)
+            dropped = len(self.stream) - SUBSCRIBE_RETAIN
+            del self.stream[:dropped]
+            self.stream_first += dropped
+        if self.applied_index > start:
+            now = time.monotonic()
+            self.progress_at = now
+            if self.applied_index >= self.known_index:
+                self.caught_up_at = now
+            APPLIED_INDEX.set(self.applied_index)
+            if self.applied_index - self.snapshot_index >= SNAPSHOT_EVERY:
+                self._snapshot()
+            self.cond.notify_all()
+            waiters, self.stream_waiters = self.stream_waiters, set()
+            for wake in waiters:
+                wake()
+
+    def _snapshot(self):
+        """Cópia do estado até applied_index; o tail coberto por ela é descartado."""
+        self.snapshot_index = self.applied_index
+        self.snapshot_data = dict(self.data)
+        self.snapshot_clients = [[client_id, session, last, sorted(recent)]
+                                 for (client_id, session), (last, recent) in self.clients.items()]
+        self.tail = []
+        SNAPSHOT_INDEX.set(self.snapshot_index)
+        snapshot_ready.set()
+
+    def install_snapshot(self, index, data, clients=()):
+        """Troca o estado pelo snapshot de outro learner (ou do disco) se ele estiver à frente."""
+        with self.cond:
+            if index <= self.applied_index:
+                return False
+            start = self.applied_index
+            self.data = data
+            self.keys = sorted(data)
+            self.applied_index = index
+            self.snapshot_index = index
+            self.snapshot_data = dict(data)
+            self.clients = OrderedDict(((client_id, session), [last, set(recent)])
+                                       for client_id, session, last, recent in clients)
+            self.snapshot_clients = list(clients)
+            self.tail = []
+            # os slots até o snapshot não passaram por aqui: assinantes antes dele ficam para trás
+            self.stream = []
+            self.stream_first = index + 1
+            for slot in [slot for slot in self.decided if slot <= index]:
+                del self.decided[slot]
+            SNAPSHOT_INDEX.set(index)
+            self._observe(index)
+            self._advance(start)
+            return True
+
+    def export(self, since):
+        """O que um learner que parou em `since` - 1 precisa: (snapshot_index, snapshot ou None, clients
+        do snapshot, primeiro slot dos valores, valores aplicados a partir dele)."""
+        with self.cond:
+            snapshot = self.snapshot_data if since <= self.snapshot_index else None
+            first = max(since, self.snapshot_index + 1)
+            return (self.snapshot_index, snapshot, self.snapshot_clients, first,
+                    self.tail[first - self.snapshot_index - 1:])
+
+    def read_stream(self, cursor, limit):
+        """Linhas NDJSON dos slots aplicados a partir de `cursor` (no máximo `limit`); None se `cursor`
+        já saiu da janela. Cada linha é codificada uma vez só, fora do lock, e serve a todos os assinantes."""
+        with self.cond:
+            if cursor < self.stream_first:
+                return None
+            start = cursor - self.stream_first
+            entries = self.stream[start:start + limit]
+        lines = []
+        for offset, entry in enumerate(entries):
+            if entry[1] is None:
+                entry[1] = json.dumps({"slot": cursor + offset, "value": entry[0]}, separators=(",", ":")).encode()
+            lines.append(entry[1])
+        return lines
+
+    def wait_stream(self, cursor, wake):
+        """Registra `wake` para quando o slot `cursor` for aplicado; False se ele já foi."""
+        with self.cond:
+            if self.applied_index >= cursor:
+                return False
+            self.stream_waiters.add(wake)
+            return True
+
+    def first_apply(self, tx):
+        """True se a transação ainda não foi aplicada (e a registra); False para uma cópia repetida."""
+        client_id, request_id = tx.get("client_id"), tx.get("request_id")
+        if client_id is None or not isinstance(request_id, int):
+            return True
+        key = (client_id, tx.get("session"))
+        entry = self.clients.get(key)
+        if entry is None:
+            self.clients[key] = [request_id, {request_id}]
+            if len(self.clients) > APPLY_DEDUP_CLIENTS:
+                self.clients.popitem(last=False)
+            return True
+        self.clients.move_to_end(key)
+        last, recent = entry
+        if request_id in recent or request_id <= last - APPLY_DEDUP_WINDOW:
+            APPLY_DUPLICATES.inc()
+            return False
+        recent.add(request_id)
+        if request_id > last:
+            entry[0] = request_id
+            if len(recent) > 2 * APPLY_DEDUP_WINDOW:
+                entry[1] = {r for r in recent if r > request_id - APPLY_DEDUP_WINDOW}
+        return True
+
+    def apply(self, slot, value):
+        for tx in unpack_batch(value):
+            if not isinstance(tx, dict) or not self.first_apply(tx):
+                continue
+            key = tx.get("key", tx.get("client_id"))
+            if key is None:
+                continue
+            key = str(key)
+            if tx.get("op") == "delete":
+                if self.data.pop(key, None) is not None:
+                    del self.keys[bisect.bisect_left(self.keys, key)]
+                continue
+            if key not in self.data:
+                bisect.insort(self.keys, key)
+            self.data[key] = (tx.get("value"), slot)
+
+    def staleness(self):
+        """Há quanto tempo o estado local está atrás do maior slot conhecido (0 se em dia)."""
+        if self.applied_index >= self.known_index:
+            return 0.0
+        return time.monotonic() - self.caught_up_at
+
+    def wait_applied(self, index, timeout):
+        with self.cond:
+            return self.cond.wait_for(lambda: self.applied_index >= index, timeout)
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def scan(self, prefix, limit):
+        with self.cond:
+            start = bisect.bisect_left(self.keys, prefix)
+            items = []
+            for key in self.keys[start:start + limit]:
+                if not key.startswith(prefix):
+                    break
+                value, slot = self.data[key]
+                items.append({"key": key, "value": value, "slot": slot})
+            return items
+
+    def stuck(self, timeout):
+        """A aplicação está parada num buraco há mais de timeout (e não pedimos nada há timeout)."""
+        now = time.monotonic()
+        with self.cond:
+            if (self.applied_index >= self.known_index or now - self.progress_at < timeout
+                    or now - self.fill_at < timeout):
+                return False
+            self.fill_at = now
+            return True
+
+    def missing_slots(self):
+        """Slots sem decisão entre o último aplicado e o maior conhecido (até GAP_FILL_MAX)."""
+        with self.cond:
+            missing = []
+            slot = self.applied_index + 1
+            while slot <= self.known_index and len(missing) < GAP_FILL_MAX:
+                if slot not in self.decided:
+                    missing.append(slot)
+                slot += 1
+            return missing
+
+snapshot_ready = threading.Event() # acorda a thread que grava o snapshot e compacta os acceptors
+state_machine = KVStateMachine()
+KV_KEYS = Gauge('paxos_learner_kv_keys', 'Chaves na máquina de estados')
+KV_KEYS.set_function(lambda: len(state_machine.data))
+
+# Conexões com acceptors e proposers (keep-alive, compartilhadas pelas threads)
+http_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=max(1, len(ACCEPTORS) + len(PROPOSERS)), pool_maxsize=32)
+http_session.mount("http://", _adapter)
+http_session.mount("https://", _adapter)
+read_pool = ThreadPoolExecutor(max_workers=max(4, 2 * len(ACCEPTORS)), thread_name_prefix="read-index")
+#leituras por prefixo em todos os grupos (pool separado: o learner consultado pode ser este mesmo,
+#e a leitura dele usa o read_pool)
+route_pool = ThreadPoolExecutor(max_workers=max(4, 2 * groups.COUNT), thread_name_prefix="group-read")
+
+def fetch_max_slot(url):
+    return http_session.get(f"{url}/status", timeout=READ_TIMEOUT).json()["max_slot"]
+
+def query_read_index():
+    """Maior max_slot entre os primeiros READ_QUORUM acceptors que responderem (None sem quorum)."""
+    READ_INDEX_ROUNDS.inc()
+    futures = [read_pool.submit(fetch_max_slot, url) for url in ACCEPTORS]
+    slots = []
+    try:
+        for future in as_completed(futures, timeout=READ_TIMEOUT):
+            try:
+                slots.append(int(future.result()))
+            except Exception:
+                continue
+            if len(slots) >= READ_QUORUM:
+                return max(slots)
+    except FuturesTimeout:
+        pass
+    return None
+
+class ReadIndex:
+    """Junta as leituras linearizáveis concorrentes numa consulta só aos acceptors.
+
+    Uma consulta só serve para quem chegou antes de ela começar: quem chega com uma consulta em
+    andamento espera a próxima, que sai assim que aquela termina e atende todos que esperavam."""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.started = 0 # consultas iniciadas
+        self.finished = 0 # consultas terminadas
+        self.result = None # read index da última consulta (None se não teve quorum)
+
+    def get(self):
+        with self.cond:
+            target = self.started + 1
+            while self.finished < target:
+                if self.started == self.finished:
+                    #ninguém consultando: esta thread faz a consulta da vez
+                    self.started = target
+                    break
+                self.cond.wait()
+            else:
+                return self.result
+        result = None
+        try:
+            result = query_read_index()
+        finally:
+            with self.cond:
+                self.finished = target
+                self.result = result
+                self.cond.notify_all()
+        return result
+
+read_index = ReadIndex()
+
+def read_mode(args):
+    """Modo efetivo da leitura: stale vira linearizable quando o estado local está atrasado demais."""
+    mode = args.get("mode", "stale")
+    if mode != "stale":
+        return mode
+    bound = float(args["max_staleness_ms"]) / 1000.0 if args.get("max_staleness_ms") else MAX_STALENESS
+    if state_machine.staleness() > bound:
+        STALE_FALLBACKS.inc()
+        return "linearizable"
+    return "stale"
+
+def confirm_read():
+    """Leitura linearizável: espera o estado local chegar ao read index. Devolve um erro ou None."""
+    index = read_index.get()
+    if index is None:
+        READ_FAILURES.labels("no_quorum").inc()
+        return {"error": "no acceptor quorum for read index"}, 503
+    #slots até o read index podem ainda não ter votos aqui: conta como atraso (e buraco, se não andar)
+    state_machine.observe(index)
+    if not state_machine.wait_applied(index, READ_TIMEOUT):
+        READ_FAILURES.labels("timeout").inc()
+        return {"error": "learner behind read index", "read_index": index,
+                "applied_index": state_machine.applied_index}, 503
+    return None
+
+def local_read(args, mode):
+    """Responde a leitura com o estado local: uma chave (key=) ou um intervalo por prefixo (prefix=)."""
+    READS_TOTAL.labels(mode).inc()
+    body = {"mode": mode, "applied_index": state_machine.applied_index,
+            "staleness_ms": round(state_machine.staleness() * 1000.0, 3)}
+    key = args.get("key")
+    if key is None:
+        limit = min(int(args.get("limit") or SCAN_LIMIT), SCAN_LIMIT)
+        body["items"] = state_machine.scan(args.get("prefix", ""), limit)
+        return body, 200
+    entry = state_machine.get(key)
+    body["key"] = key
+    if entry is None:
+        body["found"] = False
+        return body, 404
+    body.update(found=True, value=entry[0], slot=entry[1])
+    return body, 200
 
-    # 2. Faz o mesmo para rejeição
-    if entry["no"] >= QUORUM and not entry["notified"]:
-        notify_client(transaction, False, proposal_id)
-        entry["notified"] = True # Marca como notificado!
-        return jsonify({"status": "rejected"}), 200
+def bad_read(args):
+    if args.get("key") is None and args.get("prefix") is None:
+        return {"error": "missing key or prefix"}, 400
+    if args.get("mode", "stale") not in ("stale", "linearizable"):
+        return {"error": "mode must be stale or linearizable"}, 400
+    return None
 
-    return jsonify({"status": "pending"}), 200
+def routed_read(args):
+    """Leitura que não é só deste grupo: a chave de outro grupo vai para um learner dele e a leitura
+    por prefixo junta as chaves de todos os grupos. Devolve (corpo, status), ou None se é local."""
+    key = args.get("key")
+    if key is not None:
+        group = groups.group_of(key)
+        return None if group == groups.GROUP else read_from_group(group, args)
+    #prefixo: cada grupo tem uma parte das chaves, então todos respondem (este também, pelo mesmo caminho)
+    futures = [route_pool.submit(read_from_group, group, args) for group in range(groups.COUNT)]
+    limit = min(int(args.get("limit") or SCAN_LIMIT), SCAN_LIMIT)
+    items = []
+    parts = []
+    for group, future in enumerate(futures):
+        body, status = future.result()
+        if status != 200:
+            return body, status
+        items.extend(body["items"])
+        parts.append({"group": group, "applied_index": body["applied_index"], "staleness_ms": body["staleness_ms"]})
+    items.sort(key=lambda item: item["key"])
+    return {"mode": args.get("mode", "stale"), "groups": parts, "items": items[:limit]}, 200
+
+def read_from_group(group, args):
+    """GET /get num learner do grupo (marcado como roteado, para ele responder só com o estado dele)."""
+    urls = list(GROUP_URLS.get(group, []))
+    random.shuffle(urls)
+    for url in urls:
+        try:
+            r = http_session.get(f"{url}/get", params=dict(args), headers={groups.ROUTED_HEADER: str(group)},
+                                 timeout=READ_TIMEOUT + 2)
+            body = r.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("Learner %s of group %d unreachable: %s", url, group, e)
+            continue
+        READS_ROUTED.labels(str(group)).inc()
+        body["group"] = group
+        return body, r.status_code
+    READ_FAILURES.labels("group_unavailable").inc()
+    return {"error": "no learner of the key's group available", "group": group}, 503
+
+def gap_fill_loop():
+    """Destrava a aplicação parada há mais de GAP_TIMEOUT: catch-up e, se não bastar, no-op."""
+    while True:
+        time.sleep(GAP_TIMEOUT / 2)
+        if not state_machine.stuck(GAP_TIMEOUT):
+            continue
+        # primeiro traz em bloco o que os outros learners e os acceptors já têm;
+        # só o que continuar faltando vira no-op
+        catch_up()
+        slots = state_machine.missing_slots()
+        if not slots or not PROPOSERS:
+            continue
+        GAP_FILL_REQUESTS.inc(len(slots))
+        logger.warning("Apply stuck at slot %d for %.1fs. Asking a proposer to fill %d slot(s).",
+                       slots[0], time.monotonic() - state_machine.progress_at, len(slots))
+        for url in random.sample(PROPOSERS, len(PROPOSERS)):
+            try:
+                http_session.post(f"{url}/fill", json={"slots": slots}, timeout=2)
+                break
+            except requests.RequestException as e:
+                logger.warning("Proposer %s unreachable for gap fill: %s", url, e)
+
+def snapshot_path():
+    return os.path.join(DATA_DIR, "snapshot.json")
+
+def write_snapshot(index, data, clients):
+    os.makedirs(DATA_DIR, exist_ok=True)
+    tmp_path = snapshot_path() + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"index": index, "data": data, "clients": clients}, f, separators=(",", ":"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, snapshot_path())
+
+def load_snapshot():
+    """Restart: volta do snapshot em disco (o resto vem do catch-up)."""
+    if not DATA_DIR:
+        return
+    os.makedirs(DATA_DIR, exist_ok=True)
+    if not os.path.exists(snapshot_path()):
+        return
+    with open(snapshot_path()) as f:
+        snapshot = json.load(f)
+    data = {key: tuple(entry) for key, entry in snapshot["data"].items()}
+    state_machine.install_snapshot(snapshot["index"], data, snapshot.get("clients", []))
+    logger.info("Loaded snapshot at slot %d (%d keys)", snapshot["index"], len(data))
+
+def prune_votes(index):
+    """Tira das tabelas de votos tudo que o snapshot já cobre."""
+    with votes_lock:
+        for slot in [slot for slot in pending_votes if slot <= index]:
+            del pending_votes[slot]
+        for slot in [slot for slot in decided_slots if slot <= index]:
+            del decided_slots[slot]
+        VOTE_MEMORY.set(vote_table_memory())
+
+def compact_acceptors(index):
+    """Avisa os acceptors do snapshot até `index`. Cada acceptor só compacta até o menor snapshot
+    entre todos os learners (409 enquanto algum ainda não chegou lá)."""
+    for url in ACCEPTORS:
+        try:
+            r = http_session.post(f"{url}/compact", json={"upto": index, "learner": LEARNER_ID}, timeout=10)
+            if r.status_code == 409:
+                logger.debug("Acceptor %s compacted only up to %s: %s", url, r.json().get("truncated_upto"),
+                             r.json().get("acknowledged"))
+        except (requests.RequestException, ValueError) as e:
+            logger.warning("Could not compact acceptor %s: %s", url, e)
+
+def snapshot_loop():
+    """Grava cada snapshot novo e manda os acceptors compactarem até ele."""
+    while True:
+        snapshot_ready.wait()
+        snapshot_ready.clear()
+        with state_machine.cond:
+            index, data, clients = state_machine.snapshot_index, state_machine.snapshot_data, state_machine.snapshot_clients
+        prune_votes(index)
+        if not DATA_DIR:
+            # sem disco, o snapshot some num restart: os acceptors ficam com o log inteiro
+            continue
+        with SNAPSHOT_SECONDS.time():
+            write_snapshot(index, data, clients)
+        SNAPSHOTS_WRITTEN.inc()
+        logger.info("Snapshot at slot %d written (%d keys)", index, len(data))
+        if COMPACT_ACCEPTORS:
+            compact_acceptors(index)
+
+def check_quorum():
+    """Confere se os proposers usam os mesmos quorums (com Q2 diferente o learner decide errado) e se
+    proposers e acceptors são do grupo deste learner (senão ele misturaria o log de dois grupos)."""
+    ours = quorum.describe(len(ACCEPTORS), Q1, Q2)
+    for url in PROPOSERS:
+        try:
+            stats = http_session.get(f"{url}/stats", timeout=2).json()
+        except (requests.RequestException, ValueError):
+            continue
+        theirs = stats.get("quorum")
+        if theirs and theirs != ours:
+            logger.error("Quorum mismatch with proposer %s: %s here, %s there", url, ours, theirs)
+        if stats.get("group", 0) != groups.GROUP:
+            logger.error("Proposer %s serves group %s, this learner group %d", url, stats.get("group"), groups.GROUP)
+    for url in ACCEPTORS:
+        try:
+            group = http_session.get(f"{url}/status", timeout=2).json().get("group", 0)
+        except (requests.RequestException, ValueError):
+            continue
+        if group != groups.GROUP:
+            logger.error("Acceptor %s serves group %s, this learner group %d", url, group, groups.GROUP)
+
+catchup_lock = threading.Lock()
+
+def catch_up():
+    """Traz o estado local até onde os outros learners e os acceptors já chegaram."""
+    if not catchup_lock.acquire(blocking=False):
+        return # já tem um catch-up em andamento
+    try:
+        started = time.monotonic()
+        before = state_machine.applied_index
+        peer = most_advanced_peer()
+        if peer:
+            catch_up_from_learner(peer)
+        catch_up_from_acceptors()
+        CATCHUP_SECONDS.observe(time.monotonic() - started)
+        if state_machine.applied_index > before:
+            logger.info("Caught up from slot %d to %d in %.2fs", before, state_machine.applied_index,
+                        time.monotonic() - started)
+    finally:
+        catchup_lock.release()
+
+def most_advanced_peer():
+    best, best_index = None, state_machine.applied_index
+    for url in PEERS:
+        try:
+            index = http_session.get(f"{url}/status", timeout=2).json()["applied_index"]
+        except (requests.RequestException, ValueError, KeyError):
+            continue
+        if index > best_index:
+            best, best_index = url, index
+    return best
+
+def catch_up_from_learner(url):
+    """Uma resposta só: o snapshot do outro learner (se ele cobre o que falta) e os valores seguintes."""
+    since = state_machine.applied_index + 1
+    snapshot_index, snapshot, clients = None, None, []
+    entries = 0
+    try:
+        with http_session.get(f"{url}/catchup", params={"from": since}, stream=True, timeout=CATCHUP_TIMEOUT) as r:
+            r.raise_for_status()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                item = json.loads(line)
+                if isinstance(item, list):
+                    snapshot[item[0]] = (item[1], item[2])
+                elif "snapshot" in item:
+                    snapshot_index, snapshot, clients = item["snapshot"], {}, item.get("clients", [])
+                elif "slot" in item:
+                    if snapshot is not None:
+                        state_machine.install_snapshot(snapshot_index, snapshot, clients)
+                        snapshot = None
+                    state_machine.decide(item["slot"], item["value"])
+                    entries += 1
+                elif "end" in item and snapshot is not None:
+                    # snapshot completo (uma transferência cortada no meio não é instalada)
+                    state_machine.install_snapshot(snapshot_index, snapshot, clients)
+                    snapshot = None
+    except (requests.RequestException, ValueError) as e:
+        logger.warning("Catch-up from learner %s failed: %s", url, e)
+    if snapshot_index is not None:
+        CATCHUP_ENTRIES.labels("snapshot").inc(max(0, snapshot_index - since + 1))
+    CATCHUP_ENTRIES.labels("learner").inc(entries)
+
+def catch_up_from_acceptors():
+    """Lê o log de todos os acceptors em paralelo e conta as entradas como votos."""
+    since = state_machine.applied_index + 1
+    threads = [threading.Thread(target=catch_up_from_acceptor, args=(url, since), daemon=True) for url in ACCEPTORS]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def catch_up_from_acceptor(url, since):
+    decided = 0
+    try:
+        with http_session.get(f"{url}/log", params={"from": since}, stream=True, timeout=CATCHUP_TIMEOUT) as r:
+            r.raise_for_status()
+            lines = r.iter_lines()
+            header = json.loads(next(lines))
+            if header["truncated_upto"] > state_machine.applied_index:
+                logger.warning("Acceptor %s compacted up to slot %d; slots before it only come from a learner snapshot",
+                               url, header["truncated_upto"])
+            state_machine.observe(header["max_slot"])
+            #o id do acceptor tem que ser o mesmo dos votos, senão o mesmo acceptor contaria duas vezes
+            acceptor_id = header["acceptor_id"]
+            for line in lines:
+                if not line:
+                    continue
+                entry = json.loads(line)
+                with votes_lock:
+                    outcome, record = record_vote(entry["slot"], entry["id"], acceptor_id, True, entry["value"])
+                if outcome == "committed":
+                    state_machine.decide(entry["slot"], record.transaction)
+                    decided += 1
+    except (requests.RequestException, ValueError, StopIteration, KeyError) as e:
+        logger.warning("Catch-up from acceptor %s failed: %s", url, e)
+    CATCHUP_ENTRIES.labels("acceptor").inc(decided)
+
+def catchup_lines(index, snapshot, clients, first, values):
+    """NDJSON do /catchup: cabeçalho do snapshot (com os request_ids aplicados por cliente), [chave, valor,
+    slot] por chave, um valor por slot e o fim."""
+    lines = []
+    if snapshot is not None:
+        lines.append(json.dumps({"snapshot": index, "keys": len(snapshot), "clients": clients}))
+        for key, (value, slot) in snapshot.items():
+            lines.append(json.dumps([key, value, slot], separators=(",", ":")))
+            if len(lines) >= CATCHUP_CHUNK:
+                yield ("\n".join(lines) + "\n").encode()
+                lines = []
+    for offset, value in enumerate(values):
+        lines.append(json.dumps({"slot": first + offset, "value": value}, separators=(",", ":")))
+        if len(lines) >= CATCHUP_CHUNK:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    lines.append(json.dumps({"end": max(index, first + len(values) - 1)}))
+    yield ("\n".join(lines) + "\n").encode()
+
+subscribers_lock = threading.Lock()
+active_subscribers = 0
+
+def open_subscription(args):
+    """(posição inicial, release, None) de um /subscribe, ou (None, None, (corpo, status)) se não dá
+    para atender. A vaga é reservada aqui, junto com a conferência do limite; `release` a devolve e
+    pode ser chamada mais de uma vez (fim do stream e fechamento da resposta)."""
+    release = subscriber_joined()
+    if release is None:
+        SUBSCRIBERS_DROPPED.labels("limit").inc()
+        return None, None, ({"error": "too many subscribers", "max": SUBSCRIBERS_MAX}, 503)
+    try:
+        cursor, error = subscription_start(args)
+    except Exception:
+        release()
+        raise
+    if error:
+        release()
+        return None, None, error
+    return cursor, release, None
+
+def subscription_start(args):
+    """(posição inicial, None), ou (None, (corpo, status)) se o `from` não serve."""
+    with state_machine.cond:
+        applied, first, snapshot_index = state_machine.applied_index, state_machine.stream_first, state_machine.snapshot_index
+    if args.get("from") is None:
+        return applied + 1, None
+    try:
+        cursor = int(args["from"])
+    except ValueError:
+        return None, ({"error": "from must be a slot number"}, 400)
+    if cursor < 0:
+        return None, ({"error": "from must be a slot number"}, 400)
+    if cursor < first:
+        # fora da janela: o assinante recomeça pelo /catchup?from=N (snapshot + valores)
+        return None, ({"error": "position no longer retained", "first_available": first,
+                       "snapshot_index": snapshot_index}, 410)
+    return cursor, None
+
+def subscriber_joined():
+    """Reserva uma vaga de assinante: devolve a função que a libera, ou None se o limite foi atingido."""
+    global active_subscribers
+    with subscribers_lock:
+        if active_subscribers >= SUBSCRIBERS_MAX:
+            return None
+        active_subscribers += 1
+    SUBSCRIBERS.inc()
+    released = []
+
+    def subscriber_left():
+        global active_subscribers
+        with subscribers_lock:
+            if released:
+                return
+            released.append(True)
+            active_subscribers -= 1
+        SUBSCRIBERS.dec()
+    return subscriber_left
+
+def lagged_line(cursor):
+    SUBSCRIBERS_DROPPED.labels("lagged").inc()
+    logger.warning("Subscriber at slot %d fell out of the retained window; disconnecting", cursor)
+    return json.dumps({"error": "lagged", "next": cursor, "first_available": state_machine.stream_first}).encode() + b"\n"
+
+def heartbeat_line():
+    return json.dumps({"heartbeat": state_machine.applied_index}).encode() + b"\n"
+
+def subscription_lines(cursor, release):
+    """NDJSON do /subscribe: os slots aplicados a partir de `cursor`, em ordem, até o assinante sair."""
+    try:
+        while True:
+            lines = state_machine.read_stream(cursor, SUBSCRIBE_CHUNK)
+            if lines is None:
+                yield lagged_line(cursor)
+                return
+            if lines:
+                cursor += len(lines)
+                SUBSCRIBE_SLOTS_SENT.inc(len(lines))
+                yield b"\n".join(lines) + b"\n"
+            elif not state_machine.wait_applied(cursor, SUBSCRIBE_HEARTBEAT):
+                # parado: o heartbeat mostra que o stream está vivo e detecta assinante que sumiu
+                yield heartbeat_line()
+    finally:
+        release()
+
+async def subscription_lines_async(cursor, release):
+    """O mesmo stream no servidor async: esperar o próximo slot não ocupa uma thread."""
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+
+    def wake():
+        try:
+            loop.call_soon_threadsafe(ready.set)
+        except RuntimeError:
+            pass # loop já fechado
+
+    try:
+        while True:
+            lines = state_machine.read_stream(cursor, SUBSCRIBE_CHUNK)
+            if lines is None:
+                yield lagged_line(cursor)
+                return
+            if lines:
+                cursor += len(lines)
+                SUBSCRIBE_SLOTS_SENT.inc(len(lines))
+                yield b"\n".join(lines) + b"\n"
+                continue
+            ready.clear()
+            if not state_machine.wait_stream(cursor, wake):
+                continue
+            try:
+                await asyncio.wait_for(ready.wait(), SUBSCRIBE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield heartbeat_line()
+    finally:
+        release()
+
+threading.Thread(target=gap_fill_loop, name="gap-fill", daemon=True).start()
+threading.Thread(target=snapshot_loop, name="snapshot", daemon=True).start()
+
+# --- NOTIFICAÇÃO DOS CLIENTES ---
+# O resultado não é mandado dentro do /learn: cada cliente tem uma fila e uma thread que junta
+# os commits pendentes e manda todos numa única requisição, por uma conexão keep-alive.
+CLIENT_NOTIFY_BATCH_MAX = int(os.getenv("LEARNER_CLIENT_BATCH_MAX", "64")) # commits por requisição /commit
+CLIENT_NOTIFIER_IDLE = float(os.getenv("LEARNER_CLIENT_NOTIFIER_IDLE", "30")) # segundos até fechar um notifier parado
+
+client_notifiers = {} # url de callback -> ClientNotifier
+client_notifiers_lock = threading.Lock()
+
+# Cada (client_id, request_id) é avisado uma vez só, mesmo que a transação seja decidida em mais
+# de um slot (retry reproposto por outro proposer, lote devolvido ao líder). Mesma ideia da tabela
+# de deduplicação do proposer: TTL e tamanho máximo.
+NOTIFY_DEDUP_TTL = float(os.getenv("LEARNER_NOTIFY_DEDUP_TTL", "300")) # segundos
+NOTIFY_DEDUP_MAX = int(os.getenv("LEARNER_NOTIFY_DEDUP_MAX", "100000")) # entradas
+notified_requests = OrderedDict() # (client_id, request_id) -> horário do aviso
+notified_lock = threading.Lock()
+NOTIFY_DEDUP_HITS = Counter('paxos_learner_notify_dedup_hits_total', 'Avisos repetidos suprimidos pela deduplicação')
+NOTIFY_DEDUP_MISSES = Counter('paxos_learner_notify_dedup_misses_total', 'Transações avisadas pela primeira vez')
+
+class ClientNotifier:
+    """Fila e thread de envio dos commits de um cliente. A thread termina depois de
+    CLIENT_NOTIFIER_IDLE segundos sem trabalho e é recriada no próximo commit."""
+
+    def __init__(self, url):
+        self.url = url
+        self.queue = queue.Queue()
+        self.session = requests.Session()
+        threading.Thread(target=self.run, name=f"client-{url}", daemon=True).start()
+
+    def run(self):
+        while True:
+            try:
+                payloads = [self.queue.get(timeout=CLIENT_NOTIFIER_IDLE)]
+            except queue.Empty:
+                with client_notifiers_lock:
+                    # só sai se ninguém enfileirou nada enquanto esperava o lock
+                    if self.queue.empty():
+                        del client_notifiers[self.url]
+                        self.session.close()
+                        return
+                continue
+            while len(payloads) < CLIENT_NOTIFY_BATCH_MAX:
+                try:
+                    payloads.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with CLIENT_NOTIFY_SECONDS.time():
+                    self.session.post(self.url, json={"commits": payloads}, timeout=2)
+                NOTIFICATION_SENT.inc(len(payloads))
+                logger.debug("Notified %s of %d result(s)", self.url, len(payloads))
+            except Exception as e:
+                logger.warning("Failed notifying client %s: %s", self.url, e)
+
+def client_callback_url(transaction):
+    """Para onde vai o resultado: reply_to da transação ou o endpoint padrão do cliente."""
+    return transaction.get("reply_to") or f"http://{transaction.get('client_id')}:5000/commit"
+
+def first_notification(client_id, session, request_id):
+    """True só na primeira vez que (client_id, session, request_id) é avisado dentro do TTL."""
+    key = (client_id, session, request_id)
+    now = time.monotonic()
+    with notified_lock:
+        if key in notified_requests:
+            NOTIFY_DEDUP_HITS.inc()
+            return False
+        NOTIFY_DEDUP_MISSES.inc()
+        notified_requests[key] = now
+        while notified_requests and (len(notified_requests) > NOTIFY_DEDUP_MAX
+                                     or now - next(iter(notified_requests.values())) > NOTIFY_DEDUP_TTL):
+            notified_requests.popitem(last=False)
+        return True
 
 #responsavel por fechar o ciclo do Paxos, aqui o cliente vai receber o resultado
+#(só enfileira; o envio é feito pelo ClientNotifier do cliente)
 def notify_client(transaction, committed, proposal_id):
    
     try:
@@ -65,34 +1101,137 @@ def notify_client(transaction, committed, proposal_id):
         request_id = transaction.get("request_id")
         if not client_id or not request_id:
            
-            print(f"[LEARNER] ERROR: Missing client_id or request_id in transaction: {transaction}", flush=True)
+            logger.error("Missing client_id or request_id in transaction: %s", transaction)
             return
     except Exception:
         return
+    session = transaction.get("session")
+    if not first_notification(client_id, session, request_id):
+        return
 
     payload = {
         "request_id": request_id,
+        "session": session,
         "result": "COMMITTED" if committed else "REJECTED",
-        "proposal_id": proposal_id
+        "proposal_id": proposal_id,
+        "trace_id": transaction.get("trace_id")
     }
-    try:
-        NOTIFICATION_SENT.inc()
-        requests.post(f"http://{client_id}:5000/commit", json=payload, timeout=2)
-        print(f"[LEARNER] Notified client {client_id} for request {request_id} -> {payload['result']}", flush=True)
-    except Exception as e:
-        print(f"[LEARNER] Failed notifying client {client_id}: {e}", flush=True)
+    url = client_callback_url(transaction)
+    with client_notifiers_lock:
+        notifier = client_notifiers.get(url)
+        if notifier is None:
+            notifier = client_notifiers[url] = ClientNotifier(url)
+        notifier.queue.put(payload)
 
 @app.get("/")
 def root():
     return "LEARNER OK"
 
+@app.get("/get")
+def get_value():
+    error = bad_read(request.args)
+    if error:
+        return jsonify(error[0]), error[1]
+    if groups.COUNT > 1 and request.headers.get(groups.ROUTED_HEADER) is None:
+        routed = routed_read(request.args)
+        if routed is not None:
+            return jsonify(routed[0]), routed[1]
+    with READ_SECONDS.labels(request.args.get("mode", "stale")).time():
+        mode = read_mode(request.args)
+        if mode == "linearizable":
+            error = confirm_read()
+            if error:
+                return jsonify(error[0]), error[1]
+        body, status = local_read(request.args, mode)
+    return jsonify(body), status
+
+@app.get("/status")
+def status():
+    with state_machine.cond:
+        body = {"applied_index": state_machine.applied_index, "known_index": state_machine.known_index,
+                "snapshot_index": state_machine.snapshot_index, "keys": len(state_machine.data),
+                "subscribers": active_subscribers, "stream_first": state_machine.stream_first, **groups.describe()}
+    return jsonify(body), 200
+
+@app.get("/catchup")
+def catchup():
+    # catch-up em bloco para outro learner: snapshot (se ele parou antes dele) + valores seguintes,
+    # numa resposta NDJSON em streaming
+    since = request.args.get("from", 0, type=int)
+    return Response(catchup_lines(*state_machine.export(since)), mimetype="application/x-ndjson")
+
+@app.get("/subscribe")
+def subscribe():
+    # stream dos valores decididos, em ordem de slot, para sistemas que consomem o log inteiro
+    cursor, release, error = open_subscription(request.args)
+    if error:
+        return jsonify(error[0]), error[1]
+    response = Response(subscription_lines(cursor, release), mimetype="application/x-ndjson")
+    # o generator pode nunca começar (cliente foi embora antes do corpo): o close da resposta libera a vaga
+    response.call_on_close(release)
+    return response
+
+@app.get("/debug/logs")
+def debug_logs():
+    # ring buffer do logger: últimas mensagens, inclusive as de DEBUG que não foram escritas
+    limit = request.args.get("limit", type=int)
+    return jsonify({"logs": logger.dump(limit)})
+
 app_dispatcher = DispatcherMiddleware(app, {
     '/metrics': make_wsgi_app()
 })
 
+# SERVER_MODE=async: /learn roda direto no event loop, o resto vai para o Flask
+server = AsyncServer(app_dispatcher)
+
+@server.route("POST", "/learn")
+async def learn_async(req):
+    return learn_votes(req.json()), 200
+
+@server.route("GET", "/get")
+async def get_async(req):
+    # leitura stale em dia sai direto do loop; a linearizável espera o read index no pool
+    error = bad_read(req.query)
+    if error:
+        return error
+    if groups.COUNT > 1 and groups.ROUTED_HEADER.lower() not in req.headers:
+        routed = await asyncio.get_running_loop().run_in_executor(server.executor, routed_read, req.query)
+        if routed is not None:
+            return routed
+    started = time.monotonic()
+    mode = read_mode(req.query)
+    if mode == "linearizable":
+        error = await asyncio.get_running_loop().run_in_executor(server.executor, confirm_read)
+        if error:
+            return error
+    result = local_read(req.query, mode)
+    READ_SECONDS.labels(req.query.get("mode", "stale")).observe(time.monotonic() - started)
+    return result
+
+@server.route("GET", "/subscribe")
+async def subscribe_async(req):
+    cursor, release, error = open_subscription(req.query)
+    if error:
+        return error
+    return subscription_lines_async(cursor, release), 200, {"Content-Type": "application/x-ndjson"}
+
+# Protocolo binário (common/wire.py): acceptors com LEARNER_URLS paxos://host:LEARNER_WIRE_PORT
+WIRE_PORT = os.getenv("LEARNER_WIRE_PORT", "")
+
+async def wire_votes(body):
+    learn_votes({"votes": wire.decode_votes(body)})
+    return wire.VOTES_ACK, b""
+
 if __name__ == "__main__":
-    from werkzeug.serving import run_simple
-    
-    print("LEARNER starting on port 8200. Paxos endpoints and /metrics exposed.", flush=True)
+    port = int(os.getenv("LEARNER_PORT", "8200"))
+    logger.info("LEARNER starting on port %d. Paxos endpoints and /metrics exposed.", port)
+    if WIRE_PORT:
+        wire.WireServer({wire.VOTES: wire_votes}).start(int(WIRE_PORT))
+    logger.info("Quorums: Q1=%d Q2=%d of %d acceptors", Q1, Q2, len(ACCEPTORS))
+    if groups.COUNT > 1:
+        logger.info("Group %d of %d", groups.GROUP, groups.COUNT)
+    # volta do snapshot em disco e busca o resto com os outros learners e os acceptors
+    load_snapshot()
+    threading.Thread(target=lambda: (check_quorum(), catch_up()), name="catch-up", daemon=True).start()
 
-    run_simple('0.0.0.0', 8200, app_dispatcher)
+    run_server(app_dispatcher, port, server)
@@ -1,15 +1,29 @@
 # proposer.py
 
 import requests
+from requests.adapters import HTTPAdapter
 from flask import Flask, request, jsonify
 import threading # Novo import para assincronismo
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 import time
 import os
+import math
 import random
-from prometheus_client import Counter, make_wsgi_app
+import sys
+import uuid
+from collections import OrderedDict
+from prometheus_client import Counter, Gauge, Histogram, make_wsgi_app
 from werkzeug.middleware.dispatcher import DispatcherMiddleware
 
+# pacote common/ (logger compartilhado) fica na raiz do repositório
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.logger import DEBUG, get_logger
+from common.server import run_server
+from common import groups, paxos, quorum, wire
+
 app = Flask(__name__)
+logger = get_logger("PROPOSER")
 
 # --- CONFIGURAÇÃO DE REDE LIDA DE VARIÁVEIS DE AMBIENTE ---
 
@@ -32,16 +46,127 @@ LEARNERS = load_urls_from_env(
 # --- CONFIGURAÇÃO DE PAXOS ---
 PROPOSER_ID = os.getenv("HOSTNAME", "proposer") #id unico do proposer
 local_counter = int(time.time() * 1000) # Contador global para IDs
-
-if len(ACCEPTORS) > 0:
-    MAJORITY = (len(ACCEPTORS) // 2) + 1 #calcula o quorum
-else:
-    MAJORITY = 2 
+counter_lock = threading.Lock() # protege o local_counter (threads do Paxos + respostas atrasadas)
+
+# Quorums da fase 1 (Q1) e da fase 2 (Q2), Flexible Paxos: Q1 + Q2 > N (common/quorum.py).
+# O learner lê a mesma configuração (PAXOS_Q1/PAXOS_Q2) para decidir com Q2 votos.
+try:
+    Q1, Q2 = quorum.sizes(len(ACCEPTORS))
+except ValueError as e:
+    logger.error("Invalid quorum configuration: %s", e)
+    sys.exit(1)
+
+# Grupos (common/groups.py): este proposer só propõe transações do seu grupo (PAXOS_GROUP), nos
+# acceptors do grupo (ACCEPTOR_URLS). As dos outros grupos vão para os proposers deles.
+try:
+    groups.validate()
+except ValueError as e:
+    logger.error("Invalid group configuration: %s", e)
+    sys.exit(1)
+GROUP_URLS = groups.load_group_urls("PROPOSER_GROUP_URLS") # grupo -> URLs base dos proposers dele
 
 # Configuração para Retry/Backoff
-BASE_BACKOFF_MIN = float(os.getenv("PROPOSER_BASE_BACKOFF_MIN", "1.0")) # Mínimo de 1.0 segundos
-BASE_BACKOFF_MAX = float(os.getenv("PROPOSER_BASE_BACKOFF_MAX", "5.0")) # Máximo de 5.0 segundos
-MAX_BACKOFF = float(os.getenv("PROPOSER_MAX_BACKOFF", "5.0")) # Mantido em 5.0 para este intervalo
+# Backoff adaptativo (common/paxos.py): o teto começa em milissegundos e dobra a cada falha de
+# quorum (contenção observada); cada commit baixa o nível de novo. O sorteio é entre 0 e o teto
+# (jitter cheio), para que dois proposers em disputa não voltem juntos.
+BACKOFF_BASE = float(os.getenv("PROPOSER_BACKOFF_BASE_MS", "5")) / 1000.0 # teto com nível 1 de contenção
+MAX_BACKOFF = float(os.getenv("PROPOSER_MAX_BACKOFF", "1.0")) # teto máximo em segundos
+backoff = paxos.Backoff(BACKOFF_BASE, MAX_BACKOFF) # nível = falhas de quorum recentes
+backoff_lock = threading.Lock()
+
+# Modo líder (Multi-Paxos): depois que um quorum Q1 prometeu um ballot, o proposer
+# reutiliza esse ballot e manda só ACCEPT até algum acceptor mostrar um ballot maior
+LEADER_MODE = os.getenv("PROPOSER_LEADER_MODE", "1") == "1"
+leader_ballot = None # ballot prometido por um quorum Q1 (None = precisa rodar a Fase 1)
+leader_floor_slot = 0 # slots a partir deste estavam vazios no quorum Q1 quando o ballot foi prometido
+leader_lock = threading.Lock()
+
+# Eleição de líder entre proposers (lease): cada proposer manda heartbeat para os outros
+# (POST /heartbeat) a cada PROPOSER_LEASE_SECONDS/3 e cada heartbeat renova o lease de quem mandou.
+# O líder é o proposer de menor id com lease válido; os outros encaminham /propose para ele em vez
+# de disputar ballots. O lease é só uma dica de desempenho: a segurança continua vindo dos ballots
+# nos acceptors (dois proposers achando que são líderes só voltam a disputar, como antes).
+PROPOSER_PORT = int(os.getenv("PROPOSER_PORT", "9000"))
+ADVERTISE_URL = os.getenv("PROPOSER_ADVERTISE_URL", f"http://{PROPOSER_ID}:{PROPOSER_PORT}") # como os outros proposers nos alcançam
+PEERS = [url for url in load_urls_from_env("PROPOSER_PEERS") if url != ADVERTISE_URL] # URLs base dos outros proposers
+LEASE_DURATION = float(os.getenv("PROPOSER_LEASE_SECONDS", "2.0"))
+ELECTION_ENABLED = bool(PEERS)
+peer_leases = {} # proposer_id -> (url, fim do lease em time.monotonic()) (protegido por leader_lock)
+
+# Batching: várias transações de clientes viram um único valor proposto (uma instância do Paxos)
+BATCH_MAX_SIZE = int(os.getenv("PROPOSER_BATCH_MAX_SIZE", "32")) # máximo de transações por lote
+BATCH_LINGER = float(os.getenv("PROPOSER_BATCH_LINGER_MS", "5")) / 1000.0 # quanto o primeiro pedido espera o lote encher
+pending_transactions = [] # (transação, horário de chegada) esperando o próximo lote
+batch_cond = threading.Condition()
+
+# Pipelining: número fixo de workers, cada um com no máximo uma instância do Paxos em andamento.
+# O excesso de pedidos espera em pending_transactions (e acaba formando lotes maiores).
+PIPELINE_WINDOW = int(os.getenv("PROPOSER_PIPELINE_WINDOW", "8")) # máximo de instâncias em paralelo
+in_flight = 0 # instâncias rodando agora (protegido por batch_cond)
+in_flight_transactions = 0 # transações dentro dessas instâncias (protegido por batch_cond)
+
+# Controle de admissão: com o cluster atrasado, /propose recusa transações novas (429/503 com
+# Retry-After) em vez de enfileirar trabalho que só vai estourar o timeout do cliente e voltar como
+# retry. Retries de transações já aceitas (tabela de deduplicação) passam sempre. 0 desliga cada limite.
+ADMIT_MAX_PENDING = int(os.getenv("PROPOSER_ADMIT_MAX_PENDING", str(4 * PIPELINE_WINDOW * BATCH_MAX_SIZE))) # na fila + nas instâncias
+ADMIT_MAX_QUEUE_AGE = float(os.getenv("PROPOSER_ADMIT_MAX_QUEUE_AGE", "2.0")) # segundos da mais antiga na fila
+ADMIT_MAX_LATENCY = float(os.getenv("PROPOSER_ADMIT_MAX_LATENCY", "5.0")) # média móvel do /propose até o commit
+ADMIT_RETRY_MAX = float(os.getenv("PROPOSER_ADMIT_RETRY_MAX", "10")) # teto do Retry-After em segundos
+ADMITTED_HEADER = "X-Paxos-Admitted" # transação já aceita por outro proposer (hand-off para o líder)
+commit_latency = 0.0 # média móvel (EWMA) da latência de commit recente (protegido por batch_cond)
+
+# /propose?wait=true: o pedido fica esperando a decisão em vez de voltar PENDING
+PROPOSE_WAIT_TIMEOUT = float(os.getenv("PROPOSER_WAIT_TIMEOUT", "15"))
+commit_waiters = {} # (client_id, request_id) -> [CommitWaiter]
+waiters_lock = threading.Lock()
+
+# Deduplicação: o retry de um cliente (mesmo client_id e request_id) não abre uma rodada nova.
+# Com a transação ainda na fila ou numa instância, o retry só se junta a ela; depois da decisão,
+# recebe o resultado guardado. Entradas saem por TTL (contado da decisão) ou pelo tamanho máximo.
+DEDUP_TTL = float(os.getenv("PROPOSER_DEDUP_TTL", "300")) # segundos
+DEDUP_MAX = int(os.getenv("PROPOSER_DEDUP_MAX", "100000")) # entradas
+dedup_table = OrderedDict() # (client_id, request_id) -> DedupEntry, da mais antiga para a mais nova
+dedup_lock = threading.Lock()
+
+# Log replicado: cada proposta ocupa um slot (instância) próprio do Paxos
+next_slot = 0 # próximo slot livre que este proposer vai usar
+slot_lock = threading.Lock()
+
+# --- CONEXÕES COM OS ACCEPTORS ---
+# PREPARE/ACCEPT saem em paralelo, cada acceptor com as próprias threads: um acceptor lento ou
+# particionado prende só as dele até o timeout, sem atrasar as mensagens para os outros. Com as
+# ACCEPTOR_MAX_IN_FLIGHT dele ocupadas, a mensagem nova nem sai (conta como falha na hora) em vez
+# de esperar numa fila atrás de chamadas que vão dar timeout.
+ACCEPTOR_MAX_IN_FLIGHT = int(os.getenv("PROPOSER_ACCEPTOR_MAX_IN_FLIGHT", "8"))
+acceptor_pools = {url: ThreadPoolExecutor(max_workers=ACCEPTOR_MAX_IN_FLIGHT, thread_name_prefix=f"acceptor{i}")
+                  for i, url in enumerate(ACCEPTORS)}
+acceptor_slots = {url: threading.BoundedSemaphore(ACCEPTOR_MAX_IN_FLIGHT) for url in ACCEPTORS}
+# heartbeats do lease têm threads próprias: não competem com o Paxos pelas dos acceptors
+heartbeat_pool = ThreadPoolExecutor(max_workers=max(1, len(PEERS)), thread_name_prefix="heartbeat")
+
+# Sessão HTTP compartilhada: reaproveita conexões keep-alive em vez de abrir uma por mensagem
+http_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=max(1, len(ACCEPTORS) + len(PEERS)), pool_maxsize=ACCEPTOR_MAX_IN_FLIGHT)
+http_session.mount("http://", _adapter)
+http_session.mount("https://", _adapter)
+
+# Acceptors com URL paxos://host:porta usam o protocolo binário (common/wire.py) numa conexão
+# persistente e multiplexada; URLs http:// continuam em HTTP/JSON
+wire_clients = {url: wire.WireClient(url) for url in ACCEPTORS if url.startswith(wire.SCHEME)}
+
+# /propose encaminhados ao líder saem das threads do servidor (uma por requisição): pool próprio
+forward_session = requests.Session()
+_forward_adapter = HTTPAdapter(pool_connections=max(1, len(PEERS)), pool_maxsize=64)
+forward_session.mount("http://", _forward_adapter)
+forward_session.mount("https://", _forward_adapter)
+# transações que já estavam na fila quando outro proposer virou líder (podem esperar a decisão dele)
+forward_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="forward")
+
+# Buracos do log pedidos pelos learners (POST /fill): um no-op por slot, fora do pipeline
+NOOP_VALUE = {"noop": True}
+fill_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="fill")
+filling = set() # slots com preenchimento em andamento
+filling_lock = threading.Lock()
 
 # --- MÉTRICAS PROMETHEUS ---
 PAXOS_ATTEMPTS = Counter('paxos_attempts_total', 'Total de requisições /propose do cliente')
@@ -49,150 +174,719 @@ PREPARES_SENT = Counter('paxos_prepares_sent_total', 'Total de mensagens PREPARE
 PROMISES_QUORUM_FAIL = Counter('paxos_promises_quorum_fail_total', 'Total de falhas de Quorum na Fase 1 (Prepare)')
 ACCEPTS_QUORUM_FAIL = Counter('paxos_accepts_quorum_fail_total', 'Total de falhas de Quorum na Fase 2 (Accept)')
 COMMITS_TOTAL = Counter('paxos_commits_total', 'Total de propostas concluídas com sucesso (COMMITTED)')
+# Histogramas do caminho de consenso (segundos)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PHASE1_SECONDS = Histogram('paxos_phase1_seconds', 'Duração da Fase 1 (PREPARE até o quorum)', buckets=LATENCY_BUCKETS)
+PHASE2_SECONDS = Histogram('paxos_phase2_seconds', 'Duração da Fase 2 (ACCEPT até o quorum)', buckets=LATENCY_BUCKETS)
+PROPOSE_TO_COMMIT_SECONDS = Histogram('paxos_propose_to_commit_seconds', 'Tempo entre o /propose e o quorum de ACCEPT da transação', buckets=LATENCY_BUCKETS)
+QUEUE_WAIT_SECONDS = Histogram('paxos_queue_wait_seconds', 'Tempo que a transação esperou na fila até entrar num lote', buckets=LATENCY_BUCKETS)
+ACCEPTOR_RTT_SECONDS = Histogram('paxos_acceptor_rtt_seconds', 'Tempo de resposta de cada acceptor', ['acceptor', 'phase'], buckets=LATENCY_BUCKETS)
+ACCEPTOR_IN_FLIGHT = Gauge('paxos_acceptor_requests_in_flight', 'Requisições em andamento por acceptor', ['acceptor'])
+ACCEPTOR_SATURATED = Counter('paxos_acceptor_saturated_total', 'Mensagens não enviadas porque o acceptor já tinha o máximo em andamento', ['acceptor'])
+BACKOFF_SECONDS = Histogram('paxos_backoff_seconds', 'Tempo dormido em backoff depois de falha de quorum', buckets=LATENCY_BUCKETS)
+RETRIES_PER_COMMIT = Histogram('paxos_retries_per_commit', 'Rodadas que falharam antes do commit de uma instância', buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50))
+PHASE1_SKIPPED = Counter('paxos_phase1_skipped_total', 'Total de rodadas que pularam a Fase 1 (modo líder)')
+QUEUE_DEPTH = Gauge('paxos_proposer_queue_depth', 'Transações esperando um worker livre')
+QUEUE_DEPTH.set_function(lambda: len(pending_transactions))
+IN_FLIGHT = Gauge('paxos_proposer_in_flight', 'Instâncias do Paxos em andamento neste proposer')
+IN_FLIGHT.set_function(lambda: in_flight)
+BATCHES_PROPOSED = Counter('paxos_batches_proposed_total', 'Total de lotes de transações enviados ao Paxos')
+LEADER_STEP_DOWNS = Counter('paxos_leader_step_downs_total', 'Total de vezes que o proposer perdeu a liderança')
+CONTENTION_LEVEL = Gauge('paxos_proposer_contention_level', 'Nível de contenção usado no backoff (falhas de quorum recentes)')
+CONTENTION_LEVEL.set_function(lambda: backoff.level)
+IS_LEADER = Gauge('paxos_proposer_is_leader', '1 se este proposer tem um ballot prometido pela maioria')
+IS_LEADER.set_function(lambda: 1 if leader_ballot is not None else 0)
+SLOTS_COMPACTED_SEEN = Counter('paxos_slots_compacted_seen_total', 'Rodadas que acharam o slot já compactado nos acceptors')
+SLOTS_FILLED = Counter('paxos_slots_filled_total', 'Slots fechados a pedido de um learner (no-op ou valor adotado)')
+DEDUP_HITS = Counter('paxos_proposer_dedup_hits_total', 'Retries atendidos pela tabela de deduplicação', ['state'])
+DEDUP_MISSES = Counter('paxos_proposer_dedup_misses_total', 'Transações novas registradas na tabela de deduplicação')
+DEDUP_EVICTED = Counter('paxos_proposer_dedup_evicted_total', 'Entradas removidas da tabela de deduplicação', ['reason'])
+DEDUP_ENTRIES = Gauge('paxos_proposer_dedup_entries', 'Entradas na tabela de deduplicação')
+DEDUP_ENTRIES.set_function(lambda: len(dedup_table))
+PROPOSALS_ROUTED = Counter('paxos_proposer_group_routed_total', 'Pedidos /propose encaminhados ao grupo da chave', ['group'])
+PROPOSALS_MISROUTED = Counter('paxos_proposer_group_misrouted_total', 'Pedidos recusados por serem de outro grupo')
+PROPOSALS_SHED = Counter('paxos_proposer_shed_total', 'Pedidos /propose recusados pelo controle de admissão', ['reason'])
+RECENT_COMMIT_LATENCY = Gauge('paxos_proposer_recent_commit_latency_seconds', 'Média móvel da latência entre o /propose e o commit')
+PROPOSALS_FORWARDED = Counter('paxos_proposals_forwarded_total', 'Pedidos /propose encaminhados ao proposer líder')
 
 # FUNÇÕES DE ID
 
 def make_proposal_id():
     global local_counter
-    local_counter += 1
-    # Formato TID: <prefixo_numérico>:<proposer_id>
-    return f"{local_counter}:{PROPOSER_ID}"
-
-def prefix_from_pid(pid):
-    """Extrai o prefixo numérico do proposal_id (o TID) para comparação."""
-    try:
-        return int(str(pid).split(":")[0])
-    except:
-        return 0
+    with counter_lock:
+        local_counter += 1
+        # Formato TID: <prefixo_numérico>:<proposer_id>
+        return f"{local_counter}:{PROPOSER_ID}"
 
 #resolve tudo quanto é B.O
 def bump_proposal_id_based_on_feedback(original_id, responses):
     global local_counter 
     
-    highest = 0 # Usar 0 como base
-    
-    # Encontra o maior TID visto em qualquer resposta
-    for r in responses:
-        # Verifica tid_in_use (da fase Prepare/NotPromise) e tid (da fase Accept/NotAccepted)
-        tid = r.get("tid_in_use") or r.get("tid") or r.get("accepted_id")
-        if tid:
-            prefix = prefix_from_pid(tid)
-            if prefix > highest:
-                highest = prefix
-
-    # Novo prefixo é um a mais que o maior visto
-    new_prefix = highest + 1
-    
-    # Atualiza o contador global para evitar conflito com novas transações
-    if new_prefix > local_counter:
-        local_counter = new_prefix
+    # Novo prefixo é um a mais que o maior TID visto em qualquer resposta; atualiza o contador
+    # global para evitar conflito com novas transações
+    with counter_lock:
+        local_counter = paxos.bumped_counter(local_counter, responses)
+        current = local_counter
     
     # Preserva o ID do proposer original no sufixo
     proposer_id_suffix = str(original_id).split(":")[1] if ":" in str(original_id) else PROPOSER_ID
-    return f"{local_counter}:{proposer_id_suffix}" # Retorna o ID baseado no contador global atualizado
+    return f"{current}:{proposer_id_suffix}" # Retorna o ID baseado no contador global atualizado
+
+# SLOTS
+
+def allocate_slot():
+    """Reserva o próximo slot livre do log para uma nova proposta."""
+    global next_slot
+    with slot_lock:
+        slot = next_slot
+        next_slot += 1
+        return slot
+
+def release_slot(slot):
+    """O slot foi reservado mas a transação foi para o líder: devolve o slot se ninguém reservou
+    outro depois dele; senão o slot é preenchido com NOOP_VALUE, para os learners não pararem no buraco."""
+    global next_slot
+    with slot_lock:
+        if next_slot == slot + 1:
+            next_slot = slot
+            return
+    fill_pool.submit(fill_released_slot, slot)
+
+def fill_released_slot(slot):
+    """Preenche pelo líder (POST /fill), como os learners fazem: a Fase 1 daqui derrubaria o ballot dele.
+    Localmente só quando este proposer tem o lease; sem líder que responda, o gap fill dos learners fecha o slot."""
+    leader_url = lease_holder_url()
+    if leader_url and forward_propose(leader_url, {"slots": [slot]}, False, path="/fill") is not None:
+        return
+    if lease_holder_url() is None:
+        fill_slot(slot)
+    else:
+        logger.warning("Slot %d released without a reachable leader; leaving it to the learners' gap fill", slot)
+
+def observe_max_slot(slot):
+    """Acceptors já aceitaram valores até este slot: novos slots começam depois dele."""
+    global next_slot
+    with slot_lock:
+        if slot + 1 > next_slot:
+            next_slot = slot + 1
+
+# MODO LÍDER
+
+def current_leader_ballot(slot):
+    """Ballot que pode ir direto para a Fase 2 neste slot, ou None se é preciso rodar PREPARE."""
+    if not LEADER_MODE:
+        return None
+    with leader_lock:
+        # slots abaixo do piso podem ter valores de outro proposer: esses passam pela Fase 1
+        if leader_ballot is not None and slot >= leader_floor_slot:
+            return leader_ballot
+        return None
+
+def become_leader(proposal_id, floor_slot):
+    """Guarda o ballot que acabou de ser prometido por um quorum Q1."""
+    global leader_ballot, leader_floor_slot
+    if not LEADER_MODE:
+        return
+    with leader_lock:
+        if paxos.ballot_key(proposal_id) > paxos.ballot_key(leader_ballot):
+            leader_ballot = proposal_id
+            leader_floor_slot = floor_slot
+            logger.info("Leader with ballot %s. Skipping PREPARE for next proposals.", proposal_id)
+
+def step_down(proposal_id):
+    """Algum acceptor rejeitou o ballot do líder: volta a rodar a Fase 1."""
+    global leader_ballot
+    with leader_lock:
+        # só derruba se ainda for o mesmo ballot (outra thread pode já ter renovado)
+        if leader_ballot is not None and leader_ballot == proposal_id:
+            leader_ballot = None
+            LEADER_STEP_DOWNS.inc()
+            logger.info("Lost leadership of ballot %s. Falling back to PREPARE.", proposal_id)
+
+# ELEIÇÃO DE LÍDER (LEASE)
+
+def current_leader():
+    """(proposer_id, url) do líder: o menor id entre os proposers com lease válido (inclusive este)."""
+    now = time.monotonic()
+    with leader_lock:
+        alive = [(pid, url) for pid, (url, expires) in peer_leases.items() if now < expires]
+    alive.append((PROPOSER_ID, ADVERTISE_URL))
+    return min(alive)
+
+def lease_holder_url():
+    """URL do proposer líder para onde encaminhar /propose, ou None se este proposer deve propor."""
+    if not ELECTION_ENABLED:
+        return None
+    leader_id, url = current_leader()
+    return None if leader_id == PROPOSER_ID else url
+
+def renew_lease(proposer_id, url):
+    """Heartbeat de outro proposer: o lease dele vale por mais LEASE_DURATION."""
+    if proposer_id == PROPOSER_ID:
+        return
+    with leader_lock:
+        if proposer_id not in peer_leases:
+            logger.info("Proposer %s (%s) is alive.", proposer_id, url)
+        peer_leases[proposer_id] = (url, time.monotonic() + LEASE_DURATION)
+
+def expire_lease(url):
+    """O proposer não respondeu: o lease dele acaba agora e a liderança passa para o próximo."""
+    with leader_lock:
+        for proposer_id, (peer_url, _) in list(peer_leases.items()):
+            if peer_url == url:
+                del peer_leases[proposer_id]
+                logger.info("Proposer %s (%s) lease expired.", proposer_id, url)
+
+def send_heartbeat(peer):
+    try:
+        r = http_session.post(f"{peer}/heartbeat", json={"proposer_id": PROPOSER_ID, "url": ADVERTISE_URL},
+                              timeout=LEASE_DURATION / 3)
+        # a resposta também serve de heartbeat do outro lado
+        body = r.json()
+        renew_lease(body["proposer_id"], body["url"])
+    except (requests.RequestException, ValueError, KeyError):
+        pass
+
+def lease_loop():
+    """Renova o lease deste proposer nos outros (e o deles aqui) a cada LEASE_DURATION/3."""
+    while True:
+        for peer in PEERS:
+            heartbeat_pool.submit(send_heartbeat, peer)
+        time.sleep(LEASE_DURATION / 3)
+
+# BACKOFF
+
+def contention_backoff():
+    """Falha de quorum: sobe o nível de contenção e devolve quanto dormir."""
+    with backoff_lock:
+        return backoff.failure()
+
+def contention_relief():
+    """Commit: a disputa diminuiu, o próximo backoff volta a ser menor."""
+    with backoff_lock:
+        backoff.success()
 
 # FUNÇÕES DE COMUNICAÇÃO
 
-def send_prepare_to_all(proposal_id, transaction, timeout=3):
-    prepare_payload = {"proposal_id": proposal_id, "transaction": transaction}
-    promises = []
-    not_promises = []
-    print(f"[PROPOSER] Sending PREPARE {proposal_id} with payload: {prepare_payload}", flush=True)
-    #pra cada um dos acceptors envia um PREPARE
-    for acc_url in ACCEPTORS:
-        try:
-            r = requests.post(f"{acc_url}/prepare", json=prepare_payload, timeout=timeout)
-            body = r.json()
-            print(f"[PROPOSER] Received response from {acc_url} (PREPARE): Status {r.status_code}, Body: {body}", flush=True)
-            #conta os promisses e not-promisses
-            if r.status_code == 200 and body and body.get("type") == "promise":
-                promises.append(body)
+def _post_to_acceptor(acc_url, path, payload, timeout, trace_id):
+    """Envia uma mensagem para um acceptor e devolve (status, body). Roda numa das threads do acceptor (acceptor_pools)."""
+    started = time.monotonic()
+    with ACCEPTOR_IN_FLIGHT.labels(acc_url).track_inprogress():
+        client = wire_clients.get(acc_url)
+        if client is not None:
+            if path == "/prepare":
+                _, reply = client.call(wire.PREPARE, wire.encode_prepare(payload, trace_id), timeout)
+                status, body = wire.decode_promise(reply)
             else:
-                not_promises.append(body or {"type": "not_promise", "tid_in_use": None})
-        except Exception:
-            not_promises.append({"type": "not_promise", "tid_in_use": None})
-    return promises, not_promises
-
-def send_accept_to_all(proposal_id, transaction, timeout=3):
-    accept_payload = {"proposal_id": proposal_id, "transaction": transaction}
-    accepts = []
-    not_accepts = []
-    print(f"[PROPOSER] Sending ACCEPT {proposal_id} with transaction: {transaction}", flush=True)
-    #pra cada um dos acceptors envia um ACCEPT!
+                _, reply = client.call(wire.ACCEPT, wire.encode_accept(payload, trace_id), timeout)
+                status, body = wire.decode_accepted(reply)
+        else:
+            headers = {"X-Trace-Id": trace_id} if trace_id else None
+            r = http_session.post(f"{acc_url}{path}", json=payload, timeout=timeout, headers=headers)
+            status, body = r.status_code, r.json()
+    ACCEPTOR_RTT_SECONDS.labels(acc_url, path.strip("/")).observe(time.monotonic() - started)
+    return status, body
+
+def _submit_to_acceptor(acc_url, path, payload, timeout, trace_id):
+    """Agenda a mensagem nas threads do acceptor. None se ele já tem ACCEPTOR_MAX_IN_FLIGHT em andamento."""
+    slots = acceptor_slots[acc_url]
+    if not slots.acquire(blocking=False):
+        ACCEPTOR_SATURATED.labels(acc_url).inc()
+        return None
+    future = acceptor_pools[acc_url].submit(_post_to_acceptor, acc_url, path, payload, timeout, trace_id)
+    future.add_done_callback(lambda f: slots.release())
+    return future
+
+def _feed_late_reply(proposal_id, future):
+    """Resposta que chegou depois do quorum: só serve para atualizar o contador de IDs."""
+    try:
+        _, body = future.result()
+    except Exception:
+        return
+    if body:
+        bump_proposal_id_based_on_feedback(proposal_id, [body])
+
+def broadcast_to_acceptors(path, payload, is_ok, failure_body, timeout, needed, trace_id=None):
+    """Manda a mesma mensagem para todos os acceptors em paralelo.
+
+    Retorna (oks, fails) assim que `needed` respostas positivas chegam ou quando
+    rejeições suficientes tornam o quorum impossível. As respostas que chegam
+    depois continuam alimentando bump_proposal_id_based_on_feedback.
+    """
+    oks = []
+    fails = []
+    futures = {}
     for acc_url in ACCEPTORS:
-        try:
-            r = requests.post(f"{acc_url}/accept", json=accept_payload, timeout=timeout)
-            body = r.json()
-            print(f"[PROPOSER] Received response from {acc_url} (ACCEPT): Status {r.status_code}, Body: {body}", flush=True)
-            #conta os acceps e not-accepts
-            if r.status_code == 200 and body and body.get("response") == "accepted":
-                accepts.append(body)
-            else:
-                not_accepts.append(body or {"response": "not_accepted", "tid": proposal_id})
-        except Exception:
-            not_accepts.append({"response": "not_accepted", "tid": proposal_id})
-    return accepts, not_accepts
+        future = _submit_to_acceptor(acc_url, path, payload, timeout, trace_id)
+        if future is None:
+            #acceptor saturado: falha nesta rodada sem ocupar mais uma thread
+            fails.append(dict(failure_body))
+        else:
+            futures[future] = acc_url
+    pending = set(futures)
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            pending.discard(future)
+            acc_url = futures[future]
+            try:
+                status, body = future.result()
+                logger.debug("Received response from %s (%s): Status %s, Body: %s", acc_url, path, status, body, trace=trace_id)
+                if status == 200 and body and is_ok(body):
+                    oks.append(body)
+                elif status == 410:
+                    # slot já decidido e compactado no acceptor (o corpo pelo wire não traz o motivo)
+                    fails.append(dict(body or failure_body, compacted=True))
+                else:
+                    fails.append(body or dict(failure_body))
+            except Exception:
+                fails.append(dict(failure_body))
+            #já temos a decisão: não espera os acceptors mais lentos
+            if paxos.broadcast_done(len(oks), len(fails), needed, len(ACCEPTORS)):
+                break
+    except FuturesTimeout:
+        pass
+
+    # Quem não respondeu ainda conta como falha nesta rodada
+    for future in pending:
+        if not future.done():
+            fails.append(dict(failure_body))
+        future.add_done_callback(lambda f: _feed_late_reply(payload["proposal_id"], f))
+    return oks, fails
+
+def send_prepare_to_all(proposal_id, slot, transaction, timeout=3, trace_id=None):
+    prepare_payload = {"proposal_id": proposal_id, "slot": slot, "transaction": transaction}
+    logger.debug("Sending PREPARE %s with payload: %s", proposal_id, prepare_payload, trace=trace_id)
+    #envia o PREPARE pra todos os acceptors de uma vez e conta os promisses e not-promisses
+    return broadcast_to_acceptors(
+        "/prepare", prepare_payload,
+        is_ok=lambda body: body.get("type") == "promise",
+        failure_body={"type": "not_promise", "tid_in_use": None},
+        timeout=timeout,
+        needed=Q1,
+        trace_id=trace_id,
+    )
+
+def send_accept_to_all(proposal_id, slot, transaction, timeout=3, trace_id=None):
+    accept_payload = {"proposal_id": proposal_id, "slot": slot, "transaction": transaction}
+    logger.debug("Sending ACCEPT %s (slot %d) with transaction: %s", proposal_id, slot, transaction, trace=trace_id)
+    #envia o ACCEPT pra todos os acceptors de uma vez e conta os acceps e not-accepts
+    return broadcast_to_acceptors(
+        "/accept", accept_payload,
+        is_ok=lambda body: body.get("response") == "accepted",
+        failure_body={"response": "not_accepted", "tid": proposal_id},
+        timeout=timeout,
+        needed=Q2,
+        trace_id=trace_id,
+    )
 
 # PAXOS
 
-def run_paxos(proposal_id, transaction):
-    """Contém o loop de consenso Paxos, rodando em uma thread separada."""
-    current_proposal_id = proposal_id
-    
-    # Loop Infinito - Garante que o retry continue até o sucesso
+def slot_compacted(slot, responses):
+    """Algum acceptor respondeu 410: o slot já foi decidido e saiu do log (snapshot de um learner)."""
+    compacted = [r for r in responses if r.get("compacted")]
+    if not compacted:
+        return False
+    # tudo até truncated_upto está decidido, mesmo que o max_slot de algum acceptor esteja atrás
+    observe_max_slot(max([slot] + [max(r.get("max_slot", -1), r.get("truncated_upto", -1)) for r in compacted]))
+    SLOTS_COMPACTED_SEEN.inc()
+    return True
+
+class LocalNode:
+    """O ambiente deste proposer para a instância de common/paxos.py: slots, modo líder, lease,
+    backoff e métricas. A rede e o relógio ficam com run_paxos."""
+    q1 = Q1
+    q2 = Q2
+
+    def allocate_slot(self):
+        return allocate_slot()
+
+    def release_slot(self, slot):
+        release_slot(slot)
+
+    def observe_max_slot(self, slot):
+        observe_max_slot(slot)
+
+    def leader_ballot(self, slot):
+        return current_leader_ballot(slot)
+
+    def leader_elsewhere(self):
+        return lease_holder_url() is not None
+
+    def become_leader(self, proposal_id, floor_slot):
+        become_leader(proposal_id, floor_slot)
+
+    def step_down(self, proposal_id):
+        step_down(proposal_id)
+
+    def slot_compacted(self, slot, responses):
+        return slot_compacted(slot, responses)
+
+    def next_ballot(self, proposal_id, responses):
+        return bump_proposal_id_based_on_feedback(proposal_id, responses)
+
+    def quorum_failure(self, phase, trace_id):
+        (PROMISES_QUORUM_FAIL if phase == 1 else ACCEPTS_QUORUM_FAIL).inc()
+        sleep_time = contention_backoff()
+        logger.warning("Quorum failure (Phase %d). Backing off for %.2fs.", phase, sleep_time, trace=trace_id)
+        BACKOFF_SECONDS.observe(sleep_time)
+        return sleep_time
+
+    def on_phase1_skipped(self):
+        PHASE1_SKIPPED.inc()
+
+    def on_adopt(self, slot, transaction, trace_id):
+        logger.warning("Slot %d already has a value. Adopting it (Request ID: %s moves to a new slot).",
+                       slot, transaction.get('request_id', 'N/A'), trace=trace_id)
+
+    def on_commit(self, transaction, retries):
+        # conta cada transação do lote
+        COMMITS_TOTAL.inc(len(transaction.get("batch", [transaction])))
+        RETRIES_PER_COMMIT.observe(retries)
+        contention_relief()
+
+local_node = LocalNode()
+
+def run_paxos(proposal_id, transaction, trace_id=None, slot=None):
+    """Roda a instância do Paxos (common/paxos.py) na thread atual: cada passo vira um broadcast
+    aos acceptors ou um sleep de verdade.
+
+    Devolve (slot, proposal_id) do commit, ou None se a transação foi entregue ao proposer líder.
+    Com `slot` (preenchimento de buraco) roda só aquele slot e termina com o valor que for
+    decidido nele, mesmo que seja um valor adotado."""
+    steps = paxos.propose(local_node, proposal_id, transaction, slot=slot, trace_id=trace_id)
+    reply = None
     while True:
-        # FASE 1: PREPARE
-        PREPARES_SENT.inc()
-        promises, not_promises = send_prepare_to_all(current_proposal_id, transaction)
-
-        if len(promises) < MAJORITY:
-            # Falha na maioria da Fase 1: Recalcula novo ID, aplica backoff e repete
-            PROMISES_QUORUM_FAIL.inc() 
-            all_responses = promises + not_promises
-            current_proposal_id = bump_proposal_id_based_on_feedback(current_proposal_id, all_responses)
-            
+        try:
+            step = steps.send(reply)
+        except StopIteration as done:
+            return done.value
+        if step[0] == "prepare":
+            PREPARES_SENT.inc()
+            with PHASE1_SECONDS.time():
+                reply = send_prepare_to_all(step[1], step[2], step[3], trace_id=trace_id)
+        elif step[0] == "accept":
+            with PHASE2_SECONDS.time():
+                reply = send_accept_to_all(step[1], step[2], step[3], trace_id=trace_id)
+        else:
             # Backoff (não bloqueia o servidor, apenas a thread de Paxos)
-            sleep_time = random.uniform(BASE_BACKOFF_MIN, BASE_BACKOFF_MAX)
-            print(f"[PROPOSER] Quorum failure (Phase 1). Backing off for {sleep_time:.2f}s.", flush=True)
-            time.sleep(sleep_time)
-            continue 
-
-        original_transaction = transaction.copy()
-        # Trata a regra de adoção de valor do Paxos (se já houve um valor aceito)
-        highest = None
-        for p in promises:
-            accepted_id = p.get("accepted_id")
-            accepted_value = p.get("accepted_value")
-            
-            if accepted_id and accepted_value:
-                prefix = prefix_from_pid(accepted_id)
-                if highest is None or prefix > highest["prefix"]:
-                    highest = {"prefix": prefix, "accepted_id": accepted_id, "accepted_value": accepted_value}
-
-        if highest:
-            if transaction != highest["accepted_value"]:
-             print(f"[PROPOSER] WARNING: Adopted older value (Request ID: {transaction.get('request_id', 'N/A')}). Delaying Phase 2 by {BASE_BACKOFF}s.", flush=True)
-             time.sleep(BASE_BACKOFF)
-
-        # FASE 2: ACCEPT
-        accepts, not_accepts = send_accept_to_all(current_proposal_id, transaction)
-
-        if len(accepts) >= MAJORITY:
-            # Sucesso: A maioria aceitou o valor
-            COMMITS_TOTAL.inc()
-
-            return # Sai da função, terminando a thread
+            time.sleep(step[1])
+            reply = None
+
+
+# BATCHING
+
+def make_batch_value(transactions):
+    """Um lote com uma transação só continua sendo a própria transação."""
+    if len(transactions) == 1:
+        return transactions[0]
+    return {"batch": transactions}
+
+def take_batch():
+    """Espera transações pendentes e tira um lote da fila.
+
+    O lote sai quando chega a BATCH_MAX_SIZE transações ou quando a mais antiga
+    já esperou BATCH_LINGER segundos.
+    """
+    global in_flight, in_flight_transactions
+    with batch_cond:
+        while not pending_transactions:
+            batch_cond.wait()
+        deadline = time.monotonic() + BATCH_LINGER
+        while len(pending_transactions) < BATCH_MAX_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            batch_cond.wait(remaining)
+        batch = pending_transactions[:BATCH_MAX_SIZE]
+        del pending_transactions[:BATCH_MAX_SIZE]
+        in_flight += 1
+        in_flight_transactions += len(batch)
+        return batch
+
+class CommitWaiter:
+    """Um /propose?wait=true esperando a sua transação ser decidida."""
+    __slots__ = ("event", "result")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+def transaction_key(transaction):
+    # a sessão separa as execuções de um mesmo cliente: os request_id recomeçam em 1 a cada restart
+    return (transaction.get("client_id"), transaction.get("session"), transaction.get("request_id"))
+
+def register_waiter(transaction):
+    waiter = CommitWaiter()
+    with waiters_lock:
+        commit_waiters.setdefault(transaction_key(transaction), []).append(waiter)
+    return waiter
+
+def forget_waiter(transaction, waiter):
+    with waiters_lock:
+        waiters = commit_waiters.get(transaction_key(transaction), [])
+        if waiter in waiters:
+            waiters.remove(waiter)
+        if not waiters:
+            commit_waiters.pop(transaction_key(transaction), None)
+
+def resolve_waiters(batch, slot, proposal_id):
+    """Guarda o resultado das transações do lote decidido e acorda quem está esperando por elas."""
+    results = [(tx, {"result": "COMMITTED", "request_id": tx.get("request_id"), "session": tx.get("session"), "slot": slot,
+                     "proposal_id": proposal_id, "trace_id": tx.get("trace_id")}) for tx in batch]
+    # a tabela antes dos waiters: um retry que não achar o resultado nela já tem o seu waiter registrado
+    dedup_decided(results)
+    if not commit_waiters:
+        return
+    with waiters_lock:
+        for tx, result in results:
+            for waiter in commit_waiters.pop(transaction_key(tx), []):
+                waiter.result = result
+                waiter.event.set()
+
+class DedupEntry:
+    """Estado de uma transação na tabela de deduplicação (result None = ainda em andamento)."""
+    __slots__ = ("result", "updated")
+
+    def __init__(self):
+        self.result = None
+        self.updated = time.monotonic()
+
+def dedup_evict(now):
+    """Remove as entradas expiradas e o excesso (chamar com dedup_lock)."""
+    while dedup_table:
+        entry = next(iter(dedup_table.values()))
+        if len(dedup_table) > DEDUP_MAX:
+            DEDUP_EVICTED.labels("size").inc()
+        elif now - entry.updated > DEDUP_TTL:
+            DEDUP_EVICTED.labels("ttl").inc()
         else:
-            # Falha na maioria da Fase 2: Recalcula novo ID, aplica backoff e repete
-            ACCEPTS_QUORUM_FAIL.inc()
-            all_responses = accepts + not_accepts
-            current_proposal_id = bump_proposal_id_based_on_feedback(current_proposal_id, all_responses)
-            
-            sleep_time = random.uniform(BASE_BACKOFF_MIN, BASE_BACKOFF_MAX)
-            print(f"[PROPOSER] Quorum failure (Phase 2). Backing off for {sleep_time:.2f}s.", flush=True)
-            time.sleep(sleep_time)
-            continue 
+            break
+        dedup_table.popitem(last=False)
+
+def dedup_lookup(transaction):
+    """Entrada de uma transação já vista (retry) ou None, registrando a transação como nova."""
+    key = transaction_key(transaction)
+    if key[0] is None or key[2] is None:
+        return None
+    with dedup_lock:
+        entry = dedup_table.get(key)
+        if entry is not None:
+            DEDUP_HITS.labels("in_flight" if entry.result is None else "decided").inc()
+            return entry
+        DEDUP_MISSES.inc()
+        dedup_table[key] = DedupEntry()
+        dedup_evict(time.monotonic())
+        return None
+
+def dedup_contains(transaction):
+    """A transação já está na tabela (em andamento ou decidida)."""
+    with dedup_lock:
+        return transaction_key(transaction) in dedup_table
+
+def dedup_decided(results):
+    """Guarda o resultado de cada transação decidida; o TTL passa a contar da decisão."""
+    now = time.monotonic()
+    with dedup_lock:
+        for tx, result in results:
+            key = transaction_key(tx)
+            entry = dedup_table.get(key)
+            if entry is None:
+                continue
+            entry.result = result
+            entry.updated = now
+            dedup_table.move_to_end(key)
+
+def dedup_forget(transactions):
+    """Tira da tabela transações que este proposer não vai mais decidir (o retry propõe de novo)."""
+    with dedup_lock:
+        for tx in transactions:
+            entry = dedup_table.get(transaction_key(tx))
+            if entry is not None and entry.result is None:
+                del dedup_table[transaction_key(tx)]
+
+def forward_transaction(url, transaction):
+    """Manda uma transação da fila local para o líder; quem espera por ela recebe a resposta dele."""
+    with waiters_lock:
+        wait = transaction_key(transaction) in commit_waiters
+    # já foi aceita aqui (o cliente recebeu 202): o líder não pode recusar por sobrecarga
+    response = forward_propose(url, {"transaction": transaction}, wait, admitted=True)
+    if response is None:
+        # líder fora do ar: volta para a fila deste proposer
+        submit_transaction(transaction)
+        return
+    # a transação agora é do líder (que tem a sua própria tabela)
+    dedup_forget([transaction])
+    body, status, _ = response
+    if wait and status == 200:
+        result = json.loads(body)
+        with waiters_lock:
+            for waiter in commit_waiters.pop(transaction_key(transaction), []):
+                waiter.result = result
+                waiter.event.set()
+
+def hand_off(batch):
+    """Outro proposer virou líder enquanto o lote esperava: entrega as transações para ele."""
+    leader_url = lease_holder_url()
+    for tx in batch:
+        if leader_url:
+            forward_pool.submit(forward_transaction, leader_url, tx)
+        else:
+            submit_transaction(tx)
 
+def worker_loop():
+    """Worker do pool: pega um lote, roda o Paxos dele até o fim e volta para a fila."""
+    global in_flight, in_flight_transactions, commit_latency
+    while True:
+        entries = take_batch()
+        if not entries:
+            # outro worker levou o lote enquanto este esperava
+            with batch_cond:
+                in_flight -= 1
+            continue
+        BATCHES_PROPOSED.inc()
+        batch = [tx for tx, _ in entries]
+        now = time.monotonic()
+        for _, arrived in entries:
+            QUEUE_WAIT_SECONDS.observe(now - arrived)
+        # trace da instância; cada transação continua com o seu próprio trace_id
+        trace_id = uuid.uuid4().hex[:16]
+        if logger.enabled(DEBUG):
+            logger.debug("Proposing lot of %d: %s", len(batch), [tx.get('trace_id') for tx in batch], trace=trace_id)
+        try:
+            outcome = run_paxos(make_proposal_id(), make_batch_value(batch), trace_id=trace_id)
+            if outcome is None:
+                hand_off(batch)
+                continue
+            slot, proposal_id = outcome
+            now = time.monotonic()
+            for _, arrived in entries:
+                PROPOSE_TO_COMMIT_SECONDS.observe(now - arrived)
+            with batch_cond:
+                # a transação mais antiga do lote é a que o cliente mais esperou
+                commit_latency = 0.8 * commit_latency + 0.2 * (now - entries[0][1])
+                RECENT_COMMIT_LATENCY.set(commit_latency)
+            resolve_waiters(batch, slot, proposal_id)
+        except Exception as e:
+            logger.error("Paxos instance failed: %s", e, trace=trace_id)
+            dedup_forget(batch)
+        finally:
+            with batch_cond:
+                in_flight -= 1
+                in_flight_transactions -= len(entries)
+
+def submit_transaction(transaction):
+    """Coloca a transação na fila do próximo lote."""
+    with batch_cond:
+        pending_transactions.append((transaction, time.monotonic()))
+        if len(pending_transactions) >= BATCH_MAX_SIZE:
+            batch_cond.notify_all()
+        elif len(pending_transactions) == 1:
+            batch_cond.notify()
+
+def admission_check():
+    """None se uma transação nova pode entrar, senão (motivo, status, segundos sugeridos para o retry).
+
+    429: este proposer já tem transações demais por decidir. 503: o cluster está decidindo devagar
+    (fila envelhecendo ou commits lentos). A latência só conta com fila: sem nada esperando, a média
+    antiga não segura pedidos novos.
+    """
+    now = time.monotonic()
+    with batch_cond:
+        queued = len(pending_transactions)
+        pending = queued + in_flight_transactions
+        queue_age = now - pending_transactions[0][1] if queued else 0.0
+        latency = commit_latency
+    if ADMIT_MAX_PENDING and pending >= ADMIT_MAX_PENDING:
+        return "pending", 429, max(latency, queue_age)
+    if ADMIT_MAX_QUEUE_AGE and queue_age > ADMIT_MAX_QUEUE_AGE:
+        return "queue_age", 503, queue_age
+    if ADMIT_MAX_LATENCY and queued and latency > ADMIT_MAX_LATENCY:
+        return "latency", 503, latency
+    return None
+
+def shed_response(reason, status, retry_after, trace_id):
+    """Resposta de recusa: Retry-After (segundos inteiros) no header e o valor exato no corpo."""
+    retry_after = min(max(retry_after, 0.05), ADMIT_RETRY_MAX)
+    PROPOSALS_SHED.labels(reason).inc()
+    body = {"status": "OVERLOADED", "reason": reason, "retry_after": round(retry_after, 3), "trace_id": trace_id}
+    return jsonify(body), status, {"Retry-After": str(math.ceil(retry_after))}
+
+def pipeline_stats():
+    """Profundidade da fila e instâncias em andamento (para /stats)."""
+    with batch_cond:
+        return {
+            "queue_depth": len(pending_transactions),
+            "in_flight": in_flight,
+            "in_flight_transactions": in_flight_transactions,
+            "recent_commit_latency": commit_latency,
+            "window": PIPELINE_WINDOW,
+            "contention_level": backoff.level,
+            "leader": leader_ballot is not None,
+            "forwarding_to": lease_holder_url(),
+            "quorum": quorum.describe(len(ACCEPTORS), Q1, Q2),
+            **groups.describe(),
+            "dedup_entries": len(dedup_table),
+            "alive_peers": sorted(pid for pid, (_, expires) in peer_leases.items() if time.monotonic() < expires),
+        }
+
+def forward_propose(url, data, wait, path="/propose", admitted=False):
+    """Encaminha o /propose ao líder e devolve a resposta dele (None se o líder não respondeu)."""
+    headers = {"X-Forwarded-By": PROPOSER_ID}
+    if admitted:
+        headers[ADMITTED_HEADER] = "1"
+    try:
+        r = forward_session.post(
+            f"{url}{path}", json=data,
+            params={"wait": "true"} if wait else None,
+            headers=headers,
+            timeout=PROPOSE_WAIT_TIMEOUT + 2 if wait else 2,
+        )
+    except requests.RequestException as e:
+        logger.warning("Leader %s unreachable (%s). Proposing locally.", url, e)
+        expire_lease(url)
+        return None
+    PROPOSALS_FORWARDED.inc()
+    return r.content, r.status_code, {"Content-Type": r.headers.get("Content-Type", "application/json")}
+
+def route_to_group(group, data, wait):
+    """Entrega o /propose a um proposer do grupo da transação (None se nenhum respondeu)."""
+    urls = list(GROUP_URLS.get(group, []))
+    random.shuffle(urls)
+    for url in urls:
+        try:
+            r = forward_session.post(
+                f"{url}/propose", json=data,
+                params={"wait": "true"} if wait else None,
+                headers={groups.ROUTED_HEADER: str(group)},
+                timeout=PROPOSE_WAIT_TIMEOUT + 2 if wait else 2,
+            )
+        except requests.RequestException as e:
+            logger.warning("Proposer %s of group %d unreachable: %s", url, group, e)
+            continue
+        PROPOSALS_ROUTED.labels(str(group)).inc()
+        return r.content, r.status_code, {"Content-Type": r.headers.get("Content-Type", "application/json")}
+    return None
+
+def fill_slot(slot):
+    """Roda o Paxos de um slot que ficou sem decisão, propondo NOOP_VALUE."""
+    with filling_lock:
+        if slot in filling:
+            return
+        filling.add(slot)
+    try:
+        decided_slot, proposal_id = run_paxos(make_proposal_id(), NOOP_VALUE, slot=slot)
+        SLOTS_FILLED.inc()
+        logger.info("Filled slot %d (%s)", decided_slot, proposal_id)
+    except Exception as e:
+        logger.error("Filling slot %d failed: %s", slot, e)
+    finally:
+        with filling_lock:
+            filling.discard(slot)
+
+for i in range(PIPELINE_WINDOW):
+    threading.Thread(target=worker_loop, name=f"paxos-worker-{i}", daemon=True).start()
+if ELECTION_ENABLED:
+    threading.Thread(target=lease_loop, name="leader-lease", daemon=True).start()
 
 # --- ENDPOINT PRINCIPAL (Não-Bloqueante) ---
 
@@ -203,17 +897,87 @@ def propose():
     if not transaction:
         return jsonify({"error": "missing transaction"}), 400
 
-    PAXOS_ATTEMPTS.inc() # Incrementa o contador de requisições do cliente
+    # trace/correlation id: vem do cliente (transação ou header) ou é criado aqui;
+    # viaja dentro da transação por /prepare, /accept, /learn e /commit
+    trace_id = transaction.get("trace_id") or request.headers.get("X-Trace-Id") or uuid.uuid4().hex[:16]
+    transaction["trace_id"] = trace_id
+
+    # Transação de outro grupo: vai para os proposers dele (um pedido já roteado não é reencaminhado)
+    group = groups.group_of(groups.partition_key(transaction))
+    if group != groups.GROUP:
+        if request.headers.get(groups.ROUTED_HEADER) is not None:
+            # roteado para cá por alguém com outra configuração de grupos
+            PROPOSALS_MISROUTED.inc()
+            return jsonify({"error": "transaction belongs to another group", "group": group,
+                            "this_group": groups.GROUP}), 421
+        response = route_to_group(group, data, request.args.get("wait") == "true")
+        if response is not None:
+            return response
+        return jsonify({"error": "no proposer of the transaction's group available", "group": group}), 503
+
+    # Outro proposer é o líder: encaminha em vez de disputar ballots com ele
+    # (pedido já encaminhado nunca é reencaminhado, para não criar ciclos)
+    leader_url = lease_holder_url()
+    if leader_url and not request.headers.get("X-Forwarded-By"):
+        response = forward_propose(leader_url, data, request.args.get("wait") == "true")
+        if response is not None:
+            return response
 
-    # 1. Gera o primeiro ID e encapsula os dados
-    proposal_id = make_proposal_id()
-
-    # 2. Inicia o Paxos em uma thread separada
-    thread = threading.Thread(target=run_paxos, args=(proposal_id, transaction))
-    thread.start()
+    PAXOS_ATTEMPTS.inc() # Incrementa o contador de requisições do cliente
 
-    # 3. Retorna imediatamente (Não-Bloqueante)
-    return jsonify({"status": "PENDING", "proposal_id": proposal_id}), 202
+    # Modo síncrono opcional: responde só depois da decisão
+    # (o waiter é registrado antes da consulta à tabela de deduplicação para não perder a decisão)
+    waiter = register_waiter(transaction) if request.args.get("wait") == "true" else None
+
+    # Controle de admissão: só transações novas são recusadas; um retry de uma transação já
+    # aceita continua esperando por ela (ou recebe o resultado)
+    shed = None if request.headers.get(ADMITTED_HEADER) else admission_check()
+    if shed is not None and not dedup_contains(transaction):
+        if waiter is not None:
+            forget_waiter(transaction, waiter)
+        return shed_response(*shed, trace_id)
+
+    entry = dedup_lookup(transaction)
+    if entry is None:
+        # 1. Entra na fila do lote; o batcher gera o ID e roda o Paxos do lote inteiro
+        submit_transaction(transaction)
+    elif entry.result is not None:
+        # retry de uma transação já decidida: devolve o resultado sem outra rodada
+        if waiter is not None:
+            forget_waiter(transaction, waiter)
+        return jsonify(entry.result), 200
+    # senão é um retry de uma transação em andamento: espera a mesma instância
+
+    if waiter is not None:
+        if waiter.event.wait(PROPOSE_WAIT_TIMEOUT):
+            return jsonify(waiter.result), 200
+        forget_waiter(transaction, waiter)
+        return jsonify({"status": "PENDING", "trace_id": trace_id}), 202
+
+    # 2. Retorna imediatamente (Não-Bloqueante)
+    return jsonify({"status": "PENDING", "trace_id": trace_id}), 202
+
+@app.post("/fill")
+def fill():
+    # learner parado num buraco do log: fecha os slots com um no-op (ou com o valor já aceito lá).
+    # Vai para o líder, senão a Fase 1 daqui derrubaria o ballot dele.
+    data = request.get_json()
+    leader_url = lease_holder_url()
+    if leader_url and not request.headers.get("X-Forwarded-By"):
+        response = forward_propose(leader_url, data, False, path="/fill")
+        if response is not None:
+            return response
+    slots = [int(slot) for slot in data.get("slots", [])]
+    for slot in slots:
+        fill_pool.submit(fill_slot, slot)
+    return jsonify({"status": "FILLING", "slots": len(slots)}), 202
+
+@app.post("/heartbeat")
+def heartbeat():
+    # heartbeat de outro proposer: renova o lease dele e responde com o nosso
+    data = request.get_json()
+    renew_lease(data["proposer_id"], data["url"])
+    return jsonify({"proposer_id": PROPOSER_ID, "url": ADVERTISE_URL}), 200
 
 # --- CONFIGURAÇÃO DO SERVIDOR ---
 
@@ -226,7 +990,20 @@ app_dispatcher = DispatcherMiddleware(app, {
 def root():
     return "PROPOSER OK"
 
+@app.get("/stats")
+def stats():
+    return jsonify(pipeline_stats())
+
+@app.get("/debug/logs")
+def debug_logs():
+    # ring buffer do logger: últimas mensagens, inclusive as de DEBUG que não foram escritas
+    limit = request.args.get("limit", type=int)
+    return jsonify({"logs": logger.dump(limit)})
+
 if __name__ == "__main__":
-    from werkzeug.serving import run_simple
-    print("PROPOSER starting on port 9000 with /metrics exposed.")
-    run_simple('0.0.0.0', 9000, app_dispatcher)
+    logger.info("PROPOSER starting on port %d with /metrics exposed.", PROPOSER_PORT)
+    logger.info("Quorums: Q1=%d Q2=%d of %d acceptors", Q1, Q2, len(ACCEPTORS))
+    if groups.COUNT > 1:
+        logger.info("Group %d of %d", groups.GROUP, groups.COUNT)
+    # SERVER_MODE=async: todas as rotas passam pelo pool de threads do servidor async (SERVER_THREADS)
+    run_server(app_dispatcher, PROPOSER_PORT)
@@ -0,0 +1,53 @@
+# conftest.py
+# Os papéis (acceptor/, proposer/, learner/, client/) são scripts que leem a configuração do ambiente na
+# importação: load_role carrega um deles uma vez só por sessão de testes, com a configuração dada,
+# sem rede de verdade (URLs que recusam a conexão na hora) e sem disco.
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+UNREACHABLE = "http://127.0.0.1:9"
+#três acceptors distintos (o proposer tem threads por URL), todos recusando a conexão
+UNREACHABLE_ACCEPTORS = "http://127.0.0.1:9,http://127.0.0.2:9,http://127.0.0.3:9"
+
+ENV = {
+    "acceptor": {"ACCEPTOR_DATA_DIR": "", "LEARNER_URLS": f"{UNREACHABLE}/learn"},
+    "proposer": {"ACCEPTOR_URLS": UNREACHABLE_ACCEPTORS, "LEARNER_URLS": f"{UNREACHABLE}/learn",
+                 "PROPOSER_PEERS": "", "PROPOSER_MAX_BACKOFF": "0.05"},
+    "learner": {"LEARNER_DATA_DIR": "", "LEARNER_ACCEPTOR_URLS": UNREACHABLE_ACCEPTORS,
+                "LEARNER_PROPOSER_URLS": "", "LEARNER_PEERS": ""},
+    "client": {"CLIENT_MODE": "load", "PROPOSER_URLS": f"{UNREACHABLE}/propose"},
+}
+
+_loaded = {}
+
+def load_role(role):
+    if role not in _loaded:
+        os.environ.update(ENV[role])
+        spec = importlib.util.spec_from_file_location(role, os.path.join(ROOT, role, f"{role}.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        _loaded[role] = module
+    return _loaded[role]
+
+@pytest.fixture
+def proposer():
+    return load_role("proposer")
+
+@pytest.fixture
+def learner():
+    return load_role("learner")
+
+@pytest.fixture
+def acceptor():
+    return load_role("acceptor")
+
+@pytest.fixture
+def client():
+    return load_role("client")
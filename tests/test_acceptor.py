@@ -0,0 +1,46 @@
+# test_acceptor.py
+# Recuperação do acceptor: promessa, log e compactação voltam do checkpoint + WAL depois de um restart.
+
+def write(acceptor, handler, data):
+    response, status, lsn = handler(data, None)
+    acceptor.wal_wait(lsn)
+    return status
+
+def test_recover_state_from_checkpoint_and_wal(acceptor, tmp_path, monkeypatch):
+    monkeypatch.setattr(acceptor, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(acceptor, "log", {})
+    monkeypatch.setattr(acceptor, "learner_snapshots", {})
+    acceptor.start_durability()
+
+    assert write(acceptor, acceptor.handle_prepare, {"proposal_id": "5:p1", "slot": 0}) == 200
+    for slot in range(3):
+        assert write(acceptor, acceptor.handle_accept,
+                     {"proposal_id": "5:p1", "slot": slot, "transaction": {"key": "k", "value": slot}}) == 200
+    # learner (o único de LEARNER_URLS) com snapshot até o slot 0
+    r = acceptor.app.test_client().post("/compact", json={"upto": 0, "learner": "learner1"})
+    assert r.status_code == 200
+
+    # checkpoint no meio: o resto só está no WAL
+    acceptor.rotate_wal_segment()
+    acceptor.write_checkpoint(acceptor.wal_segment)
+    assert write(acceptor, acceptor.handle_prepare, {"proposal_id": "7:p2", "slot": 3}) == 200
+    assert write(acceptor, acceptor.handle_accept,
+                 {"proposal_id": "7:p2", "slot": 3, "transaction": {"key": "k", "value": 3}}) == 200
+    # ballot menor depois da promessa: recusado e fora do WAL
+    assert write(acceptor, acceptor.handle_prepare, {"proposal_id": "6:p1", "slot": 4}) != 200
+
+    # restart: estado em memória zerado
+    monkeypatch.setattr(acceptor, "highest_promised_id", None)
+    monkeypatch.setattr(acceptor, "log", {})
+    monkeypatch.setattr(acceptor, "max_slot", -1)
+    monkeypatch.setattr(acceptor, "truncated_upto", -1)
+    acceptor.recover_state()
+
+    assert acceptor.highest_promised_id == "7:p2"
+    assert acceptor.truncated_upto == 0
+    assert acceptor.max_slot == 3
+    assert {slot: tuple(entry) for slot, entry in acceptor.log.items()} == {
+        1: ("5:p1", {"key": "k", "value": 1}),
+        2: ("5:p1", {"key": "k", "value": 2}),
+        3: ("7:p2", {"key": "k", "value": 3}),
+    }
@@ -0,0 +1,30 @@
+# test_client.py
+# Gerador de carga (CLIENT_MODE=load): resultados de pedidos que já desistiram não ficam na memória.
+
+import time
+
+class Accepted:
+    status_code = 202
+
+    def json(self):
+        return {"status": "PENDING"}
+
+def test_late_commit_after_timeout_is_dropped(client, monkeypatch):
+    monkeypatch.setattr(client, "LOAD_REQUEST_TIMEOUT", 0.01)
+    monkeypatch.setattr(client.load_session, "post", lambda *args, **kwargs: Accepted())
+    timeouts = client.load_errors["timeout"]
+    client.load_request(time.monotonic())
+    assert client.load_errors["timeout"] == timeouts + 1
+    # o /commit chega depois do timeout
+    late = {"session": client.SESSION_ID, "result": "COMMITTED", "proposal_id": "1:proposer1"}
+    for rid in range(1, 1000):
+        client.record_result(dict(late, request_id=rid))
+    assert client.results == {}
+    assert client.waiting == {}
+
+def test_commit_for_a_waiting_request_is_kept(client):
+    event = client.waiting[-1] = client.threading.Event()
+    client.record_result({"session": client.SESSION_ID, "request_id": -1, "result": "COMMITTED"})
+    assert event.is_set()
+    assert client.forget_request(-1)["result"] == "COMMITTED"
+    assert client.results == {} and client.waiting == {}
@@ -0,0 +1,28 @@
+# test_dedup.py
+# Deduplicação dos retries: o mesmo pedido (client_id, session, request_id) recebe o resultado já
+# decidido, mas um cliente reiniciado (request_id recomeçando em 1, sessão nova) propõe de novo.
+
+def transaction(session, value, request_id=1):
+    return {"client_id": "c1", "session": session, "request_id": request_id, "key": "k", "value": value}
+
+def test_retry_gets_decided_result(proposer):
+    first = transaction("run-a", "v1")
+    assert proposer.dedup_lookup(first) is None
+    proposer.resolve_waiters([first], 10, "1:proposer1")
+    r = proposer.app.test_client().post("/propose", json={"transaction": dict(first)})
+    assert r.status_code == 200
+    assert r.get_json()["slot"] == 10
+
+def test_restarted_client_is_proposed_again(proposer):
+    first = transaction("run-b", "v1")
+    assert proposer.dedup_lookup(first) is None
+    proposer.resolve_waiters([first], 11, "1:proposer1")
+    # o cliente reiniciou: request_id 1 de novo, com outro valor
+    r = proposer.app.test_client().post("/propose", json={"transaction": transaction("run-c", "v2")})
+    assert r.status_code == 202
+    assert r.get_json()["status"] == "PENDING"
+
+def test_learner_notifies_each_session(learner):
+    assert learner.first_notification("c1", "run-a", 1)
+    assert not learner.first_notification("c1", "run-a", 1)
+    assert learner.first_notification("c1", "run-b", 1)
@@ -0,0 +1,168 @@
+# test_paxos.py
+# Instância do proposer (common/paxos.propose) dirigida passo a passo, com um node falso no lugar do
+# LocalNode: os passos ("prepare", "accept", "sleep") são respondidos direto pelo teste.
+
+import pytest
+
+from common import paxos
+
+class FakeNode:
+    q1 = 2
+    q2 = 2
+
+    def __init__(self):
+        self.next_slot = 0
+        self.released = []
+
+    def allocate_slot(self):
+        slot = self.next_slot
+        self.next_slot += 1
+        return slot
+
+    def observe_max_slot(self, slot):
+        self.next_slot = max(self.next_slot, slot + 1)
+
+    def release_slot(self, slot):
+        self.released.append(slot)
+
+    def leader_ballot(self, slot):
+        return None
+
+    def leader_elsewhere(self):
+        return False
+
+    def become_leader(self, proposal_id, floor_slot):
+        pass
+
+    def step_down(self, proposal_id):
+        pass
+
+    def slot_compacted(self, slot, responses):
+        compacted = [r for r in responses if r.get("compacted")]
+        if compacted:
+            self.observe_max_slot(max([slot] + [max(r["max_slot"], r["truncated_upto"]) for r in compacted]))
+        return bool(compacted)
+
+    def next_ballot(self, proposal_id, responses):
+        return f"{paxos.bumped_counter(paxos.ballot_prefix(proposal_id), responses)}:p1"
+
+    def quorum_failure(self, phase, trace_id):
+        return 0.0
+
+    def on_phase1_skipped(self):
+        pass
+
+    def on_adopt(self, slot, transaction, trace_id):
+        pass
+
+    def on_commit(self, transaction, retries):
+        pass
+
+def promise(max_slot=-1):
+    return {"type": "promise", "accepted_id": None, "accepted_value": None, "max_slot": max_slot}
+
+def compacted(max_slot, truncated_upto):
+    return {"response": "not_accepted", "compacted": True, "max_slot": max_slot, "truncated_upto": truncated_upto}
+
+def test_compacted_accept_reproposes_same_transaction(learner):
+    tx = {"client_id": "c1", "session": "s1", "request_id": 7, "key": "k", "value": "v"}
+    node = FakeNode()
+    instance = paxos.propose(node, "1:p1", tx)
+    assert next(instance) == ("prepare", "1:p1", 0, tx)
+    assert instance.send(([promise(), promise()], [])) == ("accept", "1:p1", 0, tx)
+    # o slot 0 foi decidido e compactado enquanto o ACCEPT viajava: segue depois de truncated_upto
+    step = instance.send(([], [compacted(3, 5), compacted(3, 5)]))
+    assert step == ("prepare", "1:p1", 6, tx)
+    assert instance.send(([promise(), promise()], [])) == ("accept", "1:p1", 6, tx)
+    with pytest.raises(StopIteration) as done:
+        instance.send(([{"response": "accepted"}, {"response": "accepted"}], []))
+    assert done.value.value == (6, "1:p1")
+    # se o slot 0 já tinha a transação, a cópia do slot 6 não é aplicada de novo
+    sm = learner.KVStateMachine()
+    sm.decide(0, tx)
+    for slot in range(1, 6):
+        sm.decide(slot, {"noop": True})
+    sm.decide(6, dict(tx))
+    assert sm.applied_index == 6
+    assert sm.get("k") == ("v", 0)
+
+# --- REGRAS DO ACCEPTOR ---
+
+def test_promises_needs_strictly_higher_ballot():
+    assert paxos.promises("2:p1", "1:p9")
+    assert not paxos.promises("1:p1", "2:p1")
+    assert not paxos.promises("3:p1", "3:p1")
+    #mesmo contador: desempata pelo id do proposer, só um dos dois leva as promessas
+    assert paxos.promises("3:p2", "3:p1")
+    assert not paxos.promises("3:p1", "3:p2")
+    #nada prometido ainda
+    assert paxos.promises("1:p1", None)
+
+def test_admits_equal_ballot():
+    assert paxos.admits("3:p1", "3:p1")
+    assert paxos.admits("4:p1", "3:p1")
+    assert not paxos.admits("2:p1", "3:p1")
+    assert not paxos.admits("3:p1", "3:p2")
+    assert paxos.admits("1:p1", None)
+
+# --- VOTOS ---
+
+def test_vote_record_counts_each_acceptor_once():
+    record = paxos.VoteRecord("1:p1", {"key": "k"}, 0.0)
+    assert record.vote(1, True, 2, 3) is None
+    assert record.vote(1, True, 2, 3) is None
+    assert record.vote(2, True, 2, 3) == "committed"
+
+def test_vote_record_rejects_once():
+    record = paxos.VoteRecord("1:p1", {"key": "k"}, 0.0)
+    assert record.vote(1, False, 2, 3) is None
+    assert record.vote(2, False, 2, 3) == "rejected"
+    assert record.vote(4, False, 2, 3) is None
+
+def vote(learner, slot, proposal_id, acceptor_id, transaction, accepted=True):
+    return learner.record_vote(slot, proposal_id, acceptor_id, accepted, transaction)[0]
+
+def test_higher_ballot_supersedes_pending_votes(learner):
+    slot, old, new = 950, {"key": "k", "value": 1}, {"key": "k", "value": 2}
+    assert vote(learner, slot, "1:p1", "acceptor1", old) is None
+    assert vote(learner, slot, "2:p2", "acceptor2", new) is None
+    assert learner.pending_votes[slot].proposal_id == "2:p2"
+    #o voto do acceptor1 no ballot antigo não soma no novo
+    assert vote(learner, slot, "1:p1", "acceptor3", old) is None
+    assert vote(learner, slot, "2:p2", "acceptor3", new) == "committed"
+    assert learner.decided_slots[slot] == "2:p2"
+
+def test_equal_ballot_with_different_value_is_not_counted(learner):
+    slot = 951
+    assert vote(learner, slot, "1:p1", "acceptor1", {"key": "k", "value": 1}) is None
+    assert vote(learner, slot, "1:p1", "acceptor2", {"key": "k", "value": 2}) is None
+    assert slot not in learner.decided_slots
+    assert vote(learner, slot, "1:p1", "acceptor2", {"key": "k", "value": 1}) == "committed"
+
+# --- BACKOFF ---
+
+class UpperBound:
+    """rng que sempre sorteia o teto, para o teste ver o limite do backoff."""
+    def uniform(self, low, high):
+        return high
+
+def test_backoff_bound_grows_and_is_capped():
+    backoff = paxos.Backoff(0.01, 0.05, rng=UpperBound())
+    bounds = [backoff.failure() for _ in range(5)]
+    assert bounds == pytest.approx([0.01, 0.02, 0.04, 0.05, 0.05])
+    #o nível também para de crescer: muitas falhas não estouram o expoente
+    for _ in range(100):
+        assert backoff.failure() == pytest.approx(0.05)
+    assert backoff.level == 16
+
+def test_backoff_success_lowers_the_bound():
+    backoff = paxos.Backoff(0.01, 1.0, rng=UpperBound())
+    for _ in range(3):
+        backoff.failure()
+    backoff.success()
+    backoff.success()
+    assert backoff.failure() == pytest.approx(0.02)
+    for _ in range(10):
+        backoff.success()
+    assert backoff.level == 0
+    assert backoff.failure() == pytest.approx(0.01)
@@ -0,0 +1,63 @@
+# test_proposer.py
+# Slots reservados por uma instância que entregou a transação ao líder, e as threads por acceptor.
+
+import threading
+import time
+
+import requests
+
+def test_released_slot_is_filled_by_the_leader(proposer, monkeypatch):
+    forwarded, local = [], []
+    monkeypatch.setattr(proposer, "lease_holder_url", lambda: "http://leader:9000")
+    monkeypatch.setattr(proposer, "forward_propose", lambda url, data, wait, path="/propose", admitted=False:
+                        forwarded.append((url, path, data)) or (b"{}", 202, {}))
+    monkeypatch.setattr(proposer, "fill_slot", local.append)
+    proposer.fill_released_slot(42)
+    assert forwarded == [("http://leader:9000", "/fill", {"slots": [42]})]
+    assert local == []
+
+def test_released_slot_is_filled_locally_by_the_lease_holder(proposer, monkeypatch):
+    local = []
+    monkeypatch.setattr(proposer, "lease_holder_url", lambda: None)
+    monkeypatch.setattr(proposer, "fill_slot", local.append)
+    proposer.fill_released_slot(43)
+    assert local == [43]
+
+def test_last_released_slot_is_given_back(proposer):
+    slot = proposer.allocate_slot()
+    proposer.release_slot(slot)
+    assert proposer.allocate_slot() == slot
+
+def test_slow_acceptor_only_holds_its_own_threads(proposer, monkeypatch):
+    slow, fast = proposer.ACCEPTORS[0], proposer.ACCEPTORS[1:]
+    release = threading.Event()
+    blocked = []
+
+    def post(acc_url, path, payload, timeout, trace_id):
+        #só as mensagens deste teste: o resto (transações de outros testes) continua sem rede
+        if payload.get("proposal_id") != "9:test":
+            raise requests.ConnectionError()
+        if acc_url == slow:
+            blocked.append(payload["slot"])
+            release.wait(5)
+        return 200, {"type": "promise"}
+
+    monkeypatch.setattr(proposer, "_post_to_acceptor", post)
+    broadcast = lambda slot: proposer.broadcast_to_acceptors(
+        "/prepare", {"proposal_id": "9:test", "slot": slot}, is_ok=lambda body: body.get("type") == "promise",
+        failure_body={"type": "not_promise"}, timeout=5, needed=2)
+    try:
+        for slot in range(3 * proposer.ACCEPTOR_MAX_IN_FLIGHT):
+            if len(blocked) == proposer.ACCEPTOR_MAX_IN_FLIGHT:
+                break
+            oks, fails = broadcast(slot)
+            assert len(oks) == 2
+        assert len(blocked) == proposer.ACCEPTOR_MAX_IN_FLIGHT
+        # o acceptor lento está com todas as threads presas: a rodada segue com os outros, sem esperar
+        started = time.monotonic()
+        oks, fails = broadcast(1000)
+        assert len(oks) == len(fast) and len(fails) == 1
+        assert time.monotonic() - started < 1
+        assert 1000 not in blocked
+    finally:
+        release.set()
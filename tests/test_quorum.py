@@ -0,0 +1,85 @@
+# test_quorum.py
+# Regras de quorum (common/quorum.py): Q1 + Q2 > N, tamanho derivado quando só um é definido,
+# READ_QUORUM = N - Q2 + 1, e o learner decidindo com Q2 votos.
+
+import pytest
+
+from common import quorum
+
+@pytest.fixture(autouse=True)
+def no_quorum_env(monkeypatch):
+    #sizes lê PAXOS_Q1/PAXOS_Q2 quando q1/q2 são None
+    monkeypatch.delenv("PAXOS_Q1", raising=False)
+    monkeypatch.delenv("PAXOS_Q2", raising=False)
+
+@pytest.mark.parametrize("n, expected", [(1, (1, 1)), (3, (2, 2)), (4, (3, 3)), (5, (3, 3))])
+def test_default_is_majority(n, expected):
+    assert quorum.sizes(n) == expected
+
+def test_derives_the_missing_size():
+    assert quorum.sizes(5, q1=4) == (4, 2)
+    assert quorum.sizes(5, q2=1) == (5, 1)
+    assert quorum.sizes(3, q1=3) == (3, 1)
+
+def test_sizes_from_env(monkeypatch):
+    monkeypatch.setenv("PAXOS_Q2", "2")
+    assert quorum.sizes(5) == (4, 2)
+    #argumento explícito ganha da variável
+    assert quorum.sizes(5, q1=3, q2=3) == (3, 3)
+
+def test_accepts_non_minimal_sizes():
+    assert quorum.sizes(5, q1=4, q2=4) == (4, 4)
+
+@pytest.mark.parametrize("q1, q2", [(2, 3), (1, 1), (3, 2), (2, 2)])
+def test_rejects_non_intersecting_quorums(q1, q2):
+    #com q1 + q2 <= 5 um quorum da fase 1 pode não ver um valor escolhido
+    with pytest.raises(ValueError, match="greater than the number of acceptors"):
+        quorum.sizes(5, q1=q1, q2=q2)
+
+@pytest.mark.parametrize("q1, q2", [(6, 0), (0, 6), (-1, 0), (0, -2)])
+def test_rejects_out_of_range(q1, q2):
+    with pytest.raises(ValueError, match="must be between 1"):
+        quorum.sizes(5, q1=q1, q2=q2)
+
+def test_rejects_invalid_env(monkeypatch):
+    monkeypatch.setenv("PAXOS_Q1", "1")
+    monkeypatch.setenv("PAXOS_Q2", "2")
+    with pytest.raises(ValueError):
+        quorum.sizes(3)
+
+def test_rejects_no_acceptors():
+    with pytest.raises(ValueError, match="no acceptors"):
+        quorum.sizes(0)
+
+@pytest.mark.parametrize("n", range(1, 8))
+def test_read_quorum_intersects_every_phase2_quorum(n):
+    for q2 in range(1, n + 1):
+        read = quorum.read_quorum(n, q2)
+        assert read == n - q2 + 1
+        assert read + q2 > n
+
+def test_learner_read_quorum(learner):
+    n = len(learner.ACCEPTORS)
+    assert (learner.Q1, learner.Q2) == quorum.sizes(n)
+    assert learner.READ_QUORUM == n - learner.Q2 + 1
+
+def test_learner_decides_with_q2_votes(learner):
+    slot = 900
+    vote = {"proposal_id": "1:proposer1", "accepted": True, "transaction": {"noop": True}, "slot": slot}
+    for i in range(1, learner.Q2):
+        assert learner.process_vote(dict(vote, acceptor_id=f"acceptor{i}")) == "pending"
+        assert slot not in learner.decided_slots
+    #o mesmo acceptor votando de novo não conta duas vezes
+    assert learner.process_vote(dict(vote, acceptor_id="acceptor1")) == "pending"
+    assert learner.process_vote(dict(vote, acceptor_id=f"acceptor{learner.Q2}")) == "committed"
+    assert learner.decided_slots[slot] == "1:proposer1"
+
+def test_learner_rejects_when_q2_is_out_of_reach(learner):
+    slot = 901
+    vote = {"proposal_id": "1:proposer1", "accepted": False, "transaction": {"noop": True}, "slot": slot}
+    n = len(learner.ACCEPTORS)
+    statuses = [learner.process_vote(dict(vote, acceptor_id=f"acceptor{i}")) for i in range(1, n + 1)]
+    #rejeitado exatamente quando sobram menos de Q2 acceptors para aceitar
+    assert statuses.index("rejected") == n - learner.Q2
+    assert statuses.count("rejected") == 1
+    assert slot not in learner.decided_slots
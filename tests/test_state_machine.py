@@ -0,0 +1,39 @@
+# test_state_machine.py
+# Máquina de estados do learner: cada transação (client_id, session, request_id) é aplicada uma vez
+# só, mesmo que seja decidida em dois slots, e o snapshot leva essa memória junto.
+
+def put(request_id, value, session="s1"):
+    return {"client_id": "c1", "session": session, "request_id": request_id, "key": "k", "value": value}
+
+def test_duplicate_does_not_revert_newer_write(learner):
+    sm = learner.KVStateMachine()
+    sm.decide(0, put(1, "old"))
+    sm.decide(1, put(2, "new"))
+    # cópia atrasada do pedido 1 (retry para outro proposer)
+    sm.decide(2, {"batch": [put(1, "old")]})
+    assert sm.applied_index == 2
+    assert sm.get("k") == ("new", 1)
+
+def test_out_of_order_requests_are_applied(learner):
+    # cliente com vários pedidos em aberto: o 4 pode ser decidido depois do 5
+    sm = learner.KVStateMachine()
+    sm.decide(0, put(5, "five"))
+    sm.decide(1, put(4, "four"))
+    assert sm.get("k") == ("four", 1)
+
+def test_sessions_are_independent(learner):
+    sm = learner.KVStateMachine()
+    sm.decide(0, put(1, "first run"))
+    sm.decide(1, put(1, "second run", session="s2"))
+    assert sm.get("k") == ("second run", 1)
+
+def test_snapshot_keeps_applied_requests(learner):
+    sm = learner.KVStateMachine()
+    sm.decide(0, put(1, "old"))
+    sm.decide(1, put(2, "new"))
+    sm._snapshot()
+    index, data, clients, first, values = sm.export(0)
+    other = learner.KVStateMachine()
+    assert other.install_snapshot(index, dict(data), clients)
+    other.decide(2, put(1, "old"))
+    assert other.get("k") == ("new", 1)
@@ -0,0 +1,67 @@
+# test_wire.py
+# Ida e volta das respostas do acceptor pelo protocolo binário: o decoder tem que devolver o mesmo
+# dict que a rota HTTP responde.
+
+import asyncio
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from common import wire
+
+def test_accepted_compacted_round_trip():
+    # mesmo corpo do compacted_response do acceptor.py
+    response = {"response": "not_accepted", "slot": 7, "tid_in_use": "12:proposer1", "max_slot": 40,
+                "truncated_upto": 31}
+    status, decoded = wire.decode_accepted(wire.encode_accepted(response, 410))
+    assert status == 410
+    assert decoded["max_slot"] == 40
+    assert decoded["truncated_upto"] == 31
+    assert decoded["tid_in_use"] == "12:proposer1"
+    assert decoded["response"] == "not_accepted"
+
+def test_promise_compacted_round_trip():
+    response = {"type": "not_promise", "slot": 7, "tid_in_use": "12:proposer1", "accepted_id": None,
+                "accepted_value": None, "max_slot": 40, "truncated_upto": 31}
+    status, decoded = wire.decode_promise(wire.encode_promise(response, 410))
+    assert status == 410
+    assert decoded == response
+
+def test_accepted_round_trip():
+    response = {"response": "accepted", "slot": 3, "tid": "5:proposer2"}
+    status, decoded = wire.decode_accepted(wire.encode_accepted(response, 200))
+    assert status == 200
+    assert decoded == response
+
+class RecordingWriter:
+    """StreamWriter falso: guarda os frames e conta os drains."""
+    def __init__(self):
+        self.frames = []
+        self.drains = 0
+
+    def is_closing(self):
+        return False
+
+    def write(self, data):
+        self.frames.append(data)
+
+    async def drain(self):
+        self.drains += 1
+
+def test_server_drains_after_each_reply():
+    async def echo(body):
+        return wire.ACCEPTED, body
+
+    async def run():
+        writer = RecordingWriter()
+        server = wire.WireServer({wire.ACCEPT: echo})
+        lock = asyncio.Lock()
+        await asyncio.gather(*(server.dispatch(writer, lock, i, wire.ACCEPT, b"x") for i in range(3)))
+        await server.dispatch(writer, lock, 3, 99, b"")
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.frames[:3] == [wire.frame(i, wire.ACCEPTED, b"x") for i in range(3)]
+    assert len(writer.frames) == 4
+    assert writer.drains == 4